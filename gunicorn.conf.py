@@ -0,0 +1,25 @@
+"""
+Gunicorn settings (Procfile: gunicorn wsgi --chdir ./src/ --config gunicorn.conf.py).
+Every worker serves GUNICORN_THREADS requests at a time by default (gthread), so a request
+waiting on the database no longer blocks the worker. GUNICORN_WORKER_CLASS=gevent is also
+supported, it needs the gevent and psycogreen packages. See docs/LOAD_PROFILE.md.
+"""
+import os
+
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+# Requests a gevent worker handles at the same time
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 100))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+# Each worker imports the app itself, so no connection pool is shared across a fork
+preload_app = False
+
+
+def post_fork(server, worker):
+    if worker_class == "gevent":
+        # psycopg2 blocks the whole worker on a query unless it's made cooperative
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
@@ -0,0 +1,59 @@
+"""native booking dates
+
+Revision ID: 73c72b810703
+Revises: b429bc4b70e7
+Create Date: 2026-10-18 11:32:07.418265
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '73c72b810703'
+down_revision = 'b429bc4b70e7'
+branch_labels = None
+depends_on = None
+
+
+# (table, column, new type, postgres cast)
+DATE_COLUMNS = [
+    ('bookings', 'date', sa.Date(), 'DATE'),
+    ('bookings', 'starting_time', sa.Time(), 'TIME'),
+    ('inactivity', 'starting_date', sa.Date(), 'DATE'),
+    ('inactivity', 'ending_date', sa.Date(), 'DATE'),
+    ('inactivity', 'starting_hour', sa.Time(), 'TIME'),
+    ('inactivity', 'ending_hour', sa.Time(), 'TIME'),
+]
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        for table, column, new_type, cast in DATE_COLUMNS:
+            op.alter_column(table, column, type_=new_type,
+                            postgresql_using=f'NULLIF({column}, \'\')::{cast}')
+    else:
+        # SQLite has no real date types (a batch copy would CAST them to numbers), so the
+        # columns stay as text and only the values are rewritten in the format SQLAlchemy reads
+        for table, column, new_type, cast in DATE_COLUMNS:
+            op.execute(f"UPDATE {table} SET {column} = NULL WHERE {column} = ''")
+            if cast == 'TIME':
+                op.execute(f"UPDATE {table} SET {column} = time({column}) || '.000000' WHERE {column} IS NOT NULL")
+    op.create_index('ix_bookings_pro_service_id_date_starting_time', 'bookings', ['pro_service_id', 'date', 'starting_time'], unique=False)
+    op.create_index('ix_inactivity_pro_id_starting_date', 'inactivity', ['pro_id', 'starting_date'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_inactivity_pro_id_starting_date', table_name='inactivity')
+    op.drop_index('ix_bookings_pro_service_id_date_starting_time', table_name='bookings')
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        for table, column, new_type, cast in DATE_COLUMNS:
+            pattern = 'YYYY-MM-DD' if cast == 'DATE' else 'HH24:MI'
+            op.alter_column(table, column, type_=sa.String(),
+                            postgresql_using=f'to_char({column}, \'{pattern}\')')
+    else:
+        for table, column, new_type, cast in DATE_COLUMNS:
+            if cast == 'TIME':
+                op.execute(f"UPDATE {table} SET {column} = substr({column}, 1, 5)")
@@ -0,0 +1,28 @@
+"""resource versions
+
+Revision ID: 9f4a2c61d3e8
+Revises: 5e0d9c8b1f27
+Create Date: 2026-10-18 13:02:17.540913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f4a2c61d3e8'
+down_revision = '5e0d9c8b1f27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('resource_versions',
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('resource_versions')
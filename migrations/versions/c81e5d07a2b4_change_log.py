@@ -0,0 +1,34 @@
+"""change log
+
+Revision ID: c81e5d07a2b4
+Revises: 9f4a2c61d3e8
+Create Date: 2026-10-18 14:11:38.208164
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81e5d07a2b4'
+down_revision = '9f4a2c61d3e8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('change_log',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('pro_id', sa.Integer(), nullable=False),
+    sa.Column('entity', sa.String(length=20), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('operation', sa.String(length=10), nullable=False),
+    sa.Column('changed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_change_log_pro_id_id', 'change_log', ['pro_id', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_change_log_pro_id_id', table_name='change_log')
+    op.drop_table('change_log')
@@ -0,0 +1,32 @@
+"""patient search
+
+Revision ID: d4e7a1c93f60
+Revises: c81e5d07a2b4
+Create Date: 2026-10-18 15:02:17.514330
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4e7a1c93f60'
+down_revision = 'c81e5d07a2b4'
+branch_labels = None
+depends_on = None
+
+
+SEARCH_TEXT = "lower(patients.name || ' ' || patients.lastname || ' ' || patients.email || ' ' || coalesce(patients.phone, ''))"
+
+
+def upgrade():
+    op.create_index('ix_bookings_pro_service_id_patient_id', 'bookings', ['pro_service_id', 'patient_id', 'date'], unique=False)
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute(f"CREATE INDEX ix_patients_search_text ON patients USING gin (({SEARCH_TEXT}) gin_trgm_ops)")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP INDEX ix_patients_search_text")
+    op.drop_index('ix_bookings_pro_service_id_patient_id', table_name='bookings')
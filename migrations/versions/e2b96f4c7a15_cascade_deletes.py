@@ -0,0 +1,58 @@
+"""cascade deletes
+
+Revision ID: e2b96f4c7a15
+Revises: d4e7a1c93f60
+Create Date: 2026-10-18 17:41:09.203518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b96f4c7a15'
+down_revision = 'd4e7a1c93f60'
+branch_labels = None
+depends_on = None
+
+
+# (table, column, referred table) of the foreign keys deleted along with the row they refer to.
+# They were created unnamed, Postgres named them <table>_<column>_fkey. SQLite doesn't enforce
+# foreign keys here, they're left as they are there.
+CASCADES = [('locations', 'pro_id', 'pros'),
+            ('hours', 'pro_id', 'pros'),
+            ('hours', 'location_id', 'locations'),
+            ('inactivity', 'pro_id', 'pros'),
+            ('pro_services', 'pro_id', 'pros'),
+            ('bookings', 'pro_service_id', 'pro_services'),
+            ('bookings', 'patient_id', 'patients'),
+            ('email_outbox', 'pro_id', 'pros'),
+            ('email_outbox', 'booking_id', 'bookings')]
+# Cascades and deletes look the rows up by these columns
+INDEXES = [('ix_bookings_patient_id', 'bookings', ['patient_id']),
+           ('ix_email_outbox_pro_id', 'email_outbox', ['pro_id']),
+           ('ix_email_outbox_booking_id', 'email_outbox', ['booking_id']),
+           ('ix_hours_pro_id', 'hours', ['pro_id']),
+           ('ix_hours_location_id', 'hours', ['location_id']),
+           ('ix_pro_services_pro_id', 'pro_services', ['pro_id'])]
+
+
+def replace_foreign_keys(ondelete):
+    for table, column, referred_table in CASCADES:
+        name = f'{table}_{column}_fkey'
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referred_table, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+    if op.get_bind().dialect.name == 'postgresql':
+        replace_foreign_keys('CASCADE')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        replace_foreign_keys(None)
+    for name, table, columns in INDEXES:
+        op.drop_index(name, table_name=table)
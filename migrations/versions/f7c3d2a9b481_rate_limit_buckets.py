@@ -0,0 +1,29 @@
+"""rate limit buckets
+
+Revision ID: f7c3d2a9b481
+Revises: e2b96f4c7a15
+Create Date: 2026-10-18 19:12:44.871209
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7c3d2a9b481'
+down_revision = 'e2b96f4c7a15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('rate_limit_buckets',
+    sa.Column('name', sa.String(length=200), nullable=False),
+    sa.Column('tokens', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('rate_limit_buckets')
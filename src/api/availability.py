@@ -0,0 +1,151 @@
+"""
+Server-side availability engine.
+Merges a pro's working Hours, Bookings, InactivityDays and national holidays into the
+free slot start times of a date window. Every day is a 1440-bit integer (one bit per
+minute, 1 = busy), so merging intervals and testing a candidate slot are bitwise operations.
+"""
+import datetime
+from api.models import db, Hours, Bookings, ProServices, InactivityDays
+
+
+MINUTES_PER_DAY = 24 * 60
+FULL_DAY = (1 << MINUTES_PER_DAY) - 1
+MAX_WINDOW_DAYS = 366
+# Bookings with these statuses don't take up their slot anymore
+INACTIVE_BOOKING_STATUSES = ("cancelled", "canceled")
+
+
+# time or "HH:MM" (as stored in Hours) -> minutes since midnight
+def parse_minutes(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime.time):
+        return value.hour * 60 + value.minute
+    try:
+        hours, minutes = str(value).split(":")[:2]
+        return int(hours) * 60 + int(minutes)
+    except ValueError:
+        return None
+
+
+def format_minutes(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+# Bit mask with the minutes [start, end) set, clipped to the day
+def interval_mask(start, end):
+    start = max(start, 0)
+    end = min(end, MINUTES_PER_DAY)
+    if end <= start:
+        return 0
+    return ((1 << (end - start)) - 1) << start
+
+
+# Same numbering as Hours.working_day and JS Date.getDay(): 0 = sunday
+def working_day_number(day):
+    return (day.weekday() + 1) % 7
+
+
+def daterange(first_day, last_day):
+    for offset in range((last_day - first_day).days + 1):
+        yield first_day + datetime.timedelta(days=offset)
+
+
+# {working_day: [(start, end), ...]} with the morning and afternoon blocks in minutes
+def working_blocks(hours):
+    blocks = {}
+    for hour in hours:
+        for starting, ending in ((hour.starting_hour_morning, hour.ending_hour_morning),
+                                 (hour.starting_hour_after, hour.ending_hour_after)):
+            start = parse_minutes(starting)
+            end = parse_minutes(ending)
+            if start is not None and end is not None and start < end:
+                blocks.setdefault(hour.working_day, []).append((start, end))
+    for day_blocks in blocks.values():
+        day_blocks.sort()
+    return blocks
+
+
+# {date: busy_mask} for the days of the window that have something booked or blocked
+def busy_days(bookings, inactivities, holiday_dates, first_day, last_day):
+    busy = {}
+
+    def mark(day, mask):
+        if first_day <= day <= last_day and mask:
+            busy[day] = busy.get(day, 0) | mask
+
+    for day in holiday_dates:
+        mark(day, FULL_DAY)
+    for booking in bookings:
+        start = parse_minutes(booking.starting_time)
+        mark(booking.date, interval_mask(start, start + int(booking.duration or 0)))
+    for inactivity in inactivities:
+        starting_date = inactivity.starting_date
+        ending_date = inactivity.ending_date
+        starting_hour = parse_minutes(inactivity.starting_hour)
+        ending_hour = parse_minutes(inactivity.ending_hour)
+        # Ranged holiday: every day from starting_date to ending_date is blocked
+        if ending_date is not None:
+            for day in daterange(max(starting_date, first_day), min(ending_date, last_day)):
+                mark(day, FULL_DAY)
+        # Partial day: from starting_hour until ending_hour, or until the end of the day
+        elif starting_hour is not None:
+            mark(starting_date, interval_mask(starting_hour, ending_hour if ending_hour is not None else MINUTES_PER_DAY))
+        # Full day off
+        else:
+            mark(starting_date, FULL_DAY)
+    return busy
+
+
+# Slot starts inside the working blocks of one day. Slots are laid out back to back:
+# a slot starts at the first free minute and the next one can't start before it ends.
+def free_slots(blocks, busy_mask, duration):
+    slots = []
+    for start, end in blocks:
+        minute = start
+        while minute + duration <= end:
+            clash = busy_mask & interval_mask(minute, minute + duration)
+            if clash:
+                # jump right after the last busy minute inside the candidate slot
+                minute = clash.bit_length()
+                continue
+            slots.append(minute)
+            minute += duration
+    return slots
+
+
+def compute_availability(hours, bookings, inactivities, holiday_dates, first_day, last_day, duration):
+    blocks = working_blocks(hours)
+    busy = busy_days(bookings, inactivities, holiday_dates, first_day, last_day)
+    availability = {}
+    for day in daterange(first_day, last_day):
+        day_blocks = blocks.get(working_day_number(day))
+        if not day_blocks:
+            continue
+        busy_mask = busy.get(day, 0)
+        if busy_mask == FULL_DAY:
+            continue
+        slots = free_slots(day_blocks, busy_mask, duration)
+        if slots:
+            availability[day.isoformat()] = [format_minutes(slot) for slot in slots]
+    return availability
+
+
+# Load only the rows that can affect the window and compute its free slots for a ProService
+def get_availability(pro_service, first_day, last_day, holiday_dates=()):
+    pro_id = pro_service.pro_id
+    hours = Hours.query.filter_by(pro_id=pro_id).all()
+    bookings = db.session.query(Bookings.date, Bookings.starting_time, ProServices.duration) \
+        .join(ProServices, Bookings.pro_service_id == ProServices.id) \
+        .filter(ProServices.pro_id == pro_id,
+                Bookings.date >= first_day,
+                Bookings.date <= last_day,
+                Bookings.status.notin_(INACTIVE_BOOKING_STATUSES)) \
+        .all()
+    inactivities = InactivityDays.query \
+        .filter(InactivityDays.pro_id == pro_id,
+                InactivityDays.starting_date <= last_day,
+                db.func.coalesce(InactivityDays.ending_date, InactivityDays.starting_date) >= first_day) \
+        .all()
+    return compute_availability(hours, bookings, inactivities, holiday_dates,
+                                first_day, last_day, int(pro_service.duration))
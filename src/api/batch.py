@@ -0,0 +1,105 @@
+"""
+Batches of API requests (POST /api/batch).
+{"requests": [{"method", "path", "body"}], "transaction": false}: the sub-requests are
+dispatched in order through the app's URL map inside this same request, with its
+Authorization header and rate limits (api/rate_limits.py), and their responses come back
+together, so a page that chains several calls makes one round trip. Paths are relative to
+/api, eg: "/pros/12".
+With "transaction": true they share one database transaction (see BatchSession in
+api/models.py): the first one that fails stops the batch and undoes the ones before it,
+otherwise everything is committed at the end. Calls to other services made by a sub-request
+(Google Calendar) aren't undone.
+"""
+from flask import current_app, request
+from api.models import db
+from api.utils import APIException
+from api.rate_limits import check_request
+
+
+MAX_REQUESTS = 50
+METHODS = ("GET", "POST", "PUT", "PATCH", "DELETE")
+API_PREFIX = "/api"
+BATCH_ENDPOINT = "api.handle_batch"
+FORWARDED_HEADERS = ("Authorization", "X-Forwarded-For", "X-Request-Start")
+
+
+# [(method, path, body)] of the batch, or an APIException (400) saying what's wrong with it
+def parse_requests(data):
+    if not isinstance(data, dict) or not isinstance(data.get("requests"), list):
+        raise APIException("requests must be a list")
+    if len(data["requests"]) > MAX_REQUESTS:
+        raise APIException(f"A batch can't have more than {MAX_REQUESTS} requests")
+    requests = []
+    for index, sub_request in enumerate(data["requests"]):
+        where = f"requests[{index}]"
+        if not isinstance(sub_request, dict):
+            raise APIException(f"{where} must be an object")
+        method = sub_request.get("method", "GET")
+        if method not in METHODS:
+            raise APIException(f"{where}: method must be one of {', '.join(METHODS)}")
+        path = sub_request.get("path")
+        if not isinstance(path, str) or not path.startswith("/"):
+            raise APIException(f"{where}: path must start with /, eg: /pros/12")
+        requests.append((method, path, sub_request.get("body")))
+    return requests
+
+
+def response_body(response):
+    if response.is_json:
+        return response.get_json()
+    return response.get_data(as_text=True) or None
+
+
+# {"status", "body"} of one sub-request. It goes through the view and the error handlers,
+# not through before_request/after_request, which belong to the batch request.
+def dispatch(method, path, body):
+    app = current_app._get_current_object()
+    # Same client for the rate limits as the batch
+    headers = {name: request.headers[name] for name in FORWARDED_HEADERS if name in request.headers}
+    with app.test_request_context(API_PREFIX + path, method=method, json=body, headers=headers,
+                                  environ_base={"REMOTE_ADDR": request.remote_addr}):
+        try:
+            # The url map also serves public/ on any other GET path
+            if request.routing_exception is None and request.blueprint != "api":
+                raise APIException("Not found", status_code=404)
+            if request.endpoint == BATCH_ENDPOINT:
+                raise APIException("Batches can't be nested")
+            response = check_request() or app.make_response(app.dispatch_request())
+        except Exception as error:
+            try:
+                response = app.make_response(app.handle_user_exception(error))
+            except Exception:
+                current_app.logger.exception("Batch request %s %s failed", method, path)
+                db.session.rollback()
+                response = app.make_response(({"message": "Internal server error"}, 500))
+    return {"status": response.status_code, "body": response_body(response)}
+
+
+# (body, status code) of the batch
+def run_batch(data):
+    requests = parse_requests(data)
+    transaction = data.get("transaction", False)
+    if not isinstance(transaction, bool):
+        raise APIException("transaction must be true or false")
+    if not transaction:
+        return {"responses": [dispatch(*sub_request) for sub_request in requests]}, 200
+    session = db.session()
+    session.info["batch"] = {"rolled_back": False}
+    responses = []
+    failed = None
+    try:
+        for index, sub_request in enumerate(requests):
+            responses.append(dispatch(*sub_request))
+            if responses[-1]["status"] >= 400 or session.info["batch"]["rolled_back"]:
+                failed = index
+                break
+    finally:
+        del session.info["batch"]
+    if failed is not None:
+        session.rollback()
+        status = responses[failed]["status"]
+        return {"message": f"requests[{failed}] failed, none of the batch was saved",
+                "failed": failed,
+                "responses": responses}, status if status >= 400 else 500
+    session.commit()
+    return {"responses": responses}, 200
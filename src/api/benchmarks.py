@@ -0,0 +1,317 @@
+"""
+Micro-benchmarks of hot code paths, run them with the flask bench-* commands.
+bench_endpoints drives the hot API routes through the Flask test client against the
+configured database (seeding it first if it has no seed data) and reports throughput,
+latency percentiles and SQL statements per request for each of them. bench_booking_race
+has many threads book the same slots at once and checks that every slot ends up booked once.
+run_load sends concurrent requests to a running server (gunicorn) instead.
+"""
+import json
+import time
+import random
+import base64
+import datetime
+import threading
+import contextlib
+import http.client
+from urllib.parse import urlsplit
+from sqlalchemy import event
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from api import email_templates, rate_limits
+from api.models import db, Pros, Bookings, ProServices
+from api.seed import seed_database
+
+
+# Average microseconds per call of `function` over `count` calls
+def time_per_call(function, count):
+    function()  # warm up
+    start = time.perf_counter()
+    for _ in range(count):
+        function()
+    return (time.perf_counter() - start) / count * 1000000
+
+
+def bench_email_render(count):
+    context = {"pro": {"name": "Pro", "lastname": "Bench", "email": "pro@bench.com"},
+               "service_name": "First visit",
+               "date": "2024-02-12",
+               "starting_time": "10:00"}
+
+    # What every send used to do: read the logo, wrap it in a new MIME part and serialize it per message
+    def uncached():
+        mensaje = MIMEMultipart()
+        mensaje['to'] = "patient@bench.com"
+        mensaje['subject'] = "YOUR APPOINTMENT"
+        template = email_templates._templates[email_templates.BOOKING_CONFIRMATION]
+        mensaje.attach(MIMEText(template.render(**context), 'html'))
+        mensaje.attach(email_templates.build_logo_part())
+        return base64.urlsafe_b64encode(mensaje.as_bytes()).decode('utf-8')
+
+    def cached():
+        return email_templates.render_message(email_templates.BOOKING_CONFIRMATION,
+                                              "patient@bench.com", "YOUR APPOINTMENT", **context)
+
+    email_templates.load_templates()
+    return {"uncached_us": time_per_call(uncached, count),
+            "cached_us": time_per_call(cached, count)}
+
+
+# Nearest-rank percentile of an already sorted list
+def percentile(sorted_values, percent):
+    index = max(0, int(round(percent / 100 * len(sorted_values) + 0.5)) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+# (name, method, url, json body or a function returning it) of every benchmarked route
+def hot_endpoints(pro, proservice_id, patient_id):
+    booking_days = iter(range(1, 10 ** 6))
+    first_day = datetime.date(2100, 1, 1)
+
+    def new_booking():
+        # Far in the future and one per day, so the benchmark bookings never clash
+        day = first_day + datetime.timedelta(days=next(booking_days))
+        return {"date": day.isoformat(), "starting_time": "10:00", "status": "pending",
+                "pro_service_id": proservice_id, "patient_id": patient_id}
+
+    return [
+        ("bookings_by_pro", "GET", f"/api/pros/{pro.id}/bookings", None),
+        ("pro_by_username", "GET", f"/api/pros/{pro.bookingpage_url}", None),
+        ("proservices_by_pro", "GET", f"/api/pros/{pro.id}/proservices", None),
+        ("hours_by_pro", "GET", f"/api/pros/{pro.id}/hours", None),
+        ("login", "POST", "/api/login", {"email": pro.email, "password": pro.password}),
+        ("create_booking", "POST", "/api/bookings", new_booking),
+    ]
+
+
+# First seeded pro, seeding the database if it has no seed data
+def seeded_pro():
+    pro = Pros.query.filter(Pros.bookingpage_url.like("seed-pro%")).order_by(Pros.id).first()
+    if pro is None:
+        seed_database(pros=20, bookings_per_pro=500, log=lambda *args: None)
+        pro = Pros.query.filter(Pros.bookingpage_url.like("seed-pro%")).order_by(Pros.id).first()
+    return pro
+
+
+# Turns the limiter off while a benchmark runs (as a decorator too). Its test client requests
+# all come from one client to one pro, so the buckets would answer most of them with a 429.
+@contextlib.contextmanager
+def rate_limits_off():
+    enabled = rate_limits.RATE_LIMIT_ENABLED
+    rate_limits.RATE_LIMIT_ENABLED = False
+    try:
+        yield
+    finally:
+        rate_limits.RATE_LIMIT_ENABLED = enabled
+
+
+# Removes the bookings created from `first_id` on. Through the ORM, so resource versions and
+# the change log see the deletes
+def delete_bookings_from(app, first_id):
+    with app.app_context():
+        for booking in Bookings.query.filter(Bookings.id >= first_id).all():
+            db.session.delete(booking)
+        db.session.commit()
+
+
+@rate_limits_off()
+def bench_endpoints(app, requests_per_endpoint=200, warmup=10):
+    with app.app_context():
+        pro = seeded_pro()
+        proservice = ProServices.query.filter_by(pro_id=pro.id).first()
+        patient_id = Bookings.query.filter_by(pro_service_id=proservice.id).first().patient_id
+        endpoints = hot_endpoints(pro, proservice.id, patient_id)
+        first_new_booking = (db.session.query(db.func.max(Bookings.id)).scalar() or 0) + 1
+        engine = db.engine
+        dialect = engine.dialect.name
+        db.session.remove()
+
+    statements = [0]
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements[0] += 1
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+    client = app.test_client()
+    results = {}
+    try:
+        for name, method, url, body in endpoints:
+            def call():
+                response = client.open(url, method=method, json=body() if callable(body) else body)
+                if response.status_code >= 400:
+                    raise RuntimeError(f"{method} {url} returned {response.status_code}")
+            for _ in range(warmup):
+                call()
+            latencies = []
+            statements[0] = 0
+            start = time.perf_counter()
+            for _ in range(requests_per_endpoint):
+                request_start = time.perf_counter()
+                call()
+                latencies.append((time.perf_counter() - request_start) * 1000)
+            elapsed = time.perf_counter() - start
+            latencies.sort()
+            results[name] = {"method": method,
+                             "url": url,
+                             "requests": requests_per_endpoint,
+                             "throughput_rps": round(requests_per_endpoint / elapsed, 1),
+                             "p50_ms": round(percentile(latencies, 50), 3),
+                             "p95_ms": round(percentile(latencies, 95), 3),
+                             "p99_ms": round(percentile(latencies, 99), 3),
+                             "sql_per_request": round(statements[0] / requests_per_endpoint, 2)}
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+        # Leave the database as it was
+        delete_bookings_from(app, first_new_booking)
+
+    return {"created_at": datetime.datetime.utcnow().isoformat(timespec="seconds"),
+            "database": dialect,
+            "requests_per_endpoint": requests_per_endpoint,
+            "endpoints": results}
+
+
+# `threads` clients POST /api/bookings for the same `slots` at once, each slot on its own far
+# future day, half of the clients at 10:00 and half at 10:15 so they also race for slots that
+# overlap without starting at the same time. Every slot must end up with exactly one booking.
+@rate_limits_off()
+def bench_booking_race(app, threads=32, slots=50):
+    with app.app_context():
+        pro = seeded_pro()
+        proservice = ProServices.query.filter(ProServices.pro_id == pro.id, ProServices.duration > 15).first()
+        patient_id = Bookings.query.filter_by(pro_service_id=proservice.id).first().patient_id
+        first_new_booking = (db.session.query(db.func.max(Bookings.id)).scalar() or 0) + 1
+        dialect = db.engine.dialect.name
+        db.session.remove()
+
+    first_day = datetime.date(2200, 1, 1)
+    days = [(first_day + datetime.timedelta(days=slot)).isoformat() for slot in range(slots)]
+    statuses = {}
+    latencies = []
+    lock = threading.Lock()
+    start_line = threading.Barrier(threads)
+
+    def client(number):
+        thread_client = app.test_client()
+        starting_time = "10:00" if number % 2 == 0 else "10:15"
+        order = days[:]
+        random.Random(number).shuffle(order)
+        thread_statuses = {}
+        thread_latencies = []
+        start_line.wait()
+        for day in order:
+            request_start = time.perf_counter()
+            response = thread_client.post("/api/bookings", json={
+                "date": day, "starting_time": starting_time, "status": "pending",
+                "pro_service_id": proservice.id, "patient_id": patient_id})
+            thread_latencies.append((time.perf_counter() - request_start) * 1000)
+            thread_statuses[response.status_code] = thread_statuses.get(response.status_code, 0) + 1
+        with lock:
+            latencies.extend(thread_latencies)
+            for status, count in thread_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    workers = [threading.Thread(target=client, args=(number,)) for number in range(threads)]
+    start = time.perf_counter()
+    try:
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        with app.app_context():
+            booked = dict(db.session.query(Bookings.date, db.func.count(Bookings.id))
+                                    .filter(Bookings.id >= first_new_booking)
+                                    .group_by(Bookings.date).all())
+    finally:
+        delete_bookings_from(app, first_new_booking)
+
+    latencies.sort()
+    attempts = sum(statuses.values())
+    return {"created_at": datetime.datetime.utcnow().isoformat(timespec="seconds"),
+            "database": dialect,
+            "threads": threads,
+            "slots": slots,
+            "attempts": attempts,
+            "created": statuses.get(201, 0),
+            "conflicts": statuses.get(409, 0),
+            "errors": attempts - statuses.get(201, 0) - statuses.get(409, 0),
+            "double_booked": sum(1 for count in booked.values() if count > 1),
+            "unbooked": slots - len(booked),
+            "throughput_rps": round(attempts / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3)}
+
+
+# Endpoints whose p95 latency grew more than `tolerance` (0.2 = 20%) or that issue more SQL
+# statements than in `baseline`, another bench_endpoints result
+def find_regressions(results, baseline, tolerance=0.2):
+    regressions = []
+    for name, current in results["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if previous is None:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current["sql_per_request"] > previous["sql_per_request"]:
+            regressions.append(f"{name}: SQL statements per request {previous['sql_per_request']} -> {current['sql_per_request']}")
+    return regressions
+
+
+def write_results(results, path):
+    with open(path, "w") as results_file:
+        json.dump(results, results_file, indent=2)
+
+
+# Requests `urls` round robin from `concurrency` threads with keep-alive connections for
+# `duration` seconds against a running server, eg: run_load(["http://127.0.0.1:8000/api/services"])
+def run_load(urls, concurrency=16, duration=10):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(offset):
+        thread_latencies = []
+        thread_errors = 0
+        connections = {}
+        index = offset
+        while time.perf_counter() < deadline:
+            url = urlsplit(urls[index % len(urls)])
+            index += 1
+            start = time.perf_counter()
+            try:
+                connection = connections.get(url.netloc)
+                if connection is None:
+                    connection = connections[url.netloc] = http.client.HTTPConnection(url.netloc, timeout=30)
+                connection.request("GET", url.path + (f"?{url.query}" if url.query else ""))
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 400:
+                    thread_errors += 1
+            except (OSError, http.client.HTTPException):
+                thread_errors += 1
+                connections.pop(url.netloc, None)
+                continue
+            thread_latencies.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(thread_latencies)
+            errors[0] += thread_errors
+
+    threads = [threading.Thread(target=client, args=(offset,)) for offset in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    if not latencies:
+        return {"requests": 0, "errors": errors[0]}
+    return {"requests": len(latencies),
+            "errors": errors[0],
+            "concurrency": concurrency,
+            "throughput_rps": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3)}
@@ -0,0 +1,127 @@
+"""
+Change feed of the bookings, inactivity, hours and proservices of a pro
+(GET /api/pros/<proid>/changes).
+Every insert, update and delete of those rows appends an entry to change_log in the same
+transaction, from an after_flush hook. Its id is the change sequence and a feed token is
+the last id a client has seen, so reading what changed since a token is a range scan of the
+(pro_id, id) index. Before appending, the pro's "changes:<pro_id>" resource version is
+bumped. That row lock makes a pro's changes commit in id order on Postgres, so a token never
+skips a change committed late. Statements that bypass the ORM have to call
+record_changes() themselves.
+"""
+import datetime
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from api.models import db, Bookings, InactivityDays, Hours, ProServices, ChangeLog
+from api.resource_versions import bump_versions, booking_pro_ids
+
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 2000
+ENTITIES = {"bookings": Bookings, "inactivity": InactivityDays, "hours": Hours, "proservices": ProServices}
+ENTITY_NAMES = {model: entity for entity, model in ENTITIES.items()}
+
+
+# Pro ids a row belongs to, from the values of its pro field (see resource_names)
+def row_pro_ids(instance, values, pro_ids):
+    if isinstance(instance, Bookings):
+        return [pro_ids[pro_service_id] for pro_service_id in values("pro_service_id") if pro_service_id in pro_ids]
+    return list(values("pro_id"))
+
+
+# [(pro_id, entity, entity_id, operation)] of the rows flushed in `session`. A row moved to
+# another pro is an upsert for the new one and a delete for the old one.
+def flushed_changes(session, flush_context):
+    pro_ids = booking_pro_ids(session, flush_context)
+    changes = []
+    for operation, instances in (("upsert", session.new), ("delete", session.deleted)):
+        for instance in instances:
+            entity = ENTITY_NAMES.get(type(instance))
+            if entity:
+                for pro_id in row_pro_ids(instance, lambda field: [getattr(instance, field)], pro_ids):
+                    changes.append((pro_id, entity, instance.id, operation))
+    for instance in session.dirty:
+        entity = ENTITY_NAMES.get(type(instance))
+        if not entity or not session.is_modified(instance):
+            continue
+        state = inspect(instance)
+        current = row_pro_ids(instance, lambda field: [getattr(instance, field)], pro_ids)
+        previous = row_pro_ids(instance, lambda field: state.attrs[field].history.deleted or [], pro_ids)
+        for pro_id in current:
+            changes.append((pro_id, entity, instance.id, "upsert"))
+        for pro_id in set(previous) - set(current):
+            changes.append((pro_id, entity, instance.id, "delete"))
+    return [change for change in changes if change[0] is not None]
+
+
+def record_changes(changes, connection=None):
+    if not changes:
+        return
+    connection = connection or db.session.connection()
+    bump_versions({f"changes:{pro_id}" for pro_id, _, _, _ in changes}, connection)
+    now = datetime.datetime.utcnow()
+    connection.execute(ChangeLog.__table__.insert(),
+                       [{"pro_id": pro_id, "entity": entity, "entity_id": entity_id, "operation": operation,
+                         "changed_at": now} for pro_id, entity, entity_id, operation in changes])
+
+
+@event.listens_for(Session, "after_flush")
+def record_flushed_changes(session, flush_context):
+    record_changes(flushed_changes(session, flush_context), session.connection())
+
+
+# Current rows of `entity` of the pro, all of them or only those in `ids`
+def load_rows(entity, proid, ids=None):
+    if entity == "bookings":
+        query = Bookings.serialize_query().join(ProServices).filter(ProServices.pro_id == proid)
+        id_column = Bookings.id
+    else:
+        model = ENTITIES[entity]
+        query = model.serialize_query() if entity == "proservices" else model.query
+        query = query.filter(model.pro_id == proid)
+        id_column = model.id
+    if ids is not None:
+        query = query.filter(id_column.in_(ids))
+    return query.order_by(id_column).all()
+
+
+def current_token(proid):
+    return db.session.query(db.func.max(ChangeLog.id)).filter(ChangeLog.pro_id == proid).scalar() or 0
+
+
+# Every row of the pro and the token to ask for the changes that come after them
+def snapshot(proid):
+    # The token is read first, a change made meanwhile comes again in the next call
+    token = current_token(proid)
+    return {"changes": {entity: [row.serialize() for row in load_rows(entity, proid)] for entity in ENTITIES},
+            "deleted": {entity: [] for entity in ENTITIES},
+            "token": str(token),
+            "has_more": False}
+
+
+# Rows changed after `since`, up to `limit` change log entries, the latest state of each
+def changes_since(proid, since, limit=DEFAULT_LIMIT):
+    limit = max(1, min(limit, MAX_LIMIT))
+    entries = ChangeLog.query.filter(ChangeLog.pro_id == proid, ChangeLog.id > since) \
+                             .order_by(ChangeLog.id).limit(limit + 1).all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    latest = {}
+    for entry in entries:
+        latest[(entry.entity, entry.entity_id)] = entry.operation
+    changes = {entity: [] for entity in ENTITIES}
+    deleted = {entity: [] for entity in ENTITIES}
+    for entity in ENTITIES:
+        upserted = [entity_id for (name, entity_id), operation in latest.items() if name == entity and operation == "upsert"]
+        deleted[entity] = [entity_id for (name, entity_id), operation in latest.items() if name == entity and operation == "delete"]
+        if upserted:
+            rows = load_rows(entity, proid, upserted)
+            changes[entity] = [row.serialize() for row in rows]
+            # Gone or moved to another pro by a change after this page
+            found = {row.id for row in rows}
+            deleted[entity] += [entity_id for entity_id in upserted if entity_id not in found]
+        deleted[entity].sort()
+    return {"changes": changes,
+            "deleted": deleted,
+            "token": str(entries[-1].id if entries else since),
+            "has_more": has_more}
@@ -1,5 +1,14 @@
+import os
+import sys
+import json
+import time
 import click
+from flask import current_app
 from api.models import db, Pros, Locations, Services, ProServices, Hours, Patients, Bookings, InactivityDays
+from api.mailer import GmailTransport, FakeTransport, run_worker
+from api.benchmarks import bench_email_render, bench_endpoints, bench_booking_race, find_regressions, write_results, run_load
+from api.seed import seed_database, DEFAULT_START_DATE
+from api.profiler import PROFILE_DIR, list_profiles, summarize_profile
 
 """
 In this file, you can add as many commands as you want using the @app.cli.command decorator
@@ -149,3 +158,115 @@ def setup_commands(app):
             print("service: ", service.specialization, service.service_name, " created.")
         print("All test services created")
 
+    ## Synthetic dataset for load testing -> flask seed --pros 2000 --bookings-per-pro 5000
+    ## Same --seed and --start-date, same data. Rows are added after the existing ones.
+    @app.cli.command("seed")
+    @click.option("--pros", default=100, help="Pros to create")
+    @click.option("--bookings-per-pro", default=500, help="Bookings of every pro")
+    @click.option("--patients", default=None, type=int, help="Patients to create (default: 50 per pro)")
+    @click.option("--inactivities-per-pro", default=3, help="Holidays and days off of every pro")
+    @click.option("--seed", default=42, help="Random seed")
+    @click.option("--start-date", default=DEFAULT_START_DATE.isoformat(), type=click.DateTime(["%Y-%m-%d"]),
+                  help="First day of the bookings (YYYY-MM-DD)")
+    def seed(pros, bookings_per_pro, patients, inactivities_per_pro, seed, start_date):
+        start = time.perf_counter()
+        counts = seed_database(pros, bookings_per_pro, patients, inactivities_per_pro, seed, start_date.date())
+        print(f"-------------> {sum(counts.values())} rows created in {time.perf_counter() - start:.1f}s <-------------")
+
+    ## Sends the queued emails of the outbox -> flask mail-worker --workers 4
+    ## --fake <dir> writes the emails to <dir> as .eml files instead of sending them
+    @app.cli.command("mail-worker")
+    @click.option("--workers", default=4, help="Emails sent at the same time")
+    @click.option("--batch-size", default=50, help="Emails claimed from the outbox per batch")
+    @click.option("--poll-interval", default=2.0, help="Seconds to wait when the outbox is empty")
+    @click.option("--once", is_flag=True, help="Exit when there is nothing left to send")
+    @click.option("--fake", "fake_dir", default=None, help="Don't use Gmail, write the emails to this directory")
+    def mail_worker(workers, batch_size, poll_interval, once, fake_dir):
+        transport = FakeTransport(fake_dir) if fake_dir else GmailTransport()
+        print("Mail worker started with", workers, "workers")
+        run_worker(current_app._get_current_object(), transport, workers, batch_size, poll_interval, once)
+
+    ## Per message cost of rendering the confirmation email -> flask bench-email-render --count 2000
+    @app.cli.command("bench-email-render")
+    @click.option("--count", default=1000, help="Messages rendered per variant")
+    def bench_email_render_command(count):
+        results = bench_email_render(count)
+        print(f"uncached (logo read per message): {results['uncached_us']:.1f} us/message")
+        print(f"cached (compiled template + logo part): {results['cached_us']:.1f} us/message")
+
+    ## Throughput, latency percentiles and SQL statements per request of the hot API routes
+    ## -> flask bench-endpoints --output bench.json --baseline previous.json
+    ## Seeds the database first if it has no seed data. Exits with 1 if something got slower
+    ## than the baseline.
+    @app.cli.command("bench-endpoints")
+    @click.option("--requests", "requests_per_endpoint", default=200, help="Requests per endpoint")
+    @click.option("--output", default="bench-endpoints.json", help="JSON file the results are written to")
+    @click.option("--baseline", default=None, help="Results of a previous run to compare with")
+    @click.option("--tolerance", default=0.2, help="p95 growth allowed over the baseline (0.2 = 20%)")
+    def bench_endpoints_command(requests_per_endpoint, output, baseline, tolerance):
+        results = bench_endpoints(current_app._get_current_object(), requests_per_endpoint)
+        write_results(results, output)
+        print(f"{'endpoint':<20}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'sql/req':>10}")
+        for name, result in results["endpoints"].items():
+            print(f"{name:<20}{result['throughput_rps']:>10}{result['p50_ms']:>10}{result['p95_ms']:>10}"
+                  f"{result['p99_ms']:>10}{result['sql_per_request']:>10}")
+        print("Results written to", output)
+        if baseline:
+            with open(baseline) as baseline_file:
+                regressions = find_regressions(results, json.load(baseline_file), tolerance)
+            for regression in regressions:
+                print("REGRESSION", regression)
+            if regressions:
+                sys.exit(1)
+
+    ## Many clients booking the same slots at once -> flask bench-booking-race --threads 32 --slots 50
+    ## Exits with 1 if a slot was booked twice, or a request failed with something else than a 409
+    @app.cli.command("bench-booking-race")
+    @click.option("--threads", default=32, help="Concurrent clients")
+    @click.option("--slots", default=50, help="Slots every client tries to book")
+    @click.option("--output", default=None, help="JSON file the results are written to")
+    def bench_booking_race_command(threads, slots, output):
+        results = bench_booking_race(current_app._get_current_object(), threads, slots)
+        for key, value in results.items():
+            print(f"{key:<16}{value}")
+        if output:
+            write_results(results, output)
+            print("Results written to", output)
+        if results["double_booked"] or results["errors"] or results["unbooked"]:
+            sys.exit(1)
+
+    ## Request profiles saved with PROFILING_ENABLED=1 -> flask profiles list / flask profiles show <file>
+    @app.cli.group("profiles")
+    def profiles():
+        pass
+
+    @profiles.command("list")
+    @click.option("--directory", default=PROFILE_DIR, help="Directory of the profiles")
+    def profiles_list(directory):
+        saved_profiles = list_profiles(directory)
+        if not saved_profiles:
+            print("No profiles in", directory)
+        for filename, size, modified in saved_profiles:
+            print(f"{modified:%Y-%m-%d %H:%M:%S}  {size:>9}  {filename}")
+
+    @profiles.command("show")
+    @click.argument("filename")
+    @click.option("--directory", default=PROFILE_DIR, help="Directory of the profiles")
+    @click.option("--sort", default="cumulative", help="cumulative, tottime, calls...")
+    @click.option("--limit", default=25, help="Functions shown")
+    def profiles_show(filename, directory, sort, limit):
+        path = filename if os.path.isfile(filename) else os.path.join(directory, filename)
+        print(summarize_profile(path, sort, limit))
+
+    ## Concurrent load against a running server -> flask load-test http://127.0.0.1:8000/api/services
+    ## Several urls are requested round robin. Used for docs/LOAD_PROFILE.md
+    @app.cli.command("load-test")
+    @click.argument("urls", nargs=-1, required=True)
+    @click.option("--concurrency", default=16, help="Clients sending requests at the same time")
+    @click.option("--duration", default=10, help="Seconds")
+    @click.option("--output", default=None, help="JSON file the results are written to")
+    def load_test(urls, concurrency, duration, output):
+        results = run_load(list(urls), concurrency, duration)
+        print(json.dumps(results, indent=2))
+        if output:
+            write_results(results, output)
@@ -0,0 +1,51 @@
+"""
+Database engine settings.
+The connection pool and the statement timeout are configured from environment variables
+(see docs/LOAD_PROFILE.md for how they relate to the gunicorn workers):
+DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING and
+DB_STATEMENT_TIMEOUT_MS (Postgres only, 0 means no timeout).
+"""
+import os
+import time
+from sqlalchemy import text
+
+
+def env_flag(name, default):
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+# SQLALCHEMY_ENGINE_OPTIONS for `database_url`
+def engine_options(database_url):
+    if database_url.startswith("sqlite"):
+        # SQLite uses a pool of its own that takes none of these options
+        return {}
+    options = {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 10)),
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", 10)),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": env_flag("DB_POOL_PRE_PING", "1"),
+    }
+    statement_timeout = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 15000))
+    if statement_timeout and database_url.startswith("postgresql"):
+        options["connect_args"] = {"options": f"-c statement_timeout={statement_timeout}"}
+    return options
+
+
+# Pool usage and a round trip to the database, for GET /health
+def database_health(engine):
+    pool = engine.pool
+    health = {"pool": pool.__class__.__name__}
+    for name in ("size", "checkedout", "overflow", "checkedin"):
+        if hasattr(pool, name):
+            health[name] = getattr(pool, name)()
+    start = time.perf_counter()
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        health["status"] = "ok"
+    except Exception as error:
+        health["status"] = "error"
+        health["error"] = str(error)
+    health["ping_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return health
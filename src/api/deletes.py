@@ -0,0 +1,47 @@
+"""
+Deletes of a pro or a patient with every row that depends on them
+(DELETE /api/pros/<proid>, DELETE /api/patients/<patientid>).
+They take the same few set-based DELETE statements in one transaction whether there are ten
+bookings or fifty thousand, instead of loading and deleting the rows one by one. On Postgres
+the foreign keys also cascade (ON DELETE CASCADE), the statements are still run in dependency
+order so SQLite, which doesn't enforce them here, never keeps orphans either. They bypass the
+ORM, so the resource versions and the change log are updated here, starting with the bumps
+that lock the rows of the pros involved.
+"""
+from api.models import db, Pros, Patients, Locations, Hours, InactivityDays, ProServices, Bookings, EmailOutbox, ChangeLog
+from api.resource_versions import bump_versions
+from api.change_feed import record_changes
+
+
+# Deletes the pro, its location, hours, inactivity days, services, their bookings, the emails
+# and the change log of the pro. The caller commits.
+def delete_pro(pro):
+    proid = pro.id
+    location_ids = [location_id for (location_id,) in db.session.query(Locations.id).filter(Locations.pro_id == proid)]
+    bump_versions([f"pro:{pro.bookingpage_url}", f"proservices:{proid}", f"hours:{proid}", f"locations:{proid}",
+                   f"inactivity:{proid}", f"bookings:{proid}"] +
+                  [f"location_hours:{location_id}" for location_id in location_ids])
+    pro_services = db.select(ProServices.id).where(ProServices.pro_id == proid)
+    for statement in [EmailOutbox.__table__.delete().where(EmailOutbox.pro_id == proid),
+                      Bookings.__table__.delete().where(Bookings.pro_service_id.in_(pro_services)),
+                      Hours.__table__.delete().where(Hours.pro_id == proid),
+                      InactivityDays.__table__.delete().where(InactivityDays.pro_id == proid),
+                      ProServices.__table__.delete().where(ProServices.pro_id == proid),
+                      Locations.__table__.delete().where(Locations.pro_id == proid),
+                      ChangeLog.__table__.delete().where(ChangeLog.pro_id == proid),
+                      Pros.__table__.delete().where(Pros.id == proid)]:
+        db.session.execute(statement)
+
+
+# Deletes the patient, their bookings and the emails of those. The pros of the bookings see
+# them deleted in their change feed. The caller commits.
+def delete_patient(patient):
+    bookings = db.session.query(Bookings.id, ProServices.pro_id).join(ProServices) \
+                         .filter(Bookings.patient_id == patient.id).all()
+    bump_versions({f"bookings:{pro_id}" for _, pro_id in bookings})
+    record_changes([(pro_id, "bookings", booking_id, "delete") for booking_id, pro_id in bookings])
+    patient_bookings = db.select(Bookings.id).where(Bookings.patient_id == patient.id)
+    for statement in [EmailOutbox.__table__.delete().where(EmailOutbox.booking_id.in_(patient_bookings)),
+                      Bookings.__table__.delete().where(Bookings.patient_id == patient.id),
+                      Patients.__table__.delete().where(Patients.id == patient.id)]:
+        db.session.execute(statement)
@@ -0,0 +1,64 @@
+"""
+Email rendering.
+The templates in api/templates/emails are compiled once and the logo is read, wrapped in
+its MIME part and serialized once per process, so rendering a message only fills the
+template in and serializes the html part; the logo bytes are spliced in as they are.
+"""
+import os
+import uuid
+import base64
+import threading
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.mime.image import MIMEImage
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+
+API_DIR = os.path.dirname(os.path.realpath(__file__))
+TEMPLATES_DIR = os.path.join(API_DIR, 'templates', 'emails')
+LOGO_PATH = os.path.join(API_DIR, '../front/img/docdate_logo.png')
+BOOKING_CONFIRMATION = 'booking_confirmation.html'
+
+_environment = Environment(loader=FileSystemLoader(TEMPLATES_DIR),
+                           autoescape=select_autoescape(['html']),
+                           auto_reload=False)
+_templates = {}
+_logo_part = None
+_logo_bytes = None
+_load_lock = threading.Lock()
+
+
+def build_logo_part():
+    with open(LOGO_PATH, 'rb') as imagen_file:
+        imagen_adjunta = MIMEImage(imagen_file.read())
+    imagen_adjunta.add_header('Content-ID', '<imagen_id>')
+    return imagen_adjunta
+
+
+# Compile every email template and load the logo. Called when the app starts,
+# render_message() also calls it the first time if it wasn't.
+def load_templates():
+    global _logo_part, _logo_bytes
+    with _load_lock:
+        for name in _environment.list_templates():
+            _templates[name] = _environment.get_template(name)
+        _logo_part = build_logo_part()
+        _logo_bytes = _logo_part.as_bytes()
+
+
+# Render `template_name` with `context` and return the finished message encoded as the
+# Gmail API expects it (urlsafe base64 of the raw MIME message)
+def render_message(template_name, receiver, subject, **context):
+    if _logo_bytes is None:
+        load_templates()
+    # A random boundary given up front saves the generator from searching the body for a free one
+    boundary = uuid.uuid4().hex
+    mensaje = MIMEMultipart(boundary=boundary)
+    mensaje['to'] = receiver
+    mensaje['subject'] = subject
+    mensaje.attach(MIMEText(_templates[template_name].render(**context), 'html'))
+    # Same bytes as attaching the logo part before as_bytes(), without serializing it again
+    closing = f"--{boundary}--".encode()
+    head, _, tail = mensaje.as_bytes().rpartition(closing)
+    raw = head + f"--{boundary}\n".encode() + _logo_bytes + b"\n" + closing + tail
+    return base64.urlsafe_b64encode(raw).decode('utf-8')
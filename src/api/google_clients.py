@@ -0,0 +1,77 @@
+"""
+Per-process cache of Google API clients.
+Building a client means parsing a discovery document of 100KB+, so every pro gets its
+client built once per API and it's reused until its Google tokens change. The discovery
+documents come from the copies bundled with google-api-python-client and are parsed once,
+so no network request is made to build a client.
+"""
+import os
+import json
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from google.oauth2.credentials import Credentials
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+
+
+MAX_CLIENTS = int(os.getenv("GOOGLE_CLIENT_CACHE_SIZE", 256))
+# (api name, version, scope)
+GMAIL = ("gmail", "v1", "https://www.googleapis.com/auth/gmail.send")
+CALENDAR = ("calendar", "v3", "https://www.googleapis.com/auth/calendar")
+
+_documents = {}
+_clients = OrderedDict()  # (pro_id, scope) -> (token fingerprint, client, lock)
+_cache_lock = threading.Lock()
+
+
+def discovery_document(name, version):
+    if (name, version) not in _documents:
+        _documents[(name, version)] = json.loads(discovery_cache.get_static_doc(name, version))
+    return _documents[(name, version)]
+
+
+def build_client(pro, api):
+    name, version, scope = api
+    token_info = {
+        "token": pro.google_access_token,
+        "refresh_token": pro.google_refresh_token,
+        "token_uri": "https://oauth2.googleapis.com/token",
+        "client_id": os.getenv("GOOGLE_CLIENT_ID"),
+        "client_secret": os.getenv("GOOGLE_CLIENT_SECRET"),
+        "scopes": [scope],
+        "expiry": pro.google_access_expires
+    }
+    creds = Credentials.from_authorized_user_info(token_info, [scope])
+    return build_from_document(discovery_document(name, version), credentials=creds)
+
+
+# Yields the pro's client for `api`, building it if it isn't cached or the pro's tokens
+# changed. The underlying http connection isn't thread safe, so the client is locked
+# while it's in use.
+@contextmanager
+def google_service(pro, api):
+    key = (pro.id, api[2])
+    fingerprint = (pro.google_access_token, pro.google_refresh_token)
+    with _cache_lock:
+        entry = _clients.get(key)
+        if entry is not None and entry[0] == fingerprint:
+            _clients.move_to_end(key)
+        else:
+            entry = None
+    if entry is None:
+        entry = (fingerprint, build_client(pro, api), threading.Lock())
+        with _cache_lock:
+            _clients[key] = entry
+            _clients.move_to_end(key)
+            while len(_clients) > MAX_CLIENTS:
+                _clients.popitem(last=False)
+    with entry[2]:
+        yield entry[1]
+
+
+# Drop every cached client of a pro, called whenever its Google tokens are updated
+def invalidate_pro(pro_id):
+    with _cache_lock:
+        for key in [key for key in _clients if key[0] == pro_id]:
+            del _clients[key]
@@ -0,0 +1,71 @@
+"""
+National holidays per country and year.
+The list of a (year, country) pair never changes for a given version of the holidays
+package, so it's computed once and memoized (bounded LRU), and the JSON body served by
+GET /api/get_holidays is memoized too together with its ETag.
+"""
+import os
+import hashlib
+import datetime
+from functools import lru_cache
+import holidays
+from flask import jsonify
+
+
+HOLIDAY_CACHE_SIZE = int(os.getenv("HOLIDAY_CACHE_SIZE", 512))
+
+# Country name used by the app -> (holidays class, language of the holiday names)
+COUNTRIES = {
+    "Germany": (holidays.Germany, "de"),
+    "Spain": (holidays.Spain, "es"),
+    "France": (holidays.France, "fr"),
+    "Italy": (holidays.Italy, "it"),
+    "United Kingdom": (holidays.UnitedKingdom, "en"),
+    "Portugal": (holidays.Portugal, "pt"),
+    "Netherlands": (holidays.Netherlands, "nl"),
+    "Belgium": (holidays.Belgium, "nl"),
+    "Switzerland": (holidays.Switzerland, "de"),
+    "Austria": (holidays.Austria, "de"),
+    "Greece": (holidays.Greece, "el"),
+    "Sweden": (holidays.Sweden, "sv"),
+    "Norway": (holidays.Norway, "no"),
+    "Denmark": (holidays.Denmark, "da"),
+    "Finland": (holidays.Finland, "fi"),
+    "Ireland": (holidays.Ireland, "en"),
+}
+
+
+# ((date, name), ...) sorted by date, empty for countries we don't support
+@lru_cache(maxsize=HOLIDAY_CACHE_SIZE)
+def holiday_items(year, country):
+    if country not in COUNTRIES:
+        return ()
+    holidays_class, language = COUNTRIES[country]
+    holidays_country = holidays_class(years=year, observed=False, language=language)
+    return tuple(sorted(holidays_country.items()))
+
+
+def get_holidays(year, country):
+    return [{"date": date, "holiday": holiday} for date, holiday in holiday_items(year, country)]
+
+
+def holiday_dates(year, country):
+    return {date for date, holiday in holiday_items(year, country)}
+
+
+# (body, etag) of the GET /api/get_holidays response, needs an app context
+@lru_cache(maxsize=HOLIDAY_CACHE_SIZE)
+def holidays_response_body(year, country):
+    body = jsonify({"holidays": get_holidays(year, country)}).get_data()
+    return body, hashlib.md5(body).hexdigest()
+
+
+# Compute the current and next year of every supported country so the first
+# requests don't pay for it
+def precompute_holidays(years=None):
+    if years is None:
+        current_year = datetime.date.today().year
+        years = (current_year, current_year + 1)
+    for year in years:
+        for country in COUNTRIES:
+            holiday_items(year, country)
@@ -0,0 +1,216 @@
+"""
+Per-request performance metrics.
+Every request records its latency, response size, SQL statements, time spent in the
+database and time waited for a pooled connection. They are aggregated per endpoint in
+memory (a few counters per request, no per-request storage) and exposed in Prometheus
+text format on GET /metrics; each response also carries them in a Server-Timing header.
+"""
+import os
+import time
+import threading
+from flask import request, Response
+from sqlalchemy import event
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+STATEMENT_BUCKETS = (1, 2, 3, 5, 10, 25, 50, 100)
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}    # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+        self.gauges = {}      # name -> (help, function returning [(labels, value)])
+        self.buckets = {}
+        self.help = {}
+
+    def counter(self, name, help_text):
+        self.help[name] = ("counter", help_text)
+
+    def histogram(self, name, help_text, buckets):
+        self.help[name] = ("histogram", help_text)
+        self.buckets[name] = buckets
+
+    # `function` is called on every scrape and returns [(labels, value), ...]
+    def gauge(self, name, help_text, function):
+        self.help[name] = ("gauge", help_text)
+        self.gauges[name] = function
+
+    def inc(self, name, labels=(), value=1):
+        with self.lock:
+            self.counters[(name, labels)] = self.counters.get((name, labels), 0) + value
+
+    def observe(self, name, labels, value):
+        buckets = self.buckets[name]
+        with self.lock:
+            series = self.histograms.get((name, labels))
+            if series is None:
+                series = self.histograms[(name, labels)] = [0] * (len(buckets) + 2)
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: list(series) for key, series in self.histograms.items()}
+        lines = []
+        for name, (kind, help_text) in self.help.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for (series_name, labels), value in counters.items():
+                    if series_name == name:
+                        lines.append(f"{name}{format_labels(labels)} {value}")
+            elif kind == "gauge":
+                for labels, value in self.gauges[name]():
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+            else:
+                for (series_name, labels), series in histograms.items():
+                    if series_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(self.buckets[name], series):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{format_labels(labels + (('le', bound),))} {cumulative}")
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {series[-1]}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {series[-2]}")
+                    lines.append(f"{name}_count{format_labels(labels)} {series[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+metrics = Metrics()
+metrics.counter("docdate_http_requests_total", "Requests by endpoint, method and status code.")
+metrics.histogram("docdate_http_request_duration_seconds", "Request latency by endpoint.", LATENCY_BUCKETS)
+metrics.histogram("docdate_http_response_size_bytes", "Response body size by endpoint.", SIZE_BUCKETS)
+metrics.histogram("docdate_db_statements_per_request", "SQL statements issued per request by endpoint.", STATEMENT_BUCKETS)
+metrics.counter("docdate_db_statements_total", "SQL statements issued by endpoint.")
+metrics.counter("docdate_db_duration_seconds_total", "Time spent executing SQL by endpoint.")
+metrics.histogram("docdate_db_pool_wait_seconds", "Time waited for a pooled database connection.", POOL_WAIT_BUCKETS)
+
+# Per thread counters of the request being served, None outside requests
+_current = threading.local()
+# Moving average of the pool waits, it halves every POOL_WAIT_HALF_LIFE seconds without
+# checkouts so it goes back down once the pool is free (see api/rate_limits.py)
+POOL_WAIT_HALF_LIFE = 10
+POOL_WAIT_WEIGHT = 0.2
+_pool_wait = {"average": 0.0, "at": time.monotonic()}
+_pool_wait_lock = threading.Lock()
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start"] = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = getattr(_current, "stats", None)
+    if stats is not None:
+        stats["statements"] += 1
+        stats["db"] += time.perf_counter() - conn.info.pop("query_start", time.perf_counter())
+
+
+def decayed_pool_wait(now):
+    return _pool_wait["average"] * 0.5 ** ((now - _pool_wait["at"]) / POOL_WAIT_HALF_LIFE)
+
+
+def recent_pool_wait():
+    with _pool_wait_lock:
+        return decayed_pool_wait(time.monotonic())
+
+
+def record_pool_wait(waited):
+    now = time.monotonic()
+    with _pool_wait_lock:
+        average = decayed_pool_wait(now)
+        _pool_wait["average"] = average + (waited - average) * POOL_WAIT_WEIGHT
+        _pool_wait["at"] = now
+
+
+# The pool has no event before a checkout, so its connect() is wrapped to time the wait
+def instrument_pool(pool):
+    connect = pool.connect
+
+    def timed_connect(*args, **kwargs):
+        start = time.perf_counter()
+        connection = connect(*args, **kwargs)
+        waited = time.perf_counter() - start
+        metrics.observe("docdate_db_pool_wait_seconds", (), waited)
+        record_pool_wait(waited)
+        stats = getattr(_current, "stats", None)
+        if stats is not None:
+            stats["pool"] += waited
+        return connection
+
+    pool.connect = timed_connect
+
+
+def pool_status(engine):
+    pool = engine.pool
+    status = []
+    for name in ("size", "checkedout", "overflow", "checkedin"):
+        if hasattr(pool, name):
+            status.append(((("state", name),), getattr(pool, name)()))
+    return status
+
+
+def start_request():
+    _current.stats = {"start": time.perf_counter(), "statements": 0, "db": 0.0, "pool": 0.0}
+
+
+def finish_request(response):
+    stats = getattr(_current, "stats", None)
+    if stats is None:
+        return response
+    _current.stats = None
+    elapsed = time.perf_counter() - stats["start"]
+    endpoint = request.endpoint or "unmatched"
+    labels = (("endpoint", endpoint),)
+    metrics.inc("docdate_http_requests_total",
+                labels + (("method", request.method), ("status", response.status_code)))
+    metrics.observe("docdate_http_request_duration_seconds", labels, elapsed)
+    metrics.observe("docdate_http_response_size_bytes", labels, response.content_length or 0)
+    metrics.observe("docdate_db_statements_per_request", labels, stats["statements"])
+    if stats["statements"]:
+        metrics.inc("docdate_db_statements_total", labels, stats["statements"])
+        metrics.inc("docdate_db_duration_seconds_total", labels, stats["db"])
+    response.headers.add("Server-Timing",
+                         f'app;dur={elapsed * 1000:.1f}, '
+                         f'db;dur={stats["db"] * 1000:.1f};desc="{stats["statements"]} queries", '
+                         f'pool;dur={stats["pool"] * 1000:.1f}')
+    return response
+
+
+# If METRICS_TOKEN is set, /metrics asks for it as a bearer token
+def metrics_view():
+    token = os.getenv("METRICS_TOKEN")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return Response("Unauthorized\n", status=401, mimetype="text/plain")
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+def setup_instrumentation(app, db):
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    instrument_pool(engine.pool)
+    # dispose() replaces the pool with a new one
+    event.listen(engine, "engine_disposed", lambda engine: instrument_pool(engine.pool))
+    metrics.gauge("docdate_db_pool_connections", "Connections of the pool by state.", lambda: pool_status(engine))
+    metrics.gauge("docdate_db_pool_wait_recent_seconds", "Moving average of the time waited for a pooled connection.",
+                  lambda: [((), round(recent_pool_wait(), 6))])
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
@@ -0,0 +1,139 @@
+"""
+Confirmation emails: every email goes through the EmailOutbox table and is sent by a
+background worker (flask mail-worker), so the HTTP request only has to insert one row.
+"""
+import os
+import time
+import base64
+import datetime
+from os.path import join
+from concurrent.futures import ThreadPoolExecutor
+from api.models import db, Pros, Bookings, EmailOutbox
+from api.google_clients import google_service, GMAIL
+from api.email_templates import render_message, BOOKING_CONFIRMATION
+
+
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 30
+# A row stuck in "sending" (worker killed mid send) is picked up again after this long
+SENDING_TIMEOUT_SECONDS = 600
+
+
+# Sends through the Gmail API on behalf of the pro
+class GmailTransport:
+
+    def send(self, pro, raw_message):
+        with google_service(pro, GMAIL) as servicio_gmail:
+            servicio_gmail.users().messages().send(userId='me', body={'raw': raw_message}).execute()
+
+
+# Local transport for development and tests: keeps the messages in memory and, if a
+# directory is given, writes each one there as an .eml file. It can be told to fail
+# the first N sends to exercise the retries.
+class FakeTransport:
+
+    def __init__(self, directory=None, fail_times=0):
+        self.directory = directory
+        self.fail_times = fail_times
+        self.sent = []
+
+    def send(self, pro, raw_message):
+        if self.fail_times > 0:
+            self.fail_times -= 1
+            raise RuntimeError("fake transport failure")
+        self.sent.append((pro.id, raw_message))
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            file_name = f"{pro.id}-{time.time_ns()}.eml"
+            with open(join(self.directory, file_name), 'wb') as eml_file:
+                eml_file.write(base64.urlsafe_b64decode(raw_message))
+
+
+def enqueue_email(pro_id, booking_id, receiver, subject):
+    email = EmailOutbox(pro_id=pro_id,
+                        booking_id=booking_id,
+                        receiver=receiver,
+                        subject=subject,
+                        status="pending",
+                        attempts=0,
+                        next_attempt_at=datetime.datetime.utcnow())
+    db.session.add(email)
+    db.session.commit()
+    return email
+
+
+# Mark up to `limit` due emails as "sending" and return their ids. On Postgres the rows
+# are locked with SKIP LOCKED so several workers never claim the same email.
+def claim_emails(limit):
+    now = datetime.datetime.utcnow()
+    emails = EmailOutbox.query \
+        .filter(EmailOutbox.status.in_(("pending", "sending")),
+                EmailOutbox.next_attempt_at <= now) \
+        .order_by(EmailOutbox.next_attempt_at) \
+        .limit(limit) \
+        .with_for_update(skip_locked=True) \
+        .all()
+    for email in emails:
+        email.status = "sending"
+        email.attempts += 1
+        email.next_attempt_at = now + datetime.timedelta(seconds=SENDING_TIMEOUT_SECONDS)
+    db.session.commit()
+    return [email.id for email in emails]
+
+
+# Render and send one claimed email, then record the result
+def deliver_email(email_id, transport):
+    email = EmailOutbox.query.get(email_id)
+    try:
+        pro = Pros.query.get(email.pro_id)
+        booking = Bookings.serialize_query().filter_by(id=email.booking_id).first()
+        if not pro or not booking:
+            raise LookupError("pro or booking not found")
+        final_booking = booking.serialize()
+        raw_message = render_message(BOOKING_CONFIRMATION, email.receiver, email.subject,
+                                     pro=pro,
+                                     service_name=final_booking["service_name"],
+                                     date=final_booking["date"],
+                                     starting_time=final_booking["starting_time"])
+        transport.send(pro, raw_message)
+    except Exception as e:
+        email.last_error = str(e)
+        if email.attempts >= MAX_ATTEMPTS:
+            email.status = "failed"
+        else:
+            email.status = "pending"
+            delay = RETRY_BASE_SECONDS * 2 ** (email.attempts - 1)
+            email.next_attempt_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=delay)
+    else:
+        email.status = "sent"
+        email.sent_at = datetime.datetime.utcnow()
+        email.last_error = None
+    db.session.commit()
+    return email.status
+
+
+# Claim one batch and send it with at most `workers` emails in flight.
+# Returns {status: count} for the batch.
+def drain_outbox(app, transport, workers=4, batch_size=50):
+    email_ids = claim_emails(batch_size)
+
+    def run(email_id):
+        with app.app_context():
+            return deliver_email(email_id, transport)
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for status in executor.map(run, email_ids):
+            results[status] = results.get(status, 0) + 1
+    return results
+
+
+def run_worker(app, transport, workers=4, batch_size=50, poll_interval=2, once=False):
+    while True:
+        results = drain_outbox(app, transport, workers, batch_size)
+        if results:
+            print("Outbox batch:", results)
+        if once and not results:
+            return
+        if not results:
+            time.sleep(poll_interval)
@@ -1,8 +1,41 @@
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy.orm import joinedload, selectinload, validates
+from api.utils import to_date, to_time
 
 from datetime import datetime
 
-db = SQLAlchemy()
+
+# While a batch runs as one transaction (see api/batch.py) commit() only flushes and close()
+# does nothing, the batch commits or rolls back everything at the end. A rollback() undoes the
+# whole batch, it's noted so the batch stops.
+class BatchSession(Session):
+    def commit(self):
+        if "batch" in self.info:
+            self.flush()
+        else:
+            super().commit()
+
+    def rollback(self):
+        if "batch" in self.info:
+            self.info["batch"]["rolled_back"] = True
+        super().rollback()
+
+    def close(self):
+        if "batch" not in self.info:
+            super().close()
+
+
+db = SQLAlchemy(session_options={"class_": BatchSession})
+
+
+def format_date(value):
+    return value.isoformat() if value else None
+
+
+def format_time(value):
+    return value.strftime("%H:%M") if value else None
+
 
 class Pros(db.Model):
     __tablename__ = "pros"
@@ -19,9 +52,10 @@ class Pros(db.Model):
     google_access_token = db.Column(db.String)
     google_access_expires = db.Column(db.String)
     google_refresh_token = db.Column(db.String)
-    location = db.relationship("Locations")
-    inactivity = db.relationship("InactivityDays")
-    services = db.relationship("ProServices")
+    # Rows of a deleted pro go with the ON DELETE CASCADE of their foreign key, see api/deletes.py
+    location = db.relationship("Locations", passive_deletes=True)
+    inactivity = db.relationship("InactivityDays", passive_deletes=True)
+    services = db.relationship("ProServices", passive_deletes=True)
 
     def __repr__(self):
         return f'<User {self.name}, {self.email}>'
@@ -44,7 +78,7 @@ class Locations(db.Model):
     city = db.Column(db.String, nullable=False)
     country = db.Column(db.String, nullable=False)
     time_zone = db.Column(db.String)
-    pro_id = db.Column(db.ForeignKey("pros.id"), unique=True, nullable=False)
+    pro_id = db.Column(db.ForeignKey("pros.id", ondelete="CASCADE"), unique=True, nullable=False)
     pro = db.relationship("Pros")
 
     def __repr__(self):
@@ -62,14 +96,16 @@ class Locations(db.Model):
 
 class Hours(db.Model):
     __tablename__ = "hours"
+    __table_args__ = (db.Index("ix_hours_pro_id", "pro_id"),
+                      db.Index("ix_hours_location_id", "location_id"))
     id = db.Column(db.Integer, primary_key=True)
     working_day = db.Column(db.Integer, nullable=False) 
     starting_hour_morning = db.Column(db.String, nullable=False)
     ending_hour_morning = db.Column(db.String, nullable=False)
     starting_hour_after = db.Column(db.String)
     ending_hour_after = db.Column(db.String)
-    pro_id = db.Column(db.ForeignKey("pros.id"), nullable=False)
-    location_id = db.Column(db.ForeignKey("locations.id"), nullable=False)
+    pro_id = db.Column(db.ForeignKey("pros.id", ondelete="CASCADE"), nullable=False)
+    location_id = db.Column(db.ForeignKey("locations.id", ondelete="CASCADE"), nullable=False)
     pro = db.relationship("Pros")
     locations = db.relationship("Locations")
 
@@ -87,26 +123,36 @@ class Hours(db.Model):
 
 class InactivityDays(db.Model):
     __tablename__ = "inactivity"
+    __table_args__ = (db.Index("ix_inactivity_pro_id_starting_date", "pro_id", "starting_date"),)
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String)
-    starting_date = db.Column(db.String, nullable=False)
-    ending_date = db.Column(db.String)
-    starting_hour = db.Column(db.String)
-    ending_hour = db.Column(db.String)
+    starting_date = db.Column(db.Date, nullable=False)
+    ending_date = db.Column(db.Date)
+    starting_hour = db.Column(db.Time)
+    ending_hour = db.Column(db.Time)
     type = db.Column(db.String)
-    pro_id = db.Column(db.ForeignKey("pros.id"), nullable=False)
+    pro_id = db.Column(db.ForeignKey("pros.id", ondelete="CASCADE"), nullable=False)
     pro = db.relationship("Pros")
 
     def __repr__(self):
         return f'<Inactivity Days {self.id}, {self.title}, {self.pro_id}, {self.starting_date}, {self.ending_date}, {self.starting_hour}, {self.ending_hour}>'
 
+    # The API still sends and receives "YYYY-MM-DD" and "HH:MM" strings
+    @validates("starting_date", "ending_date")
+    def validate_date(self, key, value):
+        return to_date(value)
+
+    @validates("starting_hour", "ending_hour")
+    def validate_time(self, key, value):
+        return to_time(value)
+
     def serialize(self):
         return {"id": self.id,
                 "title": self.title,
-                "starting_date": self.starting_date,
-                "ending_date": self.ending_date,
-                "starting_hour": self.starting_hour,
-                "ending_hour": self.ending_hour,
+                "starting_date": format_date(self.starting_date),
+                "ending_date": format_date(self.ending_date),
+                "starting_hour": format_time(self.starting_hour),
+                "ending_hour": format_time(self.ending_hour),
                 "type": self.type,
                 "pro_id": self.pro_id,}
 
@@ -128,9 +174,10 @@ class Services(db.Model):
 
 class ProServices(db.Model):
     __tablename__ = "pro_services"
+    __table_args__ = (db.Index("ix_pro_services_pro_id", "pro_id"),)
     id = db.Column(db.Integer, primary_key=True)
     price = db.Column(db.Integer)
-    pro_id = db.Column(db.ForeignKey("pros.id"), nullable=False)
+    pro_id = db.Column(db.ForeignKey("pros.id", ondelete="CASCADE"), nullable=False)
     duration = db.Column(db.Integer, nullable=False)
     service_id = db.Column(db.ForeignKey("services.id"), nullable=False)
     activated = db.Column(db.Boolean)
@@ -140,6 +187,11 @@ class ProServices(db.Model):
     def __repr__(self):
         return f'<Pro services {self.price}, {self.pro_id}, {self.service_id}, {self.pros.email}>'
 
+    # Query that loads everything serialize() needs in a fixed number of statements
+    @classmethod
+    def serialize_query(cls):
+        return cls.query.options(joinedload(cls.services))
+
     def serialize(self):
         return {"pro_id": self.pro_id,
                 "id": self.id,
@@ -171,24 +223,43 @@ class Patients(db.Model):
 
 class Bookings(db.Model):
     __tablename__ = "bookings"
+    __table_args__ = (db.Index("ix_bookings_pro_service_id_date_starting_time", "pro_service_id", "date", "starting_time"),
+                      # A pro's patients and their visits, without reading the bookings rows
+                      db.Index("ix_bookings_pro_service_id_patient_id", "pro_service_id", "patient_id", "date"),
+                      db.Index("ix_bookings_patient_id", "patient_id"))
     id = db.Column(db.Integer, primary_key=True)
-    date = db.Column(db.String, nullable=False)
-    starting_time = db.Column(db.String, nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    starting_time = db.Column(db.Time, nullable=False)
     status = db.Column(db.String, nullable=False)
     pro_notes = db.Column(db.String)
     patient_notes = db.Column(db.String)
-    pro_service_id = db.Column(db.ForeignKey("pro_services.id"), nullable=False)
-    patient_id = db.Column(db.ForeignKey("patients.id"), nullable=False)
+    pro_service_id = db.Column(db.ForeignKey("pro_services.id", ondelete="CASCADE"), nullable=False)
+    patient_id = db.Column(db.ForeignKey("patients.id", ondelete="CASCADE"), nullable=False)
     pro_service = db.relationship("ProServices")
     patient = db.relationship("Patients")
 
     def __repr__(self):
         return f'<Booking {self.id}, {self.date}>'
 
+    # Query that loads everything serialize() needs in a fixed number of statements
+    @classmethod
+    def serialize_query(cls):
+        return cls.query.options(joinedload(cls.patient),
+                                 joinedload(cls.pro_service).joinedload(ProServices.services),
+                                 joinedload(cls.pro_service).joinedload(ProServices.pros).selectinload(Pros.location))
+
+    @validates("date")
+    def validate_date(self, key, value):
+        return to_date(value)
+
+    @validates("starting_time")
+    def validate_time(self, key, value):
+        return to_time(value)
+
     def serialize(self):
         return {"id": self.id,
-                "date": self.date,
-                "starting_time": self.starting_time,
+                "date": format_date(self.date),
+                "starting_time": format_time(self.starting_time),
                 "status": self.status,
                 "patient_id": self.patient_id,
                 "pro_service_id": self.pro_service_id,
@@ -203,9 +274,64 @@ class Bookings(db.Model):
                 "pro_notes": self.pro_notes,
                 "time_zone": self.pro_service.pros.location[0].time_zone}
 
+class EmailOutbox(db.Model):
+    __tablename__ = "email_outbox"
+    __table_args__ = (db.Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+                      db.Index("ix_email_outbox_pro_id", "pro_id"),
+                      db.Index("ix_email_outbox_booking_id", "booking_id"))
+    id = db.Column(db.Integer, primary_key=True)
+    pro_id = db.Column(db.ForeignKey("pros.id", ondelete="CASCADE"), nullable=False)
+    booking_id = db.Column(db.ForeignKey("bookings.id", ondelete="CASCADE"), nullable=False)
+    receiver = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="pending")  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.String)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
 
+    def __repr__(self):
+        return f'<Email {self.id}, {self.receiver}, {self.status}>'
 
-    
+    def serialize(self):
+        return {"id": self.id,
+                "pro_id": self.pro_id,
+                "booking_id": self.booking_id,
+                "receiver": self.receiver,
+                "subject": self.subject,
+                "status": self.status,
+                "attempts": self.attempts,
+                "last_error": self.last_error,
+                "created_at": self.created_at.isoformat() if self.created_at else None,
+                "sent_at": self.sent_at.isoformat() if self.sent_at else None}
+
+class ResourceVersions(db.Model):
+    __tablename__ = "resource_versions"
+    name = db.Column(db.String(120), primary_key=True)  # eg: "hours:12", see api/resource_versions.py
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ResourceVersion {self.name}, {self.version}>'
+
+class ChangeLog(db.Model):
+    __tablename__ = "change_log"
+    __table_args__ = (db.Index("ix_change_log_pro_id_id", "pro_id", "id"),)
+    id = db.Column(db.Integer, primary_key=True)  # the change sequence, see api/change_feed.py
+    pro_id = db.Column(db.Integer, nullable=False)
+    entity = db.Column(db.String(20), nullable=False)  # bookings, inactivity, hours, proservices
+    entity_id = db.Column(db.Integer, nullable=False)
+    operation = db.Column(db.String(10), nullable=False)  # upsert, delete
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
+    def __repr__(self):
+        return f'<Change {self.id}, {self.pro_id}, {self.entity}, {self.entity_id}, {self.operation}>'
 
+class RateLimitBuckets(db.Model):
+    __tablename__ = "rate_limit_buckets"
+    name = db.Column(db.String(200), primary_key=True)  # eg: "login:ip:203.0.113.7", see api/rate_limits.py
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False)  # unix time
 
+    def __repr__(self):
+        return f'<RateLimitBucket {self.name}, {self.tokens}>'
@@ -0,0 +1,139 @@
+"""
+Search of a pro's patients (GET /api/pros/<proid>/patients/search?q=).
+A pro's patients are those with a booking of one of the pro's services, read through the
+(pro_service_id, patient_id, date) index of bookings, so the work depends on the size of the
+pro's practice and not on the patients table. A patient matches when every word of q is
+found in their name, lastname, email or phone: at the start of one of their words (scores
+3), anywhere (2), or fuzzily, sharing at least FUZZY_THRESHOLD of the word's trigrams with
+one of theirs (the share), so a typo still finds them. Best scores come first.
+
+Postgres scores in SQL with pg_trgm, its GIN index on SEARCH_TEXT_SQL lets the planner
+start from the matching patients when that's cheaper than from the pro's. SQLite can't
+compute trigram similarity, so the pro's patients are scored here the way pg_trgm would.
+"""
+import re
+import functools
+from api.models import db, Patients, Bookings, ProServices
+
+
+FUZZY_THRESHOLD = 0.4
+MAX_TERMS = 5
+MAX_TERM_LENGTH = 50
+WORD_SEPARATORS = re.compile(r"[\s.@_+-]+")
+# Must stay the same as the expression of the ix_patients_search_text index
+SEARCH_TEXT_SQL = "lower(patients.name || ' ' || patients.lastname || ' ' || patients.email || ' ' || coalesce(patients.phone, ''))"
+# The search text with a space before every word, for the start of word test
+WORDS_SQL = ("' ' || replace(replace(replace(replace(replace("
+             f"{SEARCH_TEXT_SQL}, '.', ' '), '@', ' '), '_', ' '), '+', ' '), '-', ' ')")
+
+
+# Lowercase words of q, eg: "Ana  GARCIA" -> ["ana", "garcia"]
+def search_terms(q):
+    return [term[:MAX_TERM_LENGTH] for term in q.lower().split()][:MAX_TERMS]
+
+
+# Trigrams of a word the way pg_trgm makes them, padded with two spaces before and one after.
+# Cached, names repeat a lot from one patient to the next
+@functools.lru_cache(maxsize=20000)
+def trigrams(word):
+    padded = f"  {word} "
+    return frozenset(padded[index:index + 3] for index in range(len(padded) - 2))
+
+
+# Share of the trigrams of `term` found in the closest word of `words`
+def word_similarity(term, words):
+    term_trigrams = trigrams(term)
+    return max((len(term_trigrams & trigrams(word)) / len(term_trigrams) for word in words), default=0)
+
+
+# 3 if a word of `text` starts with `term`, 2 if it's somewhere else, the similarity if it's
+# close enough and 0 if it doesn't match
+def term_score(term, text, words):
+    if any(word.startswith(term) for word in words):
+        return 3
+    if term in text:
+        return 2
+    similarity = word_similarity(term, words)
+    return similarity if similarity >= FUZZY_THRESHOLD else 0
+
+
+def search_text(patient):
+    return " ".join([patient.name, patient.lastname, patient.email, patient.phone or ""]).lower()
+
+
+# Subquery of the ids of the pro's patients, for an IN
+def pro_patient_ids(proid):
+    pro_services = db.session.query(ProServices.id).filter(ProServices.pro_id == proid).scalar_subquery()
+    return db.session.query(Bookings.patient_id).filter(Bookings.pro_service_id.in_(pro_services)) \
+                     .distinct().scalar_subquery()
+
+
+def escape_like(term):
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def contains(expression, value):
+    return expression.like(f"%{escape_like(value)}%", escape="\\")
+
+
+# Scores are computed in SQL, only the requested page is read
+def search_postgres(proid, terms, offset, limit):
+    text = db.literal_column(SEARCH_TEXT_SQL)
+    words = db.literal_column(WORDS_SQL)
+    db.session.execute(db.text("SELECT set_config('pg_trgm.word_similarity_threshold', :threshold, true)"),
+                       {"threshold": str(FUZZY_THRESHOLD)})
+    query = Patients.query.filter(Patients.id.in_(pro_patient_ids(proid)))
+    score = 0
+    for term in terms:
+        query = query.filter(db.or_(contains(text, term), db.literal(term).op("<%")(text)))
+        score = score + db.case((contains(words, " " + term), 3),
+                                (contains(text, term), 2),
+                                else_=db.func.word_similarity(term, text))
+    return query.order_by(score.desc(), Patients.lastname, Patients.name, Patients.id) \
+                .offset(offset).limit(limit + 1).all()
+
+
+# The pro's patients with their search text computed once, then SQL keeps those having every
+# term, one of its trigrams or a word starting with its first two letters, which are scored here. Only the
+# patients of the page are loaded as objects.
+def search_sqlite(proid, terms, offset, limit):
+    pro_patients = db.select(Patients.id, Patients.name, Patients.lastname,
+                             db.literal_column(SEARCH_TEXT_SQL).label("text")) \
+                     .where(Patients.id.in_(pro_patient_ids(proid))) \
+                     .cte("pro_patients").prefix_with("MATERIALIZED")
+    candidates = db.select(pro_patients)
+    spaced_text = " " + pro_patients.c.text
+    for term in terms:
+        conditions = [db.func.instr(pro_patients.c.text, term) > 0]
+        # Several words, eg: an email, can't be close to a single one
+        if not WORD_SEPARATORS.search(term):
+            conditions.append(db.func.instr(spaced_text, " " + term[:2]) > 0)
+            conditions += [db.func.instr(pro_patients.c.text, term[index:index + 3]) > 0 for index in range(len(term) - 2)]
+        candidates = candidates.where(db.or_(*conditions))
+    ranked = []
+    for patient_id, name, lastname, text in db.session.execute(candidates):
+        words = WORD_SEPARATORS.split(text)
+        scores = [term_score(term, text, words) for term in terms]
+        if all(scores):
+            ranked.append((-sum(scores), lastname, name, patient_id))
+    ranked.sort()
+    page_ids = [patient_id for _, _, _, patient_id in ranked[offset:offset + limit + 1]]
+    patients = {patient.id: patient for patient in Patients.query.filter(Patients.id.in_(page_ids))}
+    return [patients[patient_id] for patient_id in page_ids]
+
+
+# {"results": [patient], "next_cursor": offset of the next page or None}, best matches first
+def search_patients(proid, q, offset, limit):
+    terms = search_terms(q)
+    if not terms:
+        return {"results": [], "next_cursor": None}
+    if db.engine.dialect.name == "postgresql":
+        rows = search_postgres(proid, terms, offset, limit)
+    else:
+        rows = search_sqlite(proid, terms, offset, limit)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = offset + limit
+    return {"results": [patient.serialize() for patient in rows],
+            "next_cursor": next_cursor}
@@ -0,0 +1,74 @@
+"""
+Opt-in request profiler for development and staging.
+With PROFILING_ENABLED=1, a request sent with the X-Profile: 1 header or the ?_profile=1
+query parameter runs under cProfile and its stats are saved in PROFILE_DIR as
+<endpoint>-<timestamp>.prof (flask profiles list / flask profiles show <file>).
+"""
+import os
+import io
+import pstats
+import cProfile
+import datetime
+from flask import g, request
+
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+
+def profiling_requested():
+    return request.headers.get("X-Profile") == "1" or request.args.get("_profile") == "1"
+
+
+def start_profile():
+    if profiling_requested():
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def stop_profile(response):
+    profiler = g.pop("profiler", None)
+    if profiler is None:
+        return response
+    profiler.disable()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    timestamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    filename = f"{request.endpoint or 'unmatched'}-{timestamp}.prof"
+    profiler.dump_stats(os.path.join(PROFILE_DIR, filename))
+    response.headers["X-Profile-File"] = filename
+    return response
+
+
+# A request that raised doesn't reach after_request, don't leave its profiler running
+def discard_profile(exception=None):
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.disable()
+
+
+# [(filename, size in bytes, modification datetime)] of the saved profiles, newest first
+def list_profiles(directory=PROFILE_DIR):
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for filename in os.listdir(directory):
+        if filename.endswith(".prof"):
+            path = os.path.join(directory, filename)
+            profiles.append((filename, os.path.getsize(path),
+                             datetime.datetime.fromtimestamp(os.path.getmtime(path))))
+    return sorted(profiles, key=lambda profile: profile[2], reverse=True)
+
+
+def summarize_profile(path, sort="cumulative", limit=25):
+    output = io.StringIO()
+    stats = pstats.Stats(path, stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
+
+
+def setup_profiler(app):
+    if not PROFILING_ENABLED:
+        return
+    app.before_request(start_profile)
+    app.after_request(stop_profile)
+    app.teardown_request(discard_profile)
@@ -0,0 +1,292 @@
+"""
+Rate limits and load shedding of the public endpoints: the booking page (GET
+/api/pros/<username>, GET /api/pages/<bookingpage_url>), POST /api/bookings, POST
+/api/patients and POST /api/login.
+Every request takes a token from a bucket of its client IP and, for the booking page and
+bookings, one of its pro (the page's username, the pro of the booked service). Logins have no
+pro bucket, anyone could lock a pro out of their account with it. A bucket holds `requests`
+tokens and refills at `requests` per `seconds`, an empty one answers 429 with Retry-After.
+Limits are set per group as "requests/seconds" in RATE_LIMIT_<GROUP>_<IP|PRO>, "0" turns one
+off. The client IP comes from X-Forwarded-For as set by RATE_LIMIT_TRUSTED_PROXIES proxies;
+until that's set there are no IP limits, behind a router every client would share its IP.
+Buckets live in this process (RATE_LIMIT_BACKEND=memory, so each gunicorn worker counts by
+itself) or in the rate_limit_buckets table (RATE_LIMIT_BACKEND=database, shared by every
+worker, one upsert per bucket on its own short transaction; if it fails the request is let
+through).
+Before that, when the server is overloaded those requests get a 503 with Retry-After
+instead of waiting for a worker or a connection: more than SHED_MAX_IN_FLIGHT requests being
+served by the process, more than SHED_QUEUE_WAIT_MS spent queued before reaching it (from the
+X-Request-Start header set by the router) or a recent pool wait above SHED_POOL_WAIT_MS.
+The dashboard isn't limited. Limits, thresholds, rejections and the requests in flight are
+exported on GET /metrics.
+"""
+import os
+import math
+import time
+import random
+import logging
+import threading
+import functools
+from collections import OrderedDict
+from flask import request, jsonify
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from api.models import db, ProServices
+from api.instrumentation import metrics, recent_pool_wait
+
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+# Proxies in front of the app that append the client to X-Forwarded-For: 1 behind the Heroku
+# or Render router, 0 if clients connect to gunicorn directly. None turns the IP limits off.
+TRUSTED_PROXIES = int(os.environ["RATE_LIMIT_TRUSTED_PROXIES"]) if os.getenv("RATE_LIMIT_TRUSTED_PROXIES") else None
+MAX_MEMORY_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", 100000))
+DEFAULT_LIMITS = {"page": {"ip": "120/60", "pro": "1200/60"},
+                  "booking": {"ip": "20/60", "pro": "300/60"},
+                  "login": {"ip": "10/60"}}
+# 0 turns a threshold off
+SHED_MAX_IN_FLIGHT = int(os.getenv("SHED_MAX_IN_FLIGHT", 0))
+SHED_QUEUE_WAIT = float(os.getenv("SHED_QUEUE_WAIT_MS", 0)) / 1000
+SHED_POOL_WAIT = float(os.getenv("SHED_POOL_WAIT_MS", 1000)) / 1000
+SHED_RETRY_AFTER = int(os.getenv("SHED_RETRY_AFTER", 5))
+DATABASE_PRUNE_RATE = 0.001
+
+logger = logging.getLogger("docdate.rate_limits")
+
+
+# (capacity, tokens per second) of "requests/seconds", None if it's off
+def parse_limit(value):
+    requests, _, seconds = value.partition("/")
+    requests, seconds = int(requests), float(seconds or 1)
+    if requests <= 0:
+        return None
+    return requests, requests / seconds
+
+
+def load_limits():
+    return {group: {key: parse_limit(os.getenv(f"RATE_LIMIT_{group.upper()}_{key.upper()}", default))
+                    for key, default in defaults.items()}
+            for group, defaults in DEFAULT_LIMITS.items()}
+
+
+LIMITS = load_limits()
+
+
+class MemoryBuckets:
+    def __init__(self, max_buckets=MAX_MEMORY_BUCKETS):
+        self.lock = threading.Lock()
+        self.buckets = OrderedDict()  # name -> (tokens, updated_at), least recently used first
+        self.max_buckets = max_buckets
+
+    # Takes a token from each of `buckets` [(name, capacity, rate)] in order, up to the first
+    # empty one. Returns (its index, seconds until it has a token) or (None, 0).
+    def take(self, buckets, now):
+        with self.lock:
+            for index, (name, capacity, rate) in enumerate(buckets):
+                tokens, updated_at = self.buckets.pop(name, (capacity, now))
+                tokens = min(capacity, tokens + (now - updated_at) * rate)
+                if tokens < 1:
+                    self.buckets[name] = (tokens, now)
+                    return index, (1 - tokens) / rate
+                self.buckets[name] = (tokens - 1, now)
+                # Forgetting the least recently used bucket gives its client a full one, it
+                # most likely refilled already
+                if len(self.buckets) > self.max_buckets:
+                    self.buckets.popitem(last=False)
+        return None, 0
+
+
+# The refilled tokens of the stored bucket, capped at its capacity
+REFILLED_SQL = ("CASE WHEN rate_limit_buckets.tokens + (:now - rate_limit_buckets.updated_at) * :rate > :capacity "
+                "THEN :capacity ELSE rate_limit_buckets.tokens + (:now - rate_limit_buckets.updated_at) * :rate END")
+# Returns a row only if a token was taken, an empty bucket isn't updated
+TAKE_SQL = text("INSERT INTO rate_limit_buckets (name, tokens, updated_at) VALUES (:name, :capacity - 1, :now) "
+                "ON CONFLICT (name) DO UPDATE "
+                f"SET tokens = {REFILLED_SQL} - 1, updated_at = :now "
+                f"WHERE {REFILLED_SQL} >= 1 "
+                "RETURNING tokens")
+PRUNE_SQL = text("DELETE FROM rate_limit_buckets WHERE updated_at < :before")
+
+
+class DatabaseBuckets:
+    # Same as MemoryBuckets.take(), the wait of an empty bucket is the longest it can be
+    def take(self, buckets, now):
+        try:
+            with db.engine.begin() as connection:
+                for index, (name, capacity, rate) in enumerate(buckets):
+                    taken = connection.execute(TAKE_SQL, {"name": name, "capacity": capacity, "rate": rate,
+                                                          "now": now}).first()
+                    if taken is None:
+                        return index, 1 / rate
+                # A bucket untouched for longer than its window is full again, same as no row
+                if random.random() < DATABASE_PRUNE_RATE:
+                    connection.execute(PRUNE_SQL, {"before": now - longest_window()})
+        except SQLAlchemyError:
+            logger.exception("Rate limit buckets unavailable, request let through")
+        return None, 0
+
+
+# Seconds an empty bucket takes to be full again, the longest of all limits
+def longest_window():
+    return max((capacity / rate for limits in LIMITS.values() for capacity, rate in filter(None, limits.values())),
+               default=0)
+
+
+backend = DatabaseBuckets() if RATE_LIMIT_BACKEND == "database" else MemoryBuckets()
+
+
+# The client is the address the last trusted proxy saw, None if the proxies aren't known
+def client_ip():
+    if TRUSTED_PROXIES is None:
+        return None
+    if TRUSTED_PROXIES:
+        forwarded = [address.strip() for address in request.headers.get("X-Forwarded-For", "").split(",") if address.strip()]
+        if len(forwarded) >= TRUSTED_PROXIES:
+            return forwarded[-TRUSTED_PROXIES]
+    return request.remote_addr or "unknown"
+
+
+# Services don't change pro, a stale entry would only count a booking against the old one.
+# An id that doesn't exist raises, so the miss isn't cached and the service is found once created
+@functools.lru_cache(maxsize=4096)
+def cached_service_pro_id(pro_service_id):
+    pro_id = db.session.query(ProServices.pro_id).filter(ProServices.id == pro_service_id).scalar()
+    if pro_id is None:
+        raise LookupError(pro_service_id)
+    return pro_id
+
+
+def service_pro_id(pro_service_id):
+    try:
+        return cached_service_pro_id(pro_service_id)
+    except LookupError:
+        return None
+
+
+def json_field(name):
+    data = request.get_json(silent=True)
+    return data.get(name) if isinstance(data, dict) else None
+
+
+def booking_pro():
+    pro_service_id = json_field("pro_service_id")
+    if isinstance(pro_service_id, int) and not isinstance(pro_service_id, bool):
+        return service_pro_id(pro_service_id)
+    return None
+
+
+# (endpoint, method) -> (limit group, function returning the pro of the request or None)
+LIMITED_ENDPOINTS = {("api.get_pro_by_username", "GET"): ("page", lambda: request.view_args["username"]),
+                     ("api.booking_page", "GET"): ("page", lambda: request.view_args["bookingpage_url"]),
+                     ("api.get_add_bookings", "POST"): ("booking", booking_pro),
+                     ("api.patients", "POST"): ("booking", lambda: None),
+                     ("api.login", "POST"): ("login", lambda: None)}
+
+_in_flight = {"count": 0}
+_in_flight_lock = threading.Lock()
+
+
+def in_flight():
+    return _in_flight["count"]
+
+
+# Seconds since the router received the request, from X-Request-Start ("t=<time>" or
+# "<time>", in seconds, milliseconds or microseconds), None without it
+def queue_wait():
+    value = request.headers.get("X-Request-Start", "").strip()
+    if value.startswith("t="):
+        value = value[2:]
+    try:
+        started = float(value)
+    except ValueError:
+        return None
+    while started > 1e11:
+        started /= 1000
+    return max(0.0, time.time() - started)
+
+
+def overload_reason():
+    if SHED_MAX_IN_FLIGHT and in_flight() > SHED_MAX_IN_FLIGHT:
+        return "in_flight"
+    if SHED_QUEUE_WAIT and (queue_wait() or 0) > SHED_QUEUE_WAIT:
+        return "queue_wait"
+    if SHED_POOL_WAIT and recent_pool_wait() > SHED_POOL_WAIT:
+        return "pool_wait"
+    return None
+
+
+def rejection(message, status_code, retry_after):
+    response = jsonify({"message": message})
+    response.status_code = status_code
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+# 503 or 429 response for the current request if it's shed or over a limit, None otherwise.
+# Also called for the sub-requests of a batch (api/batch.py), which skip before_request.
+def check_request():
+    if not RATE_LIMIT_ENABLED:
+        return None
+    rule = LIMITED_ENDPOINTS.get((request.endpoint, request.method))
+    if rule is None:
+        return None
+    group, pro_key = rule
+    reason = overload_reason()
+    if reason:
+        metrics.inc("docdate_load_shed_total", (("reason", reason),))
+        return rejection("The server is busy, try again in a few seconds", 503, SHED_RETRY_AFTER)
+    buckets = []
+    for key, key_value in (("ip", client_ip), ("pro", pro_key)):
+        limit = LIMITS[group].get(key)
+        value = key_value() if limit else None
+        if value is not None:
+            buckets.append((key, (f"{group}:{key}:{value}"[:200], *limit)))
+    if not buckets:
+        return None
+    index, retry_after = backend.take([bucket for _, bucket in buckets], time.time())
+    if index is None:
+        return None
+    metrics.inc("docdate_rate_limited_total", (("group", group), ("key", buckets[index][0])))
+    return rejection("Too many requests, try again later", 429, retry_after)
+
+
+def start_request():
+    request.environ["docdate.in_flight"] = True
+    with _in_flight_lock:
+        _in_flight["count"] += 1
+    return check_request()
+
+
+# Only for requests counted by start_request(), batch sub-requests tear down too
+def finish_request(exception=None):
+    if request.environ.pop("docdate.in_flight", False):
+        with _in_flight_lock:
+            _in_flight["count"] -= 1
+
+
+def limit_values():
+    return [((("group", group), ("key", key), ("setting", setting)), value)
+            for group, limits in LIMITS.items()
+            for key, limit in limits.items() if limit
+            for setting, value in (("requests", limit[0]), ("per_second", round(limit[1], 6)))]
+
+
+def shed_thresholds():
+    return [((("signal", "in_flight"),), SHED_MAX_IN_FLIGHT),
+            ((("signal", "queue_wait_seconds"),), SHED_QUEUE_WAIT),
+            ((("signal", "pool_wait_seconds"),), SHED_POOL_WAIT)]
+
+
+metrics.counter("docdate_rate_limited_total", "Requests answered 429 by limit group and bucket key.")
+metrics.counter("docdate_load_shed_total", "Requests answered 503 by overload signal.")
+metrics.gauge("docdate_requests_in_flight", "Requests being served by this process.", lambda: [((), in_flight())])
+metrics.gauge("docdate_rate_limit", "Configured rate limits, bucket size and refill per second.", limit_values)
+metrics.gauge("docdate_load_shedding_threshold", "Configured load shedding thresholds, 0 is off.", shed_thresholds)
+
+
+# After setup_instrumentation(), so rejected requests are measured too
+def setup_rate_limits(app):
+    if RATE_LIMIT_ENABLED and TRUSTED_PROXIES is None:
+        app.logger.warning("RATE_LIMIT_TRUSTED_PROXIES isn't set, requests aren't limited by client IP")
+    app.before_request(start_request)
+    app.teardown_request(finish_request)
@@ -0,0 +1,50 @@
+"""
+Atomic slot reservation.
+A booking is only written after checking that no active booking of the same pro overlaps
+it, and the check runs under a per-pro lock: the pro's "bookings:<pro_id>" row in
+resource_versions is bumped first, which is a row lock on Postgres and takes the database
+write lock on SQLite. Concurrent reservations of a pro therefore run one after the other
+until commit, and the ones that lose the race get a 409.
+"""
+from api.models import db, Bookings, ProServices
+from api.availability import parse_minutes, INACTIVE_BOOKING_STATUSES
+from api.resource_versions import bump_versions
+from api.utils import APIException
+
+
+# Held until the transaction ends
+def lock_pro_bookings(pro_id):
+    bump_versions([f"bookings:{pro_id}"])
+
+
+# Id of an active booking of the pro on `date` overlapping [start, start + duration) minutes
+def overlapping_booking(pro_id, date, start, duration, exclude_id=None):
+    bookings = db.session.query(Bookings.id, Bookings.starting_time, ProServices.duration) \
+                         .join(ProServices) \
+                         .filter(ProServices.pro_id == pro_id,
+                                 Bookings.date == date,
+                                 Bookings.status.notin_(INACTIVE_BOOKING_STATUSES))
+    if exclude_id is not None:
+        bookings = bookings.filter(Bookings.id != exclude_id)
+    for booking_id, starting_time, booking_duration in bookings:
+        booking_start = parse_minutes(starting_time)
+        if booking_start < start + duration and start < booking_start + booking_duration:
+            return booking_id
+    return None
+
+
+# Raises a 409 APIException if `booking` (new or changed, not flushed yet) takes a slot that
+# is already booked. The lock is kept until the caller commits or rolls back.
+def reserve_slot(booking):
+    if booking.status in INACTIVE_BOOKING_STATUSES:
+        return
+    with db.session.no_autoflush:
+        pro_service = ProServices.query.get(booking.pro_service_id)
+        if pro_service is None:
+            raise APIException("pro_service_id doesn't exist")
+        if booking.date is None or booking.starting_time is None:
+            raise APIException("date and starting_time are required")
+        lock_pro_bookings(pro_service.pro_id)
+        if overlapping_booking(pro_service.pro_id, booking.date, parse_minutes(booking.starting_time),
+                               pro_service.duration, exclude_id=booking.id):
+            raise APIException("This slot is no longer available", status_code=409)
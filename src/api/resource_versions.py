@@ -0,0 +1,140 @@
+"""
+Versions of the read-mostly resources served with ETags.
+Every resource has a counter in the resource_versions table ("pro:<bookingpage_url>",
+"proservices:<pro_id>", "hours:<pro_id>", "location_hours:<location_id>", "services",
+"locations:<pro_id>", "inactivity:<pro_id>", "bookings:<pro_id>") that is bumped in the
+same transaction as any change to its rows, from an after_flush hook, so every ORM write
+is covered. Statements that bypass the ORM (bulk UPDATE/DELETE) have to call
+bump_versions() themselves. A GET builds its ETag from the counters alone, so a matching
+If-None-Match is answered with 304 after one small query.
+"""
+import hashlib
+from flask import request, make_response
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from api.models import db, Pros, ProServices, Hours, Services, Locations, InactivityDays, Bookings, ResourceVersions
+
+
+# {pro_service_id: pro_id} of the services the bookings flushed in `session` point to, now and
+# before the flush. Services already loaded in the session are read from it, the rest with one
+# IN query on the flush connection. Kept in the flush context so the change feed hook reuses it.
+def booking_pro_ids(session, flush_context):
+    if "booking_pro_ids" in flush_context.attributes:
+        return flush_context.attributes["booking_pro_ids"]
+    pro_service_ids = set()
+    for instance in list(session.new) + list(session.deleted) + list(session.dirty):
+        if isinstance(instance, Bookings):
+            pro_service_ids.add(instance.pro_service_id)
+            pro_service_ids.update(inspect(instance).attrs.pro_service_id.history.deleted or [])
+    pro_ids = {}
+    for pro_service_id in pro_service_ids - {None}:
+        pro_service = session.identity_map.get(session.identity_key(ProServices, pro_service_id))
+        if pro_service is not None and "pro_id" in inspect(pro_service).dict:
+            pro_ids[pro_service_id] = pro_service.pro_id
+    missing = pro_service_ids - {None} - set(pro_ids)
+    if missing:
+        pro_ids.update(session.query(ProServices.id, ProServices.pro_id).filter(ProServices.id.in_(missing)))
+    flush_context.attributes["booking_pro_ids"] = pro_ids
+    return pro_ids
+
+
+# Resources a row belongs to. values(field) returns the field's current value and, for an
+# updated row, its old one too, eg: an Hours row moved to another pro changes both pros' hours.
+# pro_ids is booking_pro_ids() of the flush.
+def resource_names(instance, values, pro_ids):
+    if isinstance(instance, Pros):
+        return [f"pro:{url}" for url in values("bookingpage_url")]
+    if isinstance(instance, ProServices):
+        return [f"proservices:{pro_id}" for pro_id in values("pro_id")]
+    if isinstance(instance, Hours):
+        return ([f"hours:{pro_id}" for pro_id in values("pro_id")] +
+                [f"location_hours:{location_id}" for location_id in values("location_id")])
+    if isinstance(instance, Services):
+        return ["services"]
+    if isinstance(instance, Locations):
+        return [f"locations:{pro_id}" for pro_id in values("pro_id")]
+    if isinstance(instance, InactivityDays):
+        return [f"inactivity:{pro_id}" for pro_id in values("pro_id")]
+    if isinstance(instance, Bookings):
+        return [f"bookings:{pro_ids[pro_service_id]}" for pro_service_id in values("pro_service_id")
+                if pro_service_id in pro_ids]
+    return []
+
+
+def changed_names(session, flush_context):
+    pro_ids = booking_pro_ids(session, flush_context)
+    names = set()
+    for instance in list(session.new) + list(session.deleted):
+        names.update(resource_names(instance, lambda field: [getattr(instance, field)], pro_ids))
+    for instance in session.dirty:
+        if not session.is_modified(instance):
+            continue
+        state = inspect(instance)
+
+        def values(field):
+            history = state.attrs[field].history
+            return [getattr(instance, field)] + list(history.deleted or [])
+        names.update(resource_names(instance, values, pro_ids))
+    return {name for name in names if not name.endswith(":None")}
+
+
+def upsert_statement(dialect_name):
+    table = ResourceVersions.__table__
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(table).values(version=1).on_conflict_do_update(
+        index_elements=[table.c.name], set_={"version": table.c.version + 1})
+
+
+# Add one to the version of every resource in `names`, within the current transaction
+def bump_versions(names, connection=None):
+    if not names:
+        return
+    connection = connection or db.session.connection()
+    table = ResourceVersions.__table__
+    rows = [{"name": name} for name in sorted(names)]  # same order everywhere, no deadlocks
+    statement = upsert_statement(connection.dialect.name)
+    if statement is not None:
+        connection.execute(statement, rows)
+        return
+    for row in rows:
+        updated = connection.execute(table.update().where(table.c.name == row["name"])
+                                     .values(version=table.c.version + 1))
+        if not updated.rowcount:
+            connection.execute(table.insert().values(name=row["name"], version=1))
+
+
+@event.listens_for(Session, "after_flush")
+def bump_changed_resources(session, flush_context):
+    names = changed_names(session, flush_context)
+    if names:
+        bump_versions(names, session.connection())
+
+
+# Strong ETag of the current request from the versions of `names`. `extra` is anything else
+# the response depends on that isn't in the url, eg: a default date window
+def versions_etag(names, extra=""):
+    rows = db.session.query(ResourceVersions.name, ResourceVersions.version).filter(ResourceVersions.name.in_(names)).all()
+    versions = dict(rows)
+    token = request.full_path + "|" + extra + "|" + ",".join(f"{name}={versions.get(name, 0)}" for name in names)
+    return hashlib.md5(token.encode()).hexdigest()
+
+
+# The response of `build` (a function returning (response, status)) with an ETag, or an empty
+# 304 if the client already has it; `build` isn't called then
+def versioned_response(names, build, extra=""):
+    etag = versions_etag(names, extra)
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+    else:
+        body, status = build()
+        response = make_response(body, status)
+        if status != 200:
+            return response
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "public, no-cache"
+    return response
@@ -2,415 +2,69 @@
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
 """
 import os
-from os.path import join, abspath
-from flask import Flask, request, jsonify, Blueprint
+from flask import Flask, request, jsonify, Blueprint, make_response
 from flask_cors import CORS
 from api.models import db, Pros, Hours, Patients, Bookings, Locations, ProServices, Services, InactivityDays
+from api.availability import get_availability, MAX_WINDOW_DAYS, INACTIVE_BOOKING_STATUSES
+from api.utils import paginate, page_args, to_date, int_arg
+from api.mailer import enqueue_email
+from api.google_clients import google_service, invalidate_pro, CALENDAR
+from api.holiday_calendar import holidays_response_body, holiday_dates as country_holiday_dates
+from api.resource_versions import versioned_response
+from api.change_feed import snapshot, changes_since, DEFAULT_LIMIT as CHANGES_LIMIT
+from api.reservations import reserve_slot
+from api.patient_search import search_patients
+from api.schedule import replace_schedule
+from api.deletes import delete_pro, delete_patient
+from api.batch import run_batch
 from flask_jwt_extended import create_access_token
 from flask_jwt_extended import get_jwt_identity
 from flask_jwt_extended import jwt_required
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
 import requests
-from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from google.auth.transport.requests import Request
-import base64
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.image import MIMEImage
 import datetime
 import json
-import holidays
 
 
 api = Blueprint('api', __name__)
 CORS(api)  # Allow CORS requests to this API
 
-# Envio de emails
-def enviar_correo(receiver, subject, pro, service_name, date, starting_time):
-    try:
-        # Cargar las credenciales desde el archivo
-        TOKEN_PATH = {
-            "token": pro["google_access_token"],
-            "refresh_token": pro["google_refresh_token"],
-            "token_uri": "https://oauth2.googleapis.com/token",
-            "client_id": os.getenv("GOOGLE_CLIENT_ID"),
-            "client_secret": os.getenv("GOOGLE_CLIENT_SECRET"),
-            "scopes": ["https://www.googleapis.com/auth/gmail.send"],
-            "expiry": pro["google_access_expires"]
-        }
-        SCOPES = ['https://www.googleapis.com/auth/gmail.send']
-        creds = Credentials.from_authorized_user_info(TOKEN_PATH, SCOPES)
-
-        servicio_gmail = build('gmail', 'v1', credentials=creds)
-
-        mensaje = MIMEMultipart()
-        mensaje['to'] = receiver
-        mensaje['subject'] = subject
-
-        # Contenido HTML con una imagen incrustada
-        contenido_html = f"""
-                        <!DOCTYPE html>
-
-                                <html lang="en" xmlns:o="urn:schemas-microsoft-com:office:office" xmlns:v="urn:schemas-microsoft-com:vml">
-                                <head>
-                                <title></title>
-                                <meta content="text/html; charset=utf-8" http-equiv="Content-Type"/>
-                                <meta content="width=device-width, initial-scale=1.0" name="viewport"/><!--[if mso]><xml><o:OfficeDocumentSettings><o:PixelsPerInch>96</o:PixelsPerInch><o:AllowPNG/></o:OfficeDocumentSettings></xml><![endif]--><!--[if !mso]><!--><!--<![endif]-->
-                                <style>
-                                        * {{
-                                            box-sizing: border-box;
-                                        }}
-
-                                        body {{
-                                            margin: 0;
-                                            padding: 0;
-                                        }}
-
-                                        a[x-apple-data-detectors] {{
-                                            color: inherit !important;
-                                            text-decoration: inherit !important;
-                                        }}
-
-                                        #MessageViewBody a {{
-                                            color: inherit;
-                                            text-decoration: none;
-                                        }}
-
-                                        p {{
-                                            line-height: inherit
-                                        }}
-
-                                        .desktop_hide,
-                                        .desktop_hide table {{
-                                            mso-hide: all;
-                                            display: none;
-                                            max-height: 0px;
-                                            overflow: hidden;
-                                        }}
-
-                                        .image_block img+div {{
-                                            display: none;
-                                        }}
-
-                                        @media (max-width:620px) {{
-                                            .desktop_hide table.icons-inner {{
-                                                display: inline-block !important;
-                                            }}
-
-                                            .icons-inner {{
-                                                text-align: center;
-                                            }}
-
-                                            .icons-inner td {{
-                                                margin: 0 auto;
-                                            }}
-
-                                            .mobile_hide {{
-                                                display: none;
-                                            }}
-
-                                            .row-content {{
-                                                width: 100% !important;
-                                            }}
-
-                                            .stack .column {{
-                                                width: 100%;
-                                                display: block;
-                                            }}
-
-                                            .mobile_hide {{
-                                                min-height: 0;
-                                                max-height: 0;
-                                                max-width: 0;
-                                                overflow: hidden;
-                                                font-size: 0px;
-                                            }}
-
-                                            .desktop_hide,
-                                            .desktop_hide table {{
-                                                display: table !important;
-                                                max-height: none !important;
-                                            }}
-                                        }}
-                                    </style>
-                                </head>
-                                <body style="background-color: #FFFFFF; margin: 0; padding: 0; -webkit-text-size-adjust: none; text-size-adjust: none;">
-                                <table border="0" cellpadding="0" cellspacing="0" class="nl-container" role="presentation" style="mso-table-lspace: 0pt; mso-table-rspace: 0pt; background-color: #FFFFFF;" width="100%">
-                                <tbody>
-                                <tr>
-                                <td>
-                                <table align="center" border="0" cellpadding="0" cellspacing="0" class="row row-1" role="presentation" style="mso-table-lspace: 0pt; mso-table-rspace: 0pt; background-color: #f7f6f5;" width="100%">
-                                <tbody>
-                                <tr>
-                                <td>
-                                <table align="center" border="0" cellpadding="0" cellspacing="0" class="row-content stack" role="presentation" style="mso-table-lspace: 0pt; mso-table-rspace: 0pt; background-color: #14b1a6; color: #000000; width: 600px; margin: 0 auto;" width="600">
-                                <tbody>
-                                <tr>
-                                <td class="column column-1" style="mso-table-lspace: 0pt; mso-table-rspace: 0pt; font-weight: 400; text-align: left; vertical-align: top; border-top: 0px; border-right: 0px; border-bottom: 0px; border-left: 0px;" width="100%">
-                                <table border="0" cellpadding="0" cellspacing="0" class="paragraph_block block-1" role="presentation" style="mso-table-lspace: 0pt; mso-table-rspace: 0pt; word-break: break-word;" width="100%">
-                                <tr>
-                                <td class="pad" style="padding-bottom:5px;padding-left:10px;padding-right:10px;padding-top:25px;">
-                                <div style="color:#ffffff;direction:ltr;font-family:Arial, Helvetica Neue, Helvetica, sans-serif;font-size:28px;font-weight:700;letter-spacing:0px;line-height:120%;text-align:center;mso-line-height-alt:33.6px;">
-                                <p style="margin: 0;">DocDate.com</p>
-                                </div>
-                                </td>
-                                </tr>
-                                </table>
-                                <table border="0" cellpadding="0" cellspacing="0" class="paragraph_block block-2" role="presentation" style="mso-table-lspace: 0pt; mso-table-rspace: 0pt; word-break: break-word;" width="100%">
-                                <tr>
-                                <td class="pad" style="padding-bottom:25px;padding-left:10px;padding-right:10px;">
-                                <div style="color:#ffffff;direction:ltr;font-family:Arial, Helvetica Neue, Helvetica, sans-serif;font-size:15px;font-weight:400;letter-spacing:1px;line-height:120%;text-align:center;mso-line-height-alt:18px;">
-                                <p style="margin: 0;">Your med agenda for your daily patients</p>
-                                </div>
-                                </td>
-                                </tr>
-                                </table>
-                                </td>
-                                </tr>
-                                </tbody>
-                                </table>
-                                </td>
-                                </tr>
-                                </tbody>
-                                </table>
-                                <table align="center" border="0" cellpadding="0" cellspacing="0" class="row row-2" role="presentation" style="mso-table-lspace: 0pt; mso-table-rspace: 0pt; background-color: #f7f6f5;" width="100%">
-                                <tbody>
-                                <tr>
-                                <td>
-                                <table align="center" border="0" cellpadding="0" cellspacing="0" class="row-content stack" role="presentation" style="mso-table-lspace: 0pt; mso-table-rspace: 0pt; background-color: #ffffff; color: #000000; width: 600px; margin: 0 auto;" width="600">
-                                <tbody>
-                                <tr>
-                                <td class="column column-1" style="mso-table-lspace: 0pt; mso-table-rspace: 0pt; font-weight: 400; text-align: left; padding-bottom: 5px; padding-top: 30px; vertical-align: top; border-top: 0px; border-right: 0px; border-bottom: 0px; border-left: 0px;" width="100%">
-                                <table border="0" cellpadding="10" cellspacing="0" class="text_block block-1" role="presentation" style="mso-table-lspace: 0pt; mso-table-rspace: 0pt; word-break: break-word;" width="100%">
-                                <tr>
-                                <td class="pad">
-                                <div style="font-family: sans-serif">
-                                <div class="" style="font-size: 12px; font-family: Arial, Helvetica Neue, Helvetica, sans-serif; mso-line-height-alt: 14.399999999999999px; color: #14b1a6; line-height: 1.2;">
-                                <p style="margin: 0; font-size: 16px; text-align: center; mso-line-height-alt: 19.2px;"><span style="font-size:18px;"><strong>Confirm your booking now!</strong></span></p>
-                                </div>
-                                </div>
-                                </td>
-                                </tr>
-                                </table>
-                                <table border="0" cellpadding="0" cellspacing="0" class="text_block block-2" role="presentation" style="mso-table-lspace: 0pt; mso-table-rspace: 0pt; word-break: break-word;" width="100%">
-                                <tr>
-                                <td class="pad" style="padding-bottom:25px;padding-left:10px;padding-right:10px;padding-top:10px;">
-                                <div style="font-family: sans-serif">
-                                <div class="" style="font-size: 12px; font-family: Arial, Helvetica Neue, Helvetica, sans-serif; mso-line-height-alt: 14.399999999999999px; color: #828282; line-height: 1.2;">
-                                <p style="margin: 0; text-align: center; font-size: 14px; mso-line-height-alt: 14.399999999999999px;"> </p>
-                                <p style="margin: 0; text-align: center; font-size: 14px; mso-line-height-alt: 16.8px;"><strong><span style="font-size:14px;">Visit: {service_name}</span></strong></p>
-                                <p style="margin: 0; text-align: center; font-size: 14px; mso-line-height-alt: 16.8px;"><strong><span style="font-size:14px;">Date: {date}</span></strong></p>
-                                <p style="margin: 0; text-align: center; font-size: 14px; mso-line-height-alt: 16.8px;"><strong><span style="font-size:14px;">Hour: {starting_time}</span></strong></p>
-                                <p style="margin: 0; text-align: center; font-size: 14px; mso-line-height-alt: 16.8px;"><strong><span style="font-size:14px;">Doctor: {pro["name"]} {pro["lastname"]}</span></strong></p>
-                                <p style="margin: 0; text-align: center; font-size: 14px; mso-line-height-alt: 16.8px;"><strong><span style="font-size:14px;">Doctor email: {pro["email"]}</span></strong></p>
-                                <p style="margin: 0; text-align: center; font-size: 14px; mso-line-height-alt: 14.399999999999999px;"> </p>
-                                </div>
-                                </div>
-                                </td>
-                                </tr>
-                                </table>
-                                <table border="0" cellpadding="10" cellspacing="0" class="button_block block-3" role="presentation" style="mso-table-lspace: 0pt; mso-table-rspace: 0pt;" width="100%">
-                                <tr>
-                                <td class="pad">
-                                <div align="center" class="alignment"><!--[if mso]>
-                                <v:roundrect xmlns:v="urn:schemas-microsoft-com:vml" xmlns:w="urn:schemas-microsoft-com:office:word" style="height:42px;width:157px;v-text-anchor:middle;" arcsize="10%" stroke="false" fillcolor="#14b1a6">
-                                <w:anchorlock/>
-                                <v:textbox inset="0px,0px,0px,0px">
-                                <center style="color:#ffffff; font-family:Arial, sans-serif; font-size:16px">
-                                <![endif]-->
-                                <div style="text-decoration:none;display:inline-block;color:#ffffff;background-color:#14b1a6;border-radius:4px;width:auto;border-top:0px solid transparent;font-weight:undefined;border-right:0px solid transparent;border-bottom:0px solid transparent;border-left:0px solid transparent;padding-top:5px;padding-bottom:5px;font-family:Arial, Helvetica Neue, Helvetica, sans-serif;font-size:16px;text-align:center;mso-border-alt:none;word-break:keep-all;"><span style="padding-left:20px;padding-right:20px;font-size:16px;display:inline-block;letter-spacing:normal;"><span style="margin: 0; word-break: break-word; line-height: 32px;">Confirm Booking</span></span></div><!--[if mso]></center></v:textbox></v:roundrect><![endif]-->
-                                </div>
-                                </td>
-                                </tr>
-                                </table>
-                                <table border="0" cellpadding="0" cellspacing="0" class="text_block block-4" role="presentation" style="mso-table-lspace: 0pt; mso-table-rspace: 0pt; word-break: break-word;" width="100%">
-                                <tr>
-                                <td class="pad" style="padding-bottom:10px;padding-left:10px;padding-right:10px;padding-top:25px;">
-                                <div style="font-family: sans-serif">
-                                <div class="" style="font-size: 12px; font-family: Arial, Helvetica Neue, Helvetica, sans-serif; mso-line-height-alt: 14.399999999999999px; color: #828282; line-height: 1.2;">
-                                <p style="margin: 0; text-align: center; font-size: 15px; mso-line-height-alt: 18px;">If there is any mistake or you don't expect this message, just ignore this email</p>
-                                <p style="margin: 0; text-align: center; font-size: 15px; mso-line-height-alt: 14.399999999999999px;"> </p>
-                                <p style="margin: 0; text-align: center; font-size: 15px; mso-line-height-alt: 14.399999999999999px;"> </p>
-                                </div>
-                                </div>
-                                </td>
-                                </tr>
-                                </table>
-                                </td>
-                                </tr>
-                                </tbody>
-                                </table>
-                                </td>
-                                </tr>
-                                </tbody>
-                                </table>
-                                <table align="center" border="0" cellpadding="0" cellspacing="0" class="row row-3" role="presentation" style="mso-table-lspace: 0pt; mso-table-rspace: 0pt; background-color: #f7f6f5;" width="100%">
-                                <tbody>
-                                <tr>
-                                <td>
-                                <table align="center" border="0" cellpadding="0" cellspacing="0" class="row-content stack" role="presentation" style="mso-table-lspace: 0pt; mso-table-rspace: 0pt; background-color: #14b1a6; color: #000000; width: 600px; margin: 0 auto;" width="600">
-                                <tbody>
-                                <tr>
-                                <td class="column column-1" style="mso-table-lspace: 0pt; mso-table-rspace: 0pt; font-weight: 400; text-align: left; padding-bottom: 15px; padding-top: 15px; vertical-align: top; border-top: 0px; border-right: 0px; border-bottom: 0px; border-left: 0px;" width="100%">
-                                <table border="0" cellpadding="0" cellspacing="0" class="paragraph_block block-1" role="presentation" style="mso-table-lspace: 0pt; mso-table-rspace: 0pt; word-break: break-word;" width="100%">
-                                <tr>
-                                <td class="pad" style="padding-bottom:10px;padding-left:30px;padding-right:30px;padding-top:20px;">
-                                <div style="color:#ffffff;font-family:Arial, Helvetica Neue, Helvetica, sans-serif;font-size:9px;font-weight:400;letter-spacing:1px;line-height:120%;text-align:center;mso-line-height-alt:10.799999999999999px;">
-                                <p style="margin: 0; word-break: break-word;">By confirming your email, you ensure that you receive important updates and can access all the features of your account seamlessly. If you have received this email in error, please notify the sender immediately and delete it from your system.</p>
-                                <p style="margin: 0; word-break: break-word;"><span style="color: #c0c0c0;"> </span></p>
-                                </div>
-                                </td>
-                                </tr>
-                                </table>
-                                </td>
-                                </tr>
-                                </tbody>
-                                </table>
-                                </td>
-                                </tr>
-                                </tbody>
-                                </table>
-                                <table align="center" border="0" cellpadding="0" cellspacing="0" class="row row-4" role="presentation" style="mso-table-lspace: 0pt; mso-table-rspace: 0pt; background-color: #ffffff;" width="100%">
-                                <tbody>
-                                <tr>
-                                <td>
-                                <table align="center" border="0" cellpadding="0" cellspacing="0" class="row-content stack" role="presentation" style="mso-table-lspace: 0pt; mso-table-rspace: 0pt; background-color: #ffffff; color: #000000; width: 600px; margin: 0 auto;" width="600">
-                                <tbody>
-                                <tr>
-                                <td class="column column-1" style="mso-table-lspace: 0pt; mso-table-rspace: 0pt; font-weight: 400; text-align: left; padding-bottom: 5px; padding-top: 5px; vertical-align: top; border-top: 0px; border-right: 0px; border-bottom: 0px; border-left: 0px;" width="100%">
-                                <table border="0" cellpadding="0" cellspacing="0" class="icons_block block-1" role="presentation" style="mso-table-lspace: 0pt; mso-table-rspace: 0pt;" width="100%">
-                                <tr>
-                                <td class="pad" style="vertical-align: middle; color: #1e0e4b; font-family: 'Inter', sans-serif; font-size: 15px; padding-bottom: 5px; padding-top: 5px; text-align: center;">
-                                <table cellpadding="0" cellspacing="0" role="presentation" style="mso-table-lspace: 0pt; mso-table-rspace: 0pt;" width="100%">
-                                <tr>
-                                <td class="alignment" style="vertical-align: middle; text-align: center;"><!--[if vml]><table align="center" cellpadding="0" cellspacing="0" role="presentation" style="display:inline-block;padding-left:0px;padding-right:0px;mso-table-lspace: 0pt;mso-table-rspace: 0pt;"><![endif]-->
-                                <!--[if !vml]><!-->
-                                <table cellpadding="0" cellspacing="0" class="icons-inner" role="presentation" style="mso-table-lspace: 0pt; mso-table-rspace: 0pt; display: inline-block; margin-right: -4px; padding-left: 0px; padding-right: 0px;"><!--<![endif]-->
-                                <tr>
-                                <td style="vertical-align: middle; text-align: center; padding-top: 5px; padding-bottom: 5px; padding-left: 5px; padding-right: 6px;"><a href="http://designedwithbeefree.com/" style="text-decoration: none;" target="_blank"><img align="center" alt="Beefree Logo" class="icon" height="32" src="images/Beefree-logo.png" style="display: block; height: auto; margin: 0 auto; border: 0;" width="34"/></a></td>
-                                <td style="font-family: 'Inter', sans-serif; font-size: 15px; font-weight: undefined; color: #1e0e4b; vertical-align: middle; letter-spacing: undefined; text-align: center;"><a href="http://designedwithbeefree.com/" style="color: #1e0e4b; text-decoration: none;" target="_blank">Designed with Beefree</a></td>
-                                </tr>
-                                </table>
-                                </td>
-                                </tr>
-                                </table>
-                                </td>
-                                </tr>
-                                </table>
-                                </td>
-                                </tr>
-                                </tbody>
-                                </table>
-                                </td>
-                                </tr>
-                                </tbody>
-                                </table>
-                                </td>
-                                </tr>
-                                </tbody>
-                                </table><!-- End -->
-                                </body>
-                                </html>
-                        """
-
-        mensaje.attach(MIMEText(contenido_html, 'html'))
-
-        # Obtener la ruta absoluta de la imagen
-        ruta_imagen = join(abspath('src/front/img'), 'docdate_logo.png')
-
-        # Agregar la imagen como un archivo adjunto y referenciarla en el contenido HTML
-        with open(ruta_imagen, 'rb') as imagen_file:
-            imagen_adjunta = MIMEImage(imagen_file.read())
-            imagen_adjunta.add_header('Content-ID', '<imagen_id>')
-            mensaje.attach(imagen_adjunta)
-
-        mensaje_codificado = base64.urlsafe_b64encode(mensaje.as_bytes())
-        mensaje_codificado = mensaje_codificado.decode('utf-8')
-
-        servicio_gmail.users().messages().send(userId='me', body={'raw': mensaje_codificado}).execute()
-
-        print("Correo enviado exitosamente")
-    except Exception as e:
-        print(f'Error al enviar el correo: {str(e)}')
-
+# Queue the booking confirmation email, the mail worker (flask mail-worker) sends it
 @api.route('/mail/<int:proid>/<int:bookingid>', methods=['POST'])
 def endpoint_enviar_correo(proid, bookingid):
-    pro = Pros.query.get(proid)
     data = request.json
-    booking = Bookings.query.get(bookingid)
-    final_booking = booking.serialize()
-    print(final_booking)
-    pro_data = {
-        "name": pro.name,
-        "lastname": pro.lastname,
-        "email": pro.email,
-        "google_access_token": pro.google_access_token,
-        "google_refresh_token": pro.google_refresh_token,
-        "google_access_expires":pro.google_access_expires
-    }
-    print(pro_data)
-    service_name = final_booking["service_name"]
-    date = final_booking["date"]
-    starting_time = final_booking["starting_time"]
-    
     receiver = data.get('receiver')
     subject = data.get('subject')
-
-    if not receiver or not subject or not pro or not booking:
+    pro_exists = db.session.query(Pros.id).filter_by(id=proid).first()
+    booking_exists = db.session.query(Bookings.id).filter_by(id=bookingid).first()
+    if not receiver or not subject or not pro_exists or not booking_exists:
         return jsonify({'error': 'Not found'}), 404
+    email = enqueue_email(proid, bookingid, receiver, subject)
+    return jsonify({'mensaje': 'Correo en cola de envio', 'outbox_id': email.id}), 202
 
-    try:
-        enviar_correo(receiver, subject, pro_data, service_name, date, starting_time)
-        return jsonify({'mensaje': 'Correo enviado exitosamente'})
-    except Exception as e:
-        return jsonify({'error': f'Error al enviar el correo: {str(e)}'}), 500
-
-
-# Prueba festivos
-def get_holidays(year, country):
-    if country == "Germany":
-        holidays_country = holidays.Germany(years=year, observed=False, language="de")
-    elif country == "Spain":
-        holidays_country = holidays.Spain(years=year, observed=False, language="es")
-    elif country == "France":
-        holidays_country = holidays.France(years=year, observed=False, language="fr")
-    elif country == "Italy":
-        holidays_country = holidays.Italy(years=year, observed=False, language="it")
-    elif country == "United Kingdom":
-        holidays_country = holidays.UnitedKingdom(years=year, observed=False, language="en")
-    elif country == "Portugal":
-        holidays_country = holidays.Portugal(years=year, observed=False, language="pt")
-    elif country == "Netherlands":
-        holidays_country = holidays.Netherlands(years=year, observed=False, language="nl")
-    elif country == "Belgium":
-        holidays_country = holidays.Belgium(years=year, observed=False, language="nl")
-    elif country == "Switzerland":
-        holidays_country = holidays.Switzerland(years=year, observed=False, language="de")
-    elif country == "Austria":
-        holidays_country = holidays.Austria(years=year, observed=False, language="de")
-    elif country == "Greece":
-        holidays_country = holidays.Greece(years=year, observed=False, language="el")
-    elif country == "Sweden":
-        holidays_country = holidays.Sweden(years=year, observed=False, language="sv")
-    elif country == "Norway":
-        holidays_country = holidays.Norway(years=year, observed=False, language="no")
-    elif country == "Denmark":
-        holidays_country = holidays.Denmark(years=year, observed=False, language="da")
-    elif country == "Finland":
-        holidays_country = holidays.Finland(years=year, observed=False, language="fi")
-    elif country == "Ireland":
-        holidays_country = holidays.Ireland(years=year, observed=False, language="en")
-    else:
-        return []
-
-    return [{"date": date, "holiday": holiday} for date, holiday in sorted(holidays_country.items())]
 
+# National holidays of a country. Past years never change, so they can be cached for good
 @api.route('/get_holidays/<int:year>/<string:country>', methods=['GET'])
 def api_get_holidays(year, country):
-    holidays_list = get_holidays(year, country)
-    return jsonify({"holidays": holidays_list})
+    body, etag = holidays_response_body(year, country)
+    response = make_response(body)
+    response.mimetype = 'application/json'
+    response.set_etag(etag)
+    if year < datetime.date.today().year:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'public, max-age=86400'
+    return response.make_conditional(request)
+
+
+# Several API requests in one round trip, optionally all or nothing, see api/batch.py
+@api.route("/batch", methods=['POST'])
+def handle_batch():
+    body, status = run_batch(request.json)
+    return jsonify(body), status
 
 
 # LOGIN - authentication - token generation
@@ -449,6 +103,7 @@ def tokens_exchange(proid):
         pro.google_access_expires = exp_date_str
         pro.google_refresh_token = tokens['refresh_token']
         db.session.commit()
+        invalidate_pro(proid)
         return jsonify({'message': 'Tokens obtenidos exitosamente', 'tokens': tokens}), 200
     else:
         return jsonify({'error': 'Error al obtener tokens', 'status_code': response.status_code}), response.status_code
@@ -471,20 +126,9 @@ def get_tokens(proid):
 def create_event(proid):
     pro = Pros.query.get(proid)
     event_data = request.json.get("googleEvent") 
-    TOKEN_PATH = {
-        "token": pro.google_access_token,
-        "refresh_token": pro.google_refresh_token,
-        "token_uri": "https://oauth2.googleapis.com/token",
-        "client_id": os.getenv("GOOGLE_CLIENT_ID"),
-        "client_secret": os.getenv("GOOGLE_CLIENT_SECRET"),
-        "scopes": ["https://www.googleapis.com/auth/calendar"],
-        "expiry": pro.google_access_expires
-    }
-    SCOPES = ['https://www.googleapis.com/auth/calendar']
-    creds = Credentials.from_authorized_user_info(TOKEN_PATH, SCOPES)
-    service = build('calendar', 'v3', credentials=creds)
     event = event_data
-    created_event = service.events().insert(calendarId='primary', body=event).execute()
+    with google_service(pro, CALENDAR) as service:
+        created_event = service.events().insert(calendarId='primary', body=event).execute()
     event_id = created_event.get('id')
     return jsonify({'event_id': event_id})
 
@@ -503,9 +147,13 @@ def get_pro_dashboard():
 @api.route("/hours", methods=['GET', 'POST'])
 def hours():
     if request.method == 'GET':
-        hours_list = Hours.query.all()
-        serialized_hours = [hour.serialize() for hour in hours_list]
-        return jsonify(serialized_hours), 200
+        # Optional filters: pro_id, location_id, working_day
+        hours_query = Hours.query
+        for field in ('pro_id', 'location_id', 'working_day'):
+            value = int_arg(field)
+            if value is not None:
+                hours_query = hours_query.filter(getattr(Hours, field) == value)
+        return jsonify(paginate(hours_query, Hours.id, Hours.serialize)), 200
     if request.method == 'POST':
         data = request.json
         # Check if the required fields are present in the request
@@ -527,30 +175,49 @@ def hours():
 @api.route("/pros/<int:proid>/hours", methods=['GET', 'Delete'])
 def specific_pro_hour(proid):
     if request.method == 'GET':
-        hours_by_pro = Hours.query.filter_by(pro_id=proid).all()
-        if not hours_by_pro:
-            return jsonify({"message": "Record not found"}), 404
-        if request.method == 'GET':
+        def build():
+            hours_by_pro = Hours.query.filter_by(pro_id=proid).all()
+            if not hours_by_pro:
+                return jsonify({"message": "Record not found"}), 404
             serialized_hours = [hour.serialize() for hour in hours_by_pro]
             return jsonify(serialized_hours), 200
+        return versioned_response([f"hours:{proid}"], build)
     if request.method == 'DELETE':
         pro = Pros.query.get(proid)
-        if pro:
-            hours_to_delete = Hours.query.filter_by(pro_id=pro.id).all()
-            for hour in hours_to_delete:
-                db.session.delete(hour)
-            db.session.commit()
-            return jsonify({"message": "Hours deleted"}), 200
-    
+        if not pro:
+            return jsonify({"message": "pro not found"}), 404
+        # One DELETE statement, an empty week
+        replace_schedule(pro.id, [])
+        db.session.commit()
+        return jsonify({"message": "Hours deleted"}), 200
+
+
+# Replace the whole weekly schedule of a pro in one transaction and return it, eg:
+# {"hours": [{"working_day": 1, "starting_hour_morning": "09:00", "ending_hour_morning": "13:00",
+#             "starting_hour_after": "15:00", "ending_hour_after": "18:00", "location_id": 1}]}
+# Blocks of the same day can't overlap, the afternoon block is optional
+@api.route("/pros/<int:proid>/schedule", methods=['PUT'])
+def replace_pro_schedule(proid):
+    pro = Pros.query.get(proid)
+    if not pro:
+        return jsonify({"message": "pro not found"}), 404
+    data = request.json or {}
+    # Serialized before the commit expires the rows, which would reload them one by one
+    serialized_hours = [hour.serialize() for hour in replace_schedule(pro.id, data.get('hours'))]
+    db.session.commit()
+    return jsonify(serialized_hours), 200
+
+
 # Get all records in the 'hours' table by 'location_id'
 @api.route("/locations/<int:locationid>/hours", methods=['GET'])
 def specific_location_hour(locationid):
-    hours_by_location = Hours.query.filter_by(location_id=locationid).all()
-    if not hours_by_location:
-        return jsonify({"message": "Record not found"}), 404
-    if request.method == 'GET':
+    def build():
+        hours_by_location = Hours.query.filter_by(location_id=locationid).all()
+        if not hours_by_location:
+            return jsonify({"message": "Record not found"}), 404
         serialized_hours = [hour.serialize() for hour in hours_by_location]
         return jsonify(serialized_hours), 200
+    return versioned_response([f"location_hours:{locationid}"], build)
 
 
 # Get, Update, and Delete a specific record in the 'hours' table
@@ -586,9 +253,11 @@ def specific_hour(tableid):
 @api.route("/patients", methods=['GET', 'POST'])
 def patients():
     if request.method == 'GET':
-        patients_list = Patients.query.all()
-        serialized_patients = [patient.serialize() for patient in patients_list]
-        return jsonify(serialized_patients), 200
+        # Optional filters: email
+        patients_query = Patients.query
+        if request.args.get('email'):
+            patients_query = patients_query.filter(Patients.email == request.args['email'])
+        return jsonify(paginate(patients_query, Patients.id, Patients.serialize)), 200
     if request.method == 'POST':
         data = request.json
         try:   
@@ -625,13 +294,8 @@ def specific_patient(patientid):
         db.session.commit()
         return jsonify(patient.serialize()), 200
     if request.method == 'DELETE': #NB: delete all booking related to the patient_id
-        ## Join patients and bookings table and filter all record by patient_id = patientid
-        bookings_by_patient = Bookings.query.join(Patients).filter_by(id=patientid).all()
-        # delete all bookings associated to the deleted patient
-        for booking in bookings_by_patient:
-            db.session.delete(booking)
-        # delete single patient
-        db.session.delete(patient)
+        # The patient and all their bookings, in a few statements
+        delete_patient(patient)
         db.session.commit()
         return jsonify({"message": "Patient deleted successfully. All booking associated to this patient has been delated"}), 200
     
@@ -654,9 +318,22 @@ def get_patient_by_emial(patient_email):
 @api.route("/bookings", methods=['GET', 'POST'])
 def get_add_bookings():
     if request.method == 'GET':
-        bookings_list = Bookings.query.all()
-        serialized_bookings = [booking.serialize() for booking in bookings_list]
-        return jsonify(serialized_bookings), 200
+        # Optional filters: pro_id, pro_service_id, patient_id, status, from and to (dates, both included)
+        bookings_query = Bookings.serialize_query()
+        pro_id = int_arg('pro_id')
+        if pro_id is not None:
+            bookings_query = bookings_query.join(ProServices).filter(ProServices.pro_id == pro_id)
+        for field in ('pro_service_id', 'patient_id'):
+            value = int_arg(field)
+            if value is not None:
+                bookings_query = bookings_query.filter(getattr(Bookings, field) == value)
+        if request.args.get('status'):
+            bookings_query = bookings_query.filter(Bookings.status == request.args['status'])
+        if request.args.get('from'):
+            bookings_query = bookings_query.filter(Bookings.date >= to_date(request.args['from']))
+        if request.args.get('to'):
+            bookings_query = bookings_query.filter(Bookings.date <= to_date(request.args['to']))
+        return jsonify(paginate(bookings_query, Bookings.id, Bookings.serialize)), 200
     if request.method == 'POST':
         data = request.json
         # Check if the required fields are present in the request
@@ -670,6 +347,8 @@ def get_add_bookings():
                                patient_id=data['patient_id'],
                                pro_notes=data.get('pro_notes'),   # using .get method begause we can set default value
                                patient_notes=data.get('patient_notes'))  # using .get method begause we can set default value
+        # 409 if someone else took the slot, the pro stays locked until the commit
+        reserve_slot(new_booking)
         db.session.add(new_booking)
         db.session.commit()
         return jsonify(new_booking.serialize()), 201
@@ -694,6 +373,8 @@ def specific_booking(bookingid):
         booking.patient_id = data.get('patient_id', booking.patient_id)
         booking.pro_notes = data.get('pro_notes', booking.pro_notes)
         booking.patient_notes = data.get('patient_notes', booking.patient_notes)
+        if any(field in data for field in ('date', 'starting_time', 'status', 'pro_service_id')):
+            reserve_slot(booking)
         db.session.commit()
         return jsonify(booking.serialize()), 200
 
@@ -710,10 +391,15 @@ def specific_delete_booking(bookingid):
         return jsonify({"message": "Record deleted successfully"}), 200
 
 
-# Get records filtered by pro_id
+# Get records filtered by pro_id, optionally between two dates: ?from=YYYY-MM-DD&to=YYYY-MM-DD
 @api.route("/pros/<int:proid>/bookings", methods=['GET'])
 def bookings_by_pro_id(proid):
-    bookings_by_pro = Bookings.query.join(ProServices).filter_by(pro_id=proid).all()
+    bookings_query = Bookings.serialize_query().join(ProServices).filter(ProServices.pro_id == proid)
+    if request.args.get('from'):
+        bookings_query = bookings_query.filter(Bookings.date >= to_date(request.args['from']))
+    if request.args.get('to'):
+        bookings_query = bookings_query.filter(Bookings.date <= to_date(request.args['to']))
+    bookings_by_pro = bookings_query.order_by(Bookings.date, Bookings.starting_time).all()
 
     if not bookings_by_pro:
         return jsonify({"message": "No records found for the specified pro_id"}), 404
@@ -722,6 +408,84 @@ def bookings_by_pro_id(proid):
     return jsonify(serialized_bookings), 200
 
 
+# Bookings, inactivity, hours and proservices of a pro changed since `since`, the token of a
+# previous response; deleted rows only as ids. Without since: all of them and the first token.
+# While has_more is true, ask again with the new token. eg: /pros/1/changes?since=1520
+@api.route("/pros/<int:proid>/changes", methods=['GET'])
+def changes_by_pro_id(proid):
+    since = request.args.get('since')
+    if since is None:
+        return jsonify(snapshot(proid)), 200
+    if not since.isdigit():
+        return jsonify({"message": "since must be a token returned by this endpoint"}), 400
+    limit = int_arg('limit', CHANGES_LIMIT)
+    return jsonify(changes_since(proid, int(since), limit)), 200
+
+
+# Patients with a booking of the pro, with their first and last visit and number of bookings
+# (cancelled ones not counted), in one query. Keyset paginated on the patient id.
+@api.route("/pros/<int:proid>/patients", methods=['GET'])
+def patients_by_pro_id(proid):
+    active = Bookings.status.notin_(INACTIVE_BOOKING_STATUSES)
+    pro_services = db.session.query(ProServices.id).filter(ProServices.pro_id == proid)
+    patients_query = db.session.query(Patients.id, Patients.name, Patients.lastname, Patients.email, Patients.phone,
+                                      db.func.min(db.case((active, Bookings.date))).label("first_visit"),
+                                      db.func.max(db.case((active, Bookings.date))).label("last_visit"),
+                                      db.func.count(db.case((active, Bookings.id))).label("booking_count")) \
+                           .join(Bookings, Bookings.patient_id == Patients.id) \
+                           .filter(Bookings.pro_service_id.in_(pro_services)) \
+                           .group_by(Patients.id)
+
+    def serialize(row):
+        return {"id": row.id,
+                "name": row.name,
+                "lastname": row.lastname,
+                "email": row.email,
+                "phone": row.phone,
+                "first_visit": row.first_visit.isoformat() if row.first_visit else None,
+                "last_visit": row.last_visit.isoformat() if row.last_visit else None,
+                "booking_count": row.booking_count}
+    return jsonify(paginate(patients_query, Patients.id, serialize)), 200
+
+
+# Patients of a pro matching q (prefix, substring or close to a word of their name, lastname,
+# email or phone), best matches first. The cursor is the offset of the page, eg: /pros/1/patients/search?q=garcia
+@api.route("/pros/<int:proid>/patients/search", methods=['GET'])
+def search_patients_by_pro_id(proid):
+    q = request.args.get('q', '')
+    if not q.strip():
+        return jsonify({"message": "q is required"}), 400
+    offset, limit = page_args()
+    return jsonify(search_patients(proid, q, max(offset, 0), limit)), 200
+
+
+# Get the free slots of a pro for one of its services between two dates (both included)
+# eg: /pros/1/availability?pro_service_id=2&from=2024-02-01&to=2024-02-29
+@api.route("/pros/<int:proid>/availability", methods=['GET'])
+def availability_by_pro_id(proid):
+    pro_service = ProServices.query.filter_by(id=int_arg('pro_service_id'), pro_id=proid).first()
+    if not pro_service:
+        return jsonify({"message": "service not found for the specified pro_id"}), 404
+    first_day = to_date(request.args.get('from')) or datetime.date.today()
+    last_day = to_date(request.args.get('to')) or first_day
+    if last_day < first_day:
+        return jsonify({"message": "from and to must be dates (YYYY-MM-DD) and from can't be after to"}), 400
+    if (last_day - first_day).days >= MAX_WINDOW_DAYS:
+        return jsonify({"message": f"the date window can't be longer than {MAX_WINDOW_DAYS} days"}), 400
+    location = Locations.query.filter_by(pro_id=proid).first()
+    holiday_dates = set()
+    if location:
+        for year in range(first_day.year, last_day.year + 1):
+            holiday_dates.update(country_holiday_dates(year, location.country))
+    slots = get_availability(pro_service, first_day, last_day, holiday_dates)
+    return jsonify({"pro_id": proid,
+                    "pro_service_id": pro_service.id,
+                    "duration": pro_service.duration,
+                    "from": first_day.isoformat(),
+                    "to": last_day.isoformat(),
+                    "slots": slots}), 200
+
+
 ################################################################
 # Locations
 
@@ -793,9 +557,12 @@ def locations_by_pro_id(proid):
 @api.route("/pros", methods=["GET", "POST"])
 def handle_pros():
     if request.method == 'GET':
-        pros_list = Pros.query.all()
-        serialized_pros = [pro.serialize() for pro in pros_list]
-        return jsonify(serialized_pros), 200
+        # Optional filters: config_status
+        pros_query = Pros.query
+        config_status = int_arg('config_status')
+        if config_status is not None:
+            pros_query = pros_query.filter(Pros.config_status == config_status)
+        return jsonify(paginate(pros_query, Pros.id, Pros.serialize)), 200
     if request.method == 'POST':
         data = request.json
         # Check if the required fields are present in the request
@@ -847,29 +614,94 @@ def handle_pro(proid):
         pro.google_refresh_token = data.get('google_refresh_token', pro.google_refresh_token)
         pro.title = data.get('title', pro.title)
         db.session.commit()
+        if 'google_access_token' in data or 'google_refresh_token' in data:
+            invalidate_pro(proid)
         return jsonify(pro.serialize()), 200
     if request.method == 'DELETE':
-        db.session.delete(pro)
+        # The pro and everything that depends on it, in a few statements
+        delete_pro(pro)
         db.session.commit()
+        invalidate_pro(proid)
         return jsonify({"message": "pro deleted successfully"}), 200
     
 # Get a pro by username
 @api.route("/pros/<string:username>", methods=["GET"])
 def get_pro_by_username(username):
-    pro = Pros.query.filter_by(bookingpage_url=username).first()
-    if not pro:
-        return jsonify({"message": "pro not found"}), 404
-    if request.method == 'GET':
+    def build():
+        pro = Pros.query.filter_by(bookingpage_url=username).first()
+        if not pro:
+            return jsonify({"message": "pro not found"}), 404
         return jsonify(pro.serialize()), 200
+    return versioned_response([f"pro:{username}"], build)
     
 
+# Everything the booking page of a pro needs in one response and a fixed number of queries:
+# the pro, its locations, proservices and hours, and its inactivity and busy booking slots
+# between from and to (both included, default: the next PAGE_WINDOW_DAYS days)
+# eg: /pages/dr-house?from=2024-02-01&to=2024-03-31
+PAGE_WINDOW_DAYS = 90
+
+
+@api.route("/pages/<string:bookingpage_url>", methods=["GET"])
+def booking_page(bookingpage_url):
+    first_day = to_date(request.args.get('from')) or datetime.date.today()
+    last_day = to_date(request.args.get('to')) or first_day + datetime.timedelta(days=PAGE_WINDOW_DAYS - 1)
+    if last_day < first_day:
+        return jsonify({"message": "from and to must be dates (YYYY-MM-DD) and from can't be after to"}), 400
+    if (last_day - first_day).days >= MAX_WINDOW_DAYS:
+        return jsonify({"message": f"the date window can't be longer than {MAX_WINDOW_DAYS} days"}), 400
+    proid = db.session.query(Pros.id).filter_by(bookingpage_url=bookingpage_url).scalar()
+    if proid is None:
+        return jsonify({"message": "pro not found"}), 404
+
+    def build():
+        pro = Pros.query.options(selectinload(Pros.location),
+                                 selectinload(Pros.services).joinedload(ProServices.services)).get(proid)
+        hours = Hours.query.filter_by(pro_id=proid).order_by(Hours.working_day).all()
+        inactivity = InactivityDays.query.filter(InactivityDays.pro_id == proid,
+                                                 InactivityDays.starting_date <= last_day,
+                                                 db.func.coalesce(InactivityDays.ending_date, InactivityDays.starting_date) >= first_day) \
+                                         .order_by(InactivityDays.starting_date).all()
+        # Only what the page needs to block the slot, nothing about the patient
+        bookings = db.session.query(Bookings.id, Bookings.date, Bookings.starting_time, Bookings.status,
+                                    Bookings.pro_service_id, ProServices.duration) \
+                             .join(ProServices) \
+                             .filter(ProServices.pro_id == proid,
+                                     Bookings.date.between(first_day, last_day),
+                                     Bookings.status.notin_(INACTIVE_BOOKING_STATUSES)) \
+                             .order_by(Bookings.date, Bookings.starting_time).all()
+        return jsonify({"pro": pro.serialize(),
+                        "locations": [location.serialize() for location in pro.location],
+                        "proservices": [proservice.serialize() for proservice in pro.services],
+                        "hours": [hour.serialize() for hour in hours],
+                        "inactivity": [inactivity_day.serialize() for inactivity_day in inactivity],
+                        "bookings": [{"id": booking.id,
+                                      "date": booking.date.isoformat(),
+                                      "starting_time": booking.starting_time.strftime("%H:%M"),
+                                      "status": booking.status,
+                                      "pro_service_id": booking.pro_service_id,
+                                      "duration": booking.duration} for booking in bookings],
+                        "from": first_day.isoformat(),
+                        "to": last_day.isoformat()}), 200
+
+    names = [f"pro:{bookingpage_url}", f"locations:{proid}", f"proservices:{proid}", "services",
+             f"hours:{proid}", f"inactivity:{proid}", f"bookings:{proid}"]
+    return versioned_response(names, build, extra=f"{first_day}/{last_day}")
+
+
 # Get all ProServices or post a new one.
 @api.route("/proservices", methods=["GET", "POST"])
 def handle_proservices():
     if request.method == 'GET':
-        proservices_list = ProServices.query.all()
-        serialized_proservices = [proservice.serialize() for proservice in proservices_list]
-        return jsonify(serialized_proservices), 200
+        # Optional filters: pro_id, service_id, activated (true/false)
+        proservices_query = ProServices.serialize_query()
+        for field in ('pro_id', 'service_id'):
+            value = int_arg(field)
+            if value is not None:
+                proservices_query = proservices_query.filter(getattr(ProServices, field) == value)
+        if request.args.get('activated') is not None:
+            proservices_query = proservices_query.filter(ProServices.activated == (request.args['activated'].lower() == 'true'))
+        return jsonify(paginate(proservices_query, ProServices.id, ProServices.serialize)), 200
     if request.method == 'POST':
         data = request.json
         # Check if the required fields are present in the request
@@ -909,20 +741,25 @@ def handle_proservice(proserviceid):
 # Get ProServices by pro_id
 @api.route("/pros/<int:proid>/proservices", methods=["GET"])
 def handle_proservices_by_pro(proid):
-    proservices_by_pro = ProServices.query.filter_by(pro_id=proid).all()
-    if not proservices_by_pro:
-        return jsonify({"message": "No records found for the specified pro_id"}), 404
-    serialized_proservices = [proservice.serialize() for proservice in proservices_by_pro]
-    return jsonify(serialized_proservices), 200
+    def build():
+        proservices_by_pro = ProServices.serialize_query().filter_by(pro_id=proid).all()
+        if not proservices_by_pro:
+            return jsonify({"message": "No records found for the specified pro_id"}), 404
+        serialized_proservices = [proservice.serialize() for proservice in proservices_by_pro]
+        return jsonify(serialized_proservices), 200
+    # Each proservice carries the name of its service
+    return versioned_response([f"proservices:{proid}", "services"], build)
 
 
 # Get all Services and Post new Service.
 @api.route("/services", methods=["GET", "POST"])
 def handle_services():
     if request.method == 'GET':
-        services_list = Services.query.all()
-        serialized_services = [service.serialize() for service in services_list]
-        return jsonify(serialized_services), 200
+        def build():
+            services_list = Services.query.all()
+            serialized_services = [service.serialize() for service in services_list]
+            return jsonify(serialized_services), 200
+        return versioned_response(["services"], build)
     if request.method == 'POST':
         data = request.json
         # Check if the required fields are present in the request
@@ -978,9 +815,18 @@ def handle_service_by_booking(proserviceid):
 @api.route("/inactivity", methods=["GET", "POST"])
 def handle_inactivitydays():
     if request.method == 'GET':
-        inactivity_list = InactivityDays.query.all()
-        serialized_inactivities = [inactivity.serialize() for inactivity in inactivity_list]
-        return jsonify(serialized_inactivities), 200
+        # Optional filters: pro_id, type, from and to (dates, inactivities overlapping the range)
+        inactivity_query = InactivityDays.query
+        pro_id = int_arg('pro_id')
+        if pro_id is not None:
+            inactivity_query = inactivity_query.filter(InactivityDays.pro_id == pro_id)
+        if request.args.get('type'):
+            inactivity_query = inactivity_query.filter(InactivityDays.type == request.args['type'])
+        if request.args.get('from'):
+            inactivity_query = inactivity_query.filter(db.func.coalesce(InactivityDays.ending_date, InactivityDays.starting_date) >= to_date(request.args['from']))
+        if request.args.get('to'):
+            inactivity_query = inactivity_query.filter(InactivityDays.starting_date <= to_date(request.args['to']))
+        return jsonify(paginate(inactivity_query, InactivityDays.id, InactivityDays.serialize)), 200
     if request.method == 'POST':
         data = request.json
         # Check if the required fields are present in the request
@@ -0,0 +1,87 @@
+"""
+Weekly schedule of a pro (PUT /api/pros/<proid>/schedule).
+The whole week is replaced in one transaction with the same statements whatever its size:
+one DELETE of the pro's hours rows and one INSERT of the new ones. Those bypass the ORM, so
+the resource versions and the change log are updated here. The pro's "hours:<pro_id>"
+version is bumped first, which also makes two replaces of the same week run one after the other.
+"""
+from api.models import db, Hours, Locations
+from api.availability import parse_minutes, format_minutes
+from api.resource_versions import bump_versions
+from api.change_feed import record_changes
+from api.utils import APIException
+
+
+WORKING_DAYS = range(7)  # 0 = sunday
+
+
+# (start, end) in minutes of a block of `row`, None if both fields are empty
+def parse_block(row, start_field, end_field, where):
+    start_value, end_value = row.get(start_field), row.get(end_field)
+    if start_value in (None, "") and end_value in (None, ""):
+        return None
+    start, end = parse_minutes(start_value), parse_minutes(end_value)
+    if start is None or end is None:
+        raise APIException(f"{where}: {start_field} and {end_field} must both be times (HH:MM)")
+    if not 0 <= start < end <= 24 * 60:
+        raise APIException(f"{where}: {start_field} must be before {end_field}")
+    return start, end
+
+
+# Hours rows to insert for `rows`, or an APIException (400) saying what's wrong with them
+def validate_schedule(proid, rows):
+    if not isinstance(rows, list):
+        raise APIException("hours must be a list")
+    location_ids = {location_id for (location_id,) in db.session.query(Locations.id).filter(Locations.pro_id == proid)}
+    blocks_by_day = {}
+    hours = []
+    for index, row in enumerate(rows):
+        where = f"hours[{index}]"
+        if not isinstance(row, dict):
+            raise APIException(f"{where} must be an object")
+        working_day = row.get("working_day")
+        # JSON true/false are ints in Python, they aren't days
+        if not isinstance(working_day, int) or isinstance(working_day, bool) or working_day not in WORKING_DAYS:
+            raise APIException(f"{where}: working_day must be 0 (sunday) to 6")
+        if row.get("location_id") not in location_ids:
+            raise APIException(f"{where}: location_id must be a location of the pro")
+        morning = parse_block(row, "starting_hour_morning", "ending_hour_morning", where)
+        if morning is None:
+            raise APIException(f"{where}: starting_hour_morning and ending_hour_morning are required")
+        afternoon = parse_block(row, "starting_hour_after", "ending_hour_after", where)
+        for name, block in (("morning", morning), ("afternoon", afternoon)):
+            if block is not None:
+                blocks_by_day.setdefault(working_day, []).append((block, f"{where}.{name}"))
+        hours.append({"working_day": working_day,
+                      "starting_hour_morning": format_minutes(morning[0]),
+                      "ending_hour_morning": format_minutes(morning[1]),
+                      "starting_hour_after": format_minutes(afternoon[0]) if afternoon else None,
+                      "ending_hour_after": format_minutes(afternoon[1]) if afternoon else None,
+                      "location_id": row["location_id"],
+                      "pro_id": proid})
+    for working_day, blocks in blocks_by_day.items():
+        blocks.sort()
+        for ((_, previous_end), previous_where), ((start, _), where) in zip(blocks, blocks[1:]):
+            if start < previous_end:
+                raise APIException(f"{where} overlaps {previous_where} on working_day {working_day}")
+    return hours
+
+
+# Replaces the pro's hours with `rows` (see validate_schedule) and returns the new ones. The
+# caller commits.
+def replace_schedule(proid, rows):
+    hours = validate_schedule(proid, rows)
+    bump_versions([f"hours:{proid}"])
+    table = Hours.__table__
+    previous = db.session.execute(db.select(table.c.id, table.c.location_id).where(table.c.pro_id == proid)).all()
+    db.session.execute(table.delete().where(table.c.pro_id == proid))
+    if hours:
+        db.session.execute(table.insert(), hours)
+    # Ids of deleted rows can be given again, don't reuse objects of the session for them
+    new_hours = Hours.query.filter_by(pro_id=proid).populate_existing() \
+                           .order_by(Hours.working_day, Hours.starting_hour_morning, Hours.id).all()
+    location_ids = {location_id for _, location_id in previous} | {hour.location_id for hour in new_hours}
+    bump_versions({f"location_hours:{location_id}" for location_id in location_ids})
+    record_changes([(proid, "hours", hour_id, "delete") for hour_id, _ in previous] +
+                   [(proid, "hours", hour.id, "upsert") for hour in new_hours])
+    return new_hours
@@ -0,0 +1,209 @@
+"""
+Synthetic data for load testing (flask seed).
+Rows are generated from a seeded random generator and dated from a fixed start date, so the
+same options always produce the same dataset, and are written with bulk INSERTs of
+BATCH_SIZE rows, one transaction per table. Ids are assigned here, after the current
+maximum of each table, so related rows can point to each other without reading anything back.
+"""
+import random
+import datetime
+from api.models import db, Pros, Locations, Services, ProServices, Hours, Patients, Bookings, InactivityDays
+from api.holiday_calendar import COUNTRIES
+from api.resource_versions import bump_versions
+
+
+BATCH_SIZE = 10000
+SPECIALIZATIONS = {
+    "Psychology": ["First visit", "Online Session", "Follow-up"],
+    "Oftalmologist": ["First visit", "Treatment", "Eye exam"],
+    "Cardiology": ["First visit", "Surgery", "Check-up"],
+    "Physiotherapy": ["First visit", "Joints massage", "Rehabilitation"],
+    "General Medicine": ["First visit", "Phone Session", "Check-up"],
+}
+FIRST_NAMES = ["Ana", "Maria", "Lucia", "Paula", "Laura", "Carmen", "Elena", "Sofia", "Marta", "Julia",
+               "Antonio", "Jose", "Manuel", "Francisco", "David", "Juan", "Javier", "Daniel", "Carlos", "Miguel",
+               "Emma", "Olivia", "Noah", "Liam", "Hugo", "Leo", "Mateo", "Martina", "Valeria", "Alejandro"]
+LAST_NAMES = ["Garcia", "Rodriguez", "Gonzalez", "Fernandez", "Lopez", "Martinez", "Sanchez", "Perez",
+              "Gomez", "Martin", "Jimenez", "Ruiz", "Hernandez", "Diaz", "Moreno", "Alvarez", "Romero",
+              "Alonso", "Navarro", "Torres", "Smith", "Johnson", "Brown", "Wilson", "Taylor", "Cabaleiro"]
+DURATIONS = [30, 45, 60]
+# Every booking takes one of these hourly slots, so bookings of a pro never overlap
+SLOT_TIMES = [datetime.time(hour, 0) for hour in (9, 10, 11, 12, 15, 16, 17, 18)]
+STATUSES = ["confirmed"] * 8 + ["pending"] * 2
+WORKING_DAYS = [1, 2, 3, 4, 5]  # monday to friday, 0 = sunday
+# First day of the bookings, the inactivity days fall in the two years after it
+DEFAULT_START_DATE = datetime.date(2024, 1, 1)
+
+
+def next_id(model):
+    return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+
+def bulk_insert(model, rows):
+    total = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            db.session.execute(model.__table__.insert(), batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(model.__table__.insert(), batch)
+        total += len(batch)
+    db.session.commit()
+    return total
+
+
+# Explicit ids don't move Postgres sequences, point them after the rows we inserted
+def reset_sequences(models):
+    if db.engine.dialect.name != 'postgresql':
+        return
+    for model in models:
+        table = model.__tablename__
+        db.session.execute(db.text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                                   f"COALESCE((SELECT MAX(id) FROM {table}), 1))"))
+    db.session.commit()
+
+
+def seed_database(pros=100, bookings_per_pro=500, patients=None, inactivities_per_pro=3, seed=42, start_date=DEFAULT_START_DATE, log=print):
+    rng = random.Random(seed)
+    patients = patients or pros * 50
+    countries = list(COUNTRIES)
+    counts = {}
+
+    # Services catalog, shared by every pro
+    services = Services.query.all()
+    if not services:
+        service_id = next_id(Services)
+        service_rows = []
+        for specialization, service_names in SPECIALIZATIONS.items():
+            for service_name in service_names:
+                service_rows.append({"id": service_id, "specialization": specialization, "service_name": service_name})
+                service_id += 1
+        counts["services"] = bulk_insert(Services, service_rows)
+        # Bulk inserts skip the ORM hook that versions the services list
+        bump_versions(["services"])
+        db.session.commit()
+        services = Services.query.all()
+    service_ids = [service.id for service in services]
+
+    first_pro = next_id(Pros)
+    pro_ids = range(first_pro, first_pro + pros)
+    counts["pros"] = bulk_insert(Pros, ({"id": pro_id,
+                                         "password": "123456",
+                                         "name": f"Pro{pro_id}",
+                                         "lastname": f"Seed{pro_id}",
+                                         "email": f"seed_pro{pro_id}@docdate.test",
+                                         "phone": f"6{rng.randrange(10 ** 8):08d}",
+                                         "bookingpage_url": f"seed-pro{pro_id}",
+                                         "config_status": 4,
+                                         "title": "Dr."} for pro_id in pro_ids))
+    log("pros:", counts["pros"])
+
+    first_location = next_id(Locations)
+    location_by_pro = {pro_id: first_location + index for index, pro_id in enumerate(pro_ids)}
+    counts["locations"] = bulk_insert(Locations, ({"id": location_by_pro[pro_id],
+                                                   "name": f"Studio{pro_id}",
+                                                   "address": f"Street {pro_id}",
+                                                   "city": f"City{pro_id % 100}",
+                                                   "country": rng.choice(countries),
+                                                   "time_zone": "Europe/Madrid",
+                                                   "pro_id": pro_id} for pro_id in pro_ids))
+    log("locations:", counts["locations"])
+
+    hour_id = next_id(Hours)
+    hour_rows = []
+    for pro_id in pro_ids:
+        for working_day in WORKING_DAYS:
+            hour_rows.append({"id": hour_id,
+                              "working_day": working_day,
+                              "starting_hour_morning": "09:00",
+                              "ending_hour_morning": "13:00",
+                              "starting_hour_after": "15:00",
+                              "ending_hour_after": "19:00",
+                              "pro_id": pro_id,
+                              "location_id": location_by_pro[pro_id]})
+            hour_id += 1
+    counts["hours"] = bulk_insert(Hours, hour_rows)
+    log("hours:", counts["hours"])
+
+    proservice_id = next_id(ProServices)
+    proservices_by_pro = {}
+    proservice_rows = []
+    for pro_id in pro_ids:
+        for service_id in rng.sample(service_ids, min(3, len(service_ids))):
+            proservice_rows.append({"id": proservice_id,
+                                    "price": rng.randrange(30, 150, 5),
+                                    "pro_id": pro_id,
+                                    "duration": rng.choice(DURATIONS),
+                                    "service_id": service_id,
+                                    "activated": True})
+            proservices_by_pro.setdefault(pro_id, []).append(proservice_id)
+            proservice_id += 1
+    counts["proservices"] = bulk_insert(ProServices, proservice_rows)
+    log("proservices:", counts["proservices"])
+
+    first_patient = next_id(Patients)
+
+    # Real looking names, so patient search has realistic matches to rank
+    def patient_rows():
+        for patient_id in range(first_patient, first_patient + patients):
+            name = rng.choice(FIRST_NAMES)
+            lastname = f"{rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}"
+            yield {"id": patient_id,
+                   "name": name,
+                   "lastname": lastname,
+                   "email": f"{name}.{lastname.split()[0]}{patient_id}@docdate.test".lower(),
+                   "phone": f"6{rng.randrange(10 ** 8):08d}"}
+    counts["patients"] = bulk_insert(Patients, patient_rows())
+    log("patients:", counts["patients"])
+
+    # Bookings fill the slots of each pro's working days one after the other from start_date
+    def booking_rows():
+        booking_id = next_id(Bookings)
+        for pro_id in pro_ids:
+            day = start_date
+            slots = []
+            for _ in range(bookings_per_pro):
+                while not slots:
+                    if (day.weekday() + 1) % 7 in WORKING_DAYS:
+                        slots = [slot for slot in SLOT_TIMES if rng.random() < 0.85]
+                    day += datetime.timedelta(days=1)
+                yield {"id": booking_id,
+                       "date": day - datetime.timedelta(days=1),
+                       "starting_time": slots.pop(0),
+                       "status": rng.choice(STATUSES),
+                       "pro_service_id": rng.choice(proservices_by_pro[pro_id]),
+                       "patient_id": rng.randrange(first_patient, first_patient + patients)}
+                booking_id += 1
+    counts["bookings"] = bulk_insert(Bookings, booking_rows())
+    log("bookings:", counts["bookings"])
+
+    # Full day, ranged and partial day inactivities, in turns
+    def inactivity_rows():
+        inactivity_id = next_id(InactivityDays)
+        for pro_id in pro_ids:
+            for index in range(inactivities_per_pro):
+                starting_date = start_date + datetime.timedelta(days=rng.randrange(730))
+                row = {"id": inactivity_id,
+                       "title": "Seed inactivity",
+                       "starting_date": starting_date,
+                       "ending_date": None,
+                       "starting_hour": None,
+                       "ending_hour": None,
+                       "type": "holiday",
+                       "pro_id": pro_id}
+                if index % 3 == 1:
+                    row["ending_date"] = starting_date + datetime.timedelta(days=rng.randrange(1, 14))
+                elif index % 3 == 2:
+                    row["starting_hour"] = datetime.time(rng.choice((9, 10, 15)), 0)
+                    row["ending_hour"] = datetime.time(row["starting_hour"].hour + 2, 0)
+                    row["type"] = "personal"
+                yield row
+                inactivity_id += 1
+    counts["inactivities"] = bulk_insert(InactivityDays, inactivity_rows())
+    log("inactivities:", counts["inactivities"])
+
+    reset_sequences([Services, Pros, Locations, Hours, ProServices, Patients, Bookings, InactivityDays])
+    return counts
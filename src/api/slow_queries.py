@@ -0,0 +1,112 @@
+"""
+Slow-query log.
+SQL statements slower than SLOW_QUERY_THRESHOLD_MS are written, one JSON object per line,
+to SLOW_QUERY_LOG (default: slow_queries.jsonl in the app's instance folder, rotated every
+SLOW_QUERY_LOG_MAX_BYTES), with the endpoint of the request that issued them and the first
+frame of our code (src/api) that led to them. SLOW_QUERY_SAMPLE_RATE keeps only that
+fraction of them, 0 turns the log off.
+Parameters hold passwords, tokens and patients' data, they're only written with
+SLOW_QUERY_LOG_PARAMETERS=1, with the sensitive ones redacted and the others truncated. An
+executemany is written with its number of rows, never its rows.
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import datetime
+from logging.handlers import RotatingFileHandler
+from flask import has_request_context, request
+from sqlalchemy import event
+from api.instrumentation import metrics
+
+
+THRESHOLD_SECONDS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", 200)) / 1000
+SAMPLE_RATE = float(os.getenv("SLOW_QUERY_SAMPLE_RATE", 1))
+LOG_PATH = os.getenv("SLOW_QUERY_LOG")
+LOG_PARAMETERS = os.getenv("SLOW_QUERY_LOG_PARAMETERS") == "1"
+LOG_MAX_BYTES = int(os.getenv("SLOW_QUERY_LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUPS = int(os.getenv("SLOW_QUERY_LOG_BACKUPS", 5))
+MAX_PARAMETER_LENGTH = 32
+# Parameters whose name contains one of these are never written
+SENSITIVE_NAMES = ("password", "token", "secret", "email", "phone", "name", "notes", "receiver")
+API_DIR = os.path.dirname(os.path.realpath(__file__))
+# Frames of these files are the logging machinery, not the code that issued the query
+SKIPPED_FILES = {os.path.realpath(__file__), os.path.join(API_DIR, "instrumentation.py")}
+
+logger = logging.getLogger("docdate.slow_queries")
+logger.propagate = False
+metrics.counter("docdate_db_slow_queries_total", "SQL statements over the slow-query threshold by endpoint.")
+
+
+# "file.py:line in function" of the innermost frame in src/api, None if there is none
+def application_frame():
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = os.path.realpath(frame.f_code.co_filename)
+        if filename.startswith(API_DIR) and filename not in SKIPPED_FILES:
+            return f"{os.path.relpath(filename, os.path.dirname(API_DIR))}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+def loggable_value(name, value):
+    if any(sensitive in name.lower() for sensitive in SENSITIVE_NAMES):
+        return "[redacted]"
+    if isinstance(value, (str, bytes)) and len(value) > MAX_PARAMETER_LENGTH:
+        return value[:MAX_PARAMETER_LENGTH] + "..."
+    return value
+
+
+# {name: value} of the statement's parameters as they can be logged. Positional ones get
+# their names from the compiled statement when there's one.
+def loggable_parameters(parameters, context):
+    if isinstance(parameters, dict):
+        named = parameters.items()
+    else:
+        compiled = getattr(context, "compiled", None)
+        names = getattr(compiled, "positiontup", None) or []
+        named = [(names[index] if index < len(names) else str(index), value)
+                 for index, value in enumerate(parameters or ())]
+    return {name: loggable_value(name, value) for name, value in named}
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["slow_query_start"] = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info.pop("slow_query_start", time.perf_counter())
+    if elapsed < THRESHOLD_SECONDS:
+        return
+    endpoint = request.endpoint if has_request_context() else None
+    metrics.inc("docdate_db_slow_queries_total", (("endpoint", endpoint or "none"),))
+    if random.random() >= SAMPLE_RATE:
+        return
+    logger.warning(json.dumps({
+        "at": datetime.datetime.utcnow().isoformat(timespec="milliseconds"),
+        "duration_ms": round(elapsed * 1000, 3),
+        "statement": statement,
+        "parameters": loggable_parameters(parameters, context) if LOG_PARAMETERS and not executemany else None,
+        "rows": len(parameters) if executemany else None,
+        "endpoint": endpoint,
+        "method": request.method if endpoint else None,
+        "path": request.path if endpoint else None,
+        "frame": application_frame(),
+    }, default=str))
+
+
+def setup_slow_query_log(app, db):
+    if SAMPLE_RATE <= 0:
+        return
+    if not logger.handlers:
+        path = LOG_PATH or os.path.join(app.instance_path, "slow_queries.jsonl")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        handler = RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
@@ -0,0 +1,172 @@
+"""
+Static files of the frontend (public/).
+The directory is read once at startup into an in-memory manifest: content, content hash,
+last modification and gzip/brotli variants of every file (a .gz/.br file next to the
+original is used if the build made one, otherwise it's compressed here; brotli needs the
+optional brotli package). Every file can be requested under its content-hashed name,
+eg: /bundle.3f2a9c1d0b4e.js, which is cached for a year, and index.html is rewritten to
+point to those names and cached for a minute only.
+"""
+import os
+import re
+import gzip
+import hashlib
+import mimetypes
+import threading
+from werkzeug.http import http_date
+from flask import request, Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+INDEX = "index.html"
+HASH_LENGTH = 12
+IMMUTABLE = "public, max-age=31536000, immutable"
+INDEX_CACHE = "public, max-age=60"
+# Files without a hash in their url (images loaded by the bundle, favicon...)
+REVALIDATE = "public, no-cache"
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml", "image/x-icon",
+                "image/vnd.microsoft.icon")
+MIN_COMPRESS_SIZE = 1024
+HASHED_NAME = re.compile(r"^(?P<stem>.+)\.(?P<hash>[0-9a-f]{%d})(?P<ext>\.[^./]+)$" % HASH_LENGTH)
+
+
+class Asset:
+    def __init__(self, path, content, modified, stamp=None):
+        self.path = path
+        self.content = content
+        self.modified = modified
+        self.stamp = stamp  # (modification time in ns, size) of the file it was read from
+        self.hash = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+        self.mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.encodings = {}  # "gzip"/"br" -> compressed content
+
+    @property
+    def hashed_path(self):
+        stem, ext = os.path.splitext(self.path)
+        return f"{stem}.{self.hash}{ext}"
+
+
+def read_file(path):
+    with open(path, "rb") as asset_file:
+        return asset_file.read()
+
+
+def compress(asset, full_path):
+    if not asset.mimetype.startswith(COMPRESSIBLE) or len(asset.content) < MIN_COMPRESS_SIZE:
+        return
+    if os.path.isfile(full_path + ".gz"):
+        asset.encodings["gzip"] = read_file(full_path + ".gz")
+    else:
+        asset.encodings["gzip"] = gzip.compress(asset.content, compresslevel=9, mtime=0)
+    if os.path.isfile(full_path + ".br"):
+        asset.encodings["br"] = read_file(full_path + ".br")
+    elif brotli is not None:
+        asset.encodings["br"] = brotli.compress(asset.content)
+
+
+# Script and link urls of index.html pointing to the hashed names
+def fingerprint_index(index, assets):
+    html = index.content.decode("utf-8")
+    for asset in assets.values():
+        if asset.path != INDEX:
+            html = html.replace(f'="/{asset.path}"', f'="/{asset.hashed_path}"')
+    fingerprinted = Asset(INDEX, html.encode("utf-8"), index.modified, index.stamp)
+    fingerprinted.source = index
+    compress(fingerprinted, "")
+    return fingerprinted
+
+
+# path relative to `directory` -> Asset. The files of `previous` (an earlier manifest) that have
+# the same modification time and size aren't read and compressed again, and `previous` itself
+# is returned if none changed.
+def build_manifest(directory, previous=None):
+    previous = previous or {}
+    assets = {}
+    changed = False
+    for root, _, filenames in os.walk(directory):
+        for filename in filenames:
+            if filename.endswith((".gz", ".br")):
+                continue
+            full_path = os.path.join(root, filename)
+            path = os.path.relpath(full_path, directory).replace(os.sep, "/")
+            stat = os.stat(full_path)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            asset = previous.get(path)
+            if asset is not None and path == INDEX:
+                asset = asset.source
+            if asset is None or asset.stamp != stamp:
+                asset = Asset(path, read_file(full_path), int(stat.st_mtime), stamp)
+                compress(asset, full_path)
+                changed = True
+            assets[path] = asset
+    if not changed and assets.keys() == previous.keys():
+        return previous
+    if INDEX in assets:
+        assets[INDEX] = fingerprint_index(assets[INDEX], assets)
+    return assets
+
+
+class StaticAssets:
+    def __init__(self, directory, reload=False):
+        self.directory = directory
+        # In development the bundle is rebuilt under us, so the manifest is refreshed per request
+        # with the files that changed
+        self.reload = reload
+        self.lock = threading.Lock()
+        self.assets = build_manifest(directory)
+
+    def find(self, path):
+        if self.reload:
+            with self.lock:
+                self.assets = build_manifest(self.directory, self.assets)
+        asset = self.assets.get(path)
+        if asset is not None:
+            return asset, path == INDEX
+        match = HASHED_NAME.match(path)
+        if match:
+            asset = self.assets.get(match["stem"] + match["ext"])
+            if asset is not None and asset.hash == match["hash"]:
+                return asset, True
+        return None, False
+
+    # Response for `path`, index.html (the app routes them) if there is no such file
+    def serve(self, path):
+        asset, hashed = self.find(path)
+        if asset is None and not HASHED_NAME.match(path):
+            asset = self.assets.get(INDEX)
+        if asset is None:
+            # Also a hashed name of an older build, index.html in its place would break the page
+            return Response("Not found\n", status=404, mimetype="text/plain")
+        if asset.path == INDEX:
+            cache_control = INDEX_CACHE
+        else:
+            cache_control = IMMUTABLE if hashed else REVALIDATE
+        return asset_response(asset, cache_control)
+
+
+def preferred_encoding(asset):
+    # A byte range is only meaningful on the uncompressed file
+    if "Range" in request.headers:
+        return None
+    for encoding in ("br", "gzip"):
+        if encoding in asset.encodings and request.accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def asset_response(asset, cache_control):
+    encoding = preferred_encoding(asset)
+    content = asset.encodings[encoding] if encoding else asset.content
+    response = Response(content, mimetype=asset.mimetype)
+    response.headers["Cache-Control"] = cache_control
+    response.headers["Last-Modified"] = http_date(asset.modified)
+    if asset.encodings:
+        response.headers["Vary"] = "Accept-Encoding"
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.set_etag(f"{asset.hash}-{encoding}" if encoding else asset.hash)
+    return response.make_conditional(request, accept_ranges=encoding is None, complete_length=len(content))
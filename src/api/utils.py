@@ -1,4 +1,9 @@
-from flask import jsonify, url_for
+import datetime
+from flask import jsonify, url_for, request
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
 
 
 class APIException(Exception):
@@ -17,6 +22,63 @@ class APIException(Exception):
         return rv
 
 
+# "YYYY-MM-DD" -> date. Empty values become None, anything else that isn't a date is a 400
+def to_date(value):
+    if value is None or value == "" or isinstance(value, datetime.date):
+        return value or None
+    try:
+        return datetime.date.fromisoformat(str(value)[:10])
+    except ValueError:
+        raise APIException(f"invalid date: {value}, expected YYYY-MM-DD")
+
+
+# "HH:MM" or "HH:MM:SS" -> time. Empty values become None, anything else that isn't a time is a 400
+def to_time(value):
+    if value is None or value == "" or isinstance(value, datetime.time):
+        return value or None
+    try:
+        return datetime.time.fromisoformat(str(value))
+    except ValueError:
+        raise APIException(f"invalid time: {value}, expected HH:MM")
+
+
+# Integer query parameter `name` of the request, `default` if it isn't there and a 400 if it
+# isn't an integer, eg: ?pro_id=abc would otherwise filter on pro_id = NULL
+def int_arg(name, default=None):
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise APIException(f"{name} must be an integer")
+
+
+# (cursor, limit) of the request, limit capped to MAX_PAGE_SIZE
+def page_args():
+    try:
+        cursor = int(request.args.get('cursor', 0))
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise APIException("cursor and limit must be integers")
+    if limit < 1:
+        raise APIException("limit must be greater than 0")
+    return cursor, min(limit, MAX_PAGE_SIZE)
+
+
+# Keyset pagination on an increasing id column: ?cursor=<last id received>&limit=<page size>
+# Only one page of rows is ever loaded, so memory doesn't grow with the table.
+def paginate(query, id_column, serialize):
+    cursor, limit = page_args()
+    rows = query.filter(id_column > cursor).order_by(id_column).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = getattr(rows[-1], id_column.key)
+    return {"results": [serialize(row) for row in rows],
+            "next_cursor": next_cursor}
+
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
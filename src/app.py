@@ -2,20 +2,30 @@
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
 """
 import os
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify
 from flask_migrate import Migrate
 from flask_swagger import swagger
 from api.utils import APIException, generate_sitemap
 from api.models import db
+from api.db_config import engine_options, database_health
 from api.routes import api
 from api.admin import setup_admin
 from api.commands import setup_commands
+from api.email_templates import load_templates
+from api.holiday_calendar import precompute_holidays
+from api.instrumentation import setup_instrumentation
+from api.slow_queries import setup_slow_query_log
+from api.profiler import setup_profiler
+from api.rate_limits import setup_rate_limits
+from api.static_assets import StaticAssets
 from flask_jwt_extended import JWTManager
 # from models import Person
 
 
 ENV = "development" if os.getenv("FLASK_DEBUG") == "1" else "production"
 static_file_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../public/')
+# public/ is read once into memory, with hashed urls and gzip/brotli versions of its files
+static_assets = StaticAssets(static_file_dir, reload=ENV == "development")
 app = Flask(__name__)
 app.url_map.strict_slashes = False
 # Database condiguration
@@ -25,6 +35,8 @@ if db_url is not None:
 else:
     app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////Users/lore_air/Desktop/sp50-final-project-g1/test.db"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Pool size, pre-ping, recycle and statement timeout, from the DB_* environment variables
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 MIGRATE = Migrate(app, db, compare_type=True)
 db.init_app(app)
 # Add the admin
@@ -32,30 +44,45 @@ setup_admin(app)
 setup_commands(app)
 # Add all endpoints form the API with a "api" prefix
 app.register_blueprint(api, url_prefix='/api')
+# Compile the email templates once and compute this year's and next year's holidays
+load_templates()
+precompute_holidays()
+# Latency, SQL and pool metrics of every request, on GET /metrics and the Server-Timing header
+setup_instrumentation(app, db)
+# Token buckets per client IP and per pro on the public endpoints, 503 when overloaded
+setup_rate_limits(app)
+setup_slow_query_log(app, db)
+# cProfile of the requests that ask for it (X-Profile: 1 or ?_profile=1), only with PROFILING_ENABLED=1
+setup_profiler(app)
 
 
 # Handle/serialize errors like a JSON object
 @app.errorhandler(APIException)
 def handle_invalid_usage(error):
+    # Drop the half done changes and release the locks they took (eg: a 409 on a reservation)
+    db.session.rollback()
     return jsonify(error.to_dict()), error.status_code
 
 
+# Pool usage and database round trip, 503 if the database can't be reached
+@app.route('/health')
+def health():
+    database = database_health(db.engine)
+    return jsonify({"database": database}), 200 if database["status"] == "ok" else 503
+
+
 # Generate sitemap with all your endpoints
 @app.route('/')
 def sitemap():
     if ENV == "development":
         return generate_sitemap(app)
-    return send_from_directory(static_file_dir, 'index.html')
+    return static_assets.serve('index.html')
 
 
 # Any other endpoint will try to serve it like a static file
 @app.route('/<path:path>', methods=['GET'])
 def serve_any_other_file(path):
-    if not os.path.isfile(os.path.join(static_file_dir, path)):
-        path = 'index.html'
-    response = send_from_directory(static_file_dir, path)
-    response.cache_control.max_age = 0  # Avoid cache memory
-    return response
+    return static_assets.serve(path)
 
 app.config["JWT_SECRET_KEY"] = os.getenv("JWT_KEY")
 jwt = JWTManager(app)
@@ -83,10 +83,10 @@ export default function HoursForm() {
     }
     console.log('hours', finalHours)
 
-    await actions.deleteHoursByPro(store.currentPro.id)
-
-    for (const hour of finalHours) {
-      await actions.newHours(hour)
+    const saved = await actions.saveSchedule(store.currentPro.id, finalHours)
+    if (saved !== true) {
+      alert(saved || "Sorry, somenthing went wrong.")
+      return
     }
     console.log("Hours updated")
     alert("Schedule updated!")
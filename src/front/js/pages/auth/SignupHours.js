@@ -92,11 +92,11 @@ export default function SignupHours() {
     }
     console.log(finalHours)
 
-    for (const item of finalHours) {
-      await actions.newHours(item)
+    const saved = await actions.saveSchedule(store.currentPro.id, finalHours)
+    if (saved !== true) {
+      alert(saved || "Sorry, somenthing went wrong.")
+      return
     }
-
-    store.hoursByPro = finalHours
     console.log(store.hoursByPro)
 
     store.currentPro.config_status = 4
@@ -32,10 +32,17 @@ export default function SignupLocation() {
 
     store.currentPro.config_status = 2
 
-    await actions.newLocation(location)
-    await actions.updatePro(store.currentPro)
-
-    await actions.getLocationsByPro(store.currentPro.id)
+    // The location and the pro are saved together, and the pro's locations read back, in one round trip
+    const responses = await actions.batch([
+      {method: "POST", path: "/locations", body: location},
+      {method: "PUT", path: `/pros/${store.currentPro.id}`, body: store.currentPro},
+      {method: "GET", path: `/pros/${store.currentPro.id}/locations`},
+    ], true)
+    if (!responses) {
+      return
+    }
+    store.currentPro = responses[1].body
+    store.currentLocations = responses[2].body
     console.log(store.currentLocations)
 
     console.log('clicking next')
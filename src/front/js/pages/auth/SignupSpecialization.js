@@ -97,15 +97,19 @@ export default function SignupSpecialization() {
         })
     }
 
-    for (const item of finalServices) {
-        await actions.newProService(item)
+    store.currentPro.config_status = 3
+
+    // The services and the pro are saved together, all or none, in one round trip
+    const requests = finalServices.map(item => ({method: "POST", path: "/proservices", body: item}))
+    requests.push({method: "PUT", path: `/pros/${store.currentPro.id}`, body: store.currentPro})
+    const responses = await actions.batch(requests, true)
+    if (!responses) {
+      return
     }
 
     store.proServicesByPro = finalServices
+    store.currentPro = responses[responses.length - 1].body
     console.log(store.proServicesByPro)
-
-    store.currentPro.config_status = 3
-    await actions.updatePro(store.currentPro)
     
     navigate("/signup/hours")
   }
@@ -44,15 +44,11 @@ export default function BookingPage() {
 
     // API Calls:
     const fetchPro = async (userName) => {
-      await actions.getProByUsername(userName)
+      await actions.getBookingPage(userName)
       console.log("----PRO----", store.currentPro)
-      await actions.getProServicesByPro(store.currentPro.id)
       // console.log("----PROSERV----", store.proServicesByPro)
-      await actions.getHoursByPro(store.currentPro.id)
       // console.log("----WORKING_HOURS----", store.hoursByPro)
-      await actions.getBookingsByPro(store.currentPro.id)
       // console.log("----BOOKINGS----", store.bookingsByPro)
-      await actions.getInactivityByPro(store.currentPro.id)
       // console.log("----HOLYDAYS----", store.inactivityByPro)
 
 
@@ -1,4 +1,4 @@
-import React, { useContext, useState, useEffect } from "react";
+import React, { useContext, useState, useEffect, useRef } from "react";
 import { Context } from "../../store/appContext";
 
 
@@ -7,6 +7,8 @@ export default function PatientsList() {
 
   const { store, actions } = useContext(Context)
   const [patientsList, setPatientsList] = useState(store.patientsByPro)
+  const [nextCursor, setNextCursor] = useState(null)
+  const latestQuery = useRef("")
 
   useEffect(() => {
  
@@ -20,28 +22,9 @@ export default function PatientsList() {
         return
         }
       }
-      await actions.getBookingsByPro(store.currentPro.id)
-      let patientsMap = new Map();
-
-        store.bookingsByPro.forEach((booking) => {
-          const patient = {
-            "id": booking.patient_id,
-            "name": booking.patient_name,
-            "lastname": booking.patient_lastname,
-            "email": booking.patient_email,
-            "phone": booking.patient_phone
-          };
-
-          patientsMap.set(patient.id, patient)
-        });
-      
-
-        const finalPatients = Array.from(patientsMap.values())
-        store.patientsByPro = finalPatients
-        setPatientsList(store.patientsByPro)
-        store.bookingsByPro = []
-
-      setCurrentInactivityDays(store.inactivityByPro)
+      const next = await actions.getPatientsByPro(store.currentPro.id)
+      setNextCursor(next)
+      setPatientsList(store.patientsByPro)
     };
     if (!Object.keys(store.patientsByPro).length) {
       fetchData();
@@ -50,13 +33,21 @@ export default function PatientsList() {
   
 }, [store.isLoggedIn, store.token]);
 
-  const handleSearchInput = (query) => {
-    const newList = store.patientsByPro.filter(patient =>
-      patient.name.toLowerCase().includes(query.toLowerCase()) ||
-      patient.email.toLowerCase().includes(query.toLowerCase()) ||
-      patient.phone.includes(query) 
-    )
-    setPatientsList(newList)
+  const handleSearchInput = async (query) => {
+    latestQuery.current = query
+    if (!query.trim()) {
+      setPatientsList(store.patientsByPro)
+      return
+    }
+    const results = await actions.searchPatientsByPro(store.currentPro.id, query)
+    // Answers can come back out of order while typing, keep only the last one
+    if (latestQuery.current === query) setPatientsList(results)
+  }
+
+  const handleLoadMore = async () => {
+    const next = await actions.getPatientsByPro(store.currentPro.id, nextCursor)
+    setNextCursor(next)
+    if (!latestQuery.current.trim()) setPatientsList(store.patientsByPro)
   }
 
   return (
@@ -79,7 +70,8 @@ export default function PatientsList() {
               <span className="" style={{ width: "15%" }}>Name</span>
               <span className="" style={{ width: "15%" }}>Lastname</span>
               <span className="" style={{ width: "25%" }}>Email</span>
-              <span className="" style={{ width: "25%" }}>Phone</span>
+              <span className="" style={{ width: "15%" }}>Phone</span>
+              <span className="" style={{ width: "15%" }}>Last visit</span>
             </div>
 
             {patientsList.map((patient) =>
@@ -88,11 +80,18 @@ export default function PatientsList() {
                 <span className="" style={{ width: "15%" }}>{patient.name}</span>
                 <span className="" style={{ width: "15%" }}>{patient.lastname}</span>
                 <span className="" style={{ width: "25%" }}><a href={`mailto:${patient.email}`} style={{ color: "#14C4B9" }}>{patient.email}</a></span>
-                <span className="" style={{ width: "25%" }}>{patient.phone}</span>
+                <span className="" style={{ width: "15%" }}>{patient.phone}</span>
+                <span className="" style={{ width: "15%" }}>{patient.last_visit || "-"}</span>
               </div>
 
             )}
 
+            {nextCursor && !latestQuery.current.trim() &&
+              <div className="text-center pt-3">
+                <button className="btn btn-outline-secondary btn-sm" onClick={handleLoadMore}>Load more</button>
+              </div>
+            }
+
           </div>
         </div>
 
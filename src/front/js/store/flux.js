@@ -101,6 +101,30 @@ const getState = ({getStore, getActions, setStore}) => {
 				
 			},
 
+			batch: async(requests, transaction = false) => {
+				// Several API requests in one round trip, paths without the backend url (eg: "/pros/12").
+				// With transaction they're saved all or none. Returns [{status, body}] or null.
+				const store = getStore()
+				const url = process.env.BACKEND_URL + '/batch';
+				const options = {
+					method: "POST",
+					headers: {
+						"Content-Type": "application/json",
+						"Authorization": `Bearer ${store.token}`
+					},
+					body: JSON.stringify({requests: requests, transaction: transaction})
+				};
+				const response = await fetch(url, options)
+				const data = await response.json()
+				if(response.ok){
+					return data.responses
+				}
+				else{
+					console.log("Error :", response.status, data.message)
+					return null
+				}
+			},
+
 			sendEmail: async(pro_id, booking_id, patient_email) => {
 				const url = process.env.BACKEND_URL + `/mail/${pro_id}/${booking_id}`
 				const options = {
@@ -182,6 +206,27 @@ const getState = ({getStore, getActions, setStore}) => {
 					console.log("Error :", response.status, response.statusText)
 				}
 			},
+			getBookingPage: async(username) => {
+				// Pro, locations, proservices, hours, inactivity and busy bookings of the next 90 days in one request
+				const url = process.env.BACKEND_URL + `/pages/${username}`;
+				const options = {
+					method: "GET"           
+				};
+				const response = await fetch(url, options)
+				if(response.ok){
+					const data = await response.json()
+					setStore({currentPro: data.pro,
+							  currentLocations: data.locations,
+							  proServicesByPro: data.proservices,
+							  hoursByPro: data.hours,
+							  inactivityByPro: data.inactivity,
+							  bookingsByPro: data.bookings})
+				}
+				else{
+					/* alert("Sorry, somenthing went wrong.") */
+					console.log("Error :", response.status, response.statusText)
+				}
+			},
 			getProByUsername: async(username) => {
 				const url = process.env.BACKEND_URL + `/pros/${username}`;
 				const options = {
@@ -527,6 +572,27 @@ const getState = ({getStore, getActions, setStore}) => {
 					console.log("Error :", response.status, response.statusText)
 				}
 			},
+			saveSchedule: async(pro_id, hours) => {
+				// Replaces the whole week in one request, blocks of the same day can't overlap
+				const url = process.env.BACKEND_URL + `/pros/${pro_id}/schedule`;
+				const options = {
+					method: "PUT",
+					headers: {
+						"Content-Type": "application/json"
+					},
+					body: JSON.stringify({hours: hours})            
+				};
+				const response = await fetch(url, options)
+				const data = await response.json()
+				if(response.ok){
+					setStore({hoursByPro: data})
+					return true
+				}
+				else{
+					console.log("Error :", response.status, data.message)
+					return data.message
+				}
+			},
 			deleteHoursByPro: async(pro_id) => {
 				const url = process.env.BACKEND_URL + `/pros/${pro_id}/hours`;
 				const options = {
@@ -747,6 +813,42 @@ const getState = ({getStore, getActions, setStore}) => {
 					console.log("Error :", response.status, response.statusText)
 				}
 			},
+			getPatientsByPro: async(pro_id, cursor) => {
+				// One page of the pro's patients with first visit, last visit and booking count
+				const url = process.env.BACKEND_URL + `/pros/${pro_id}/patients?limit=200` + (cursor ? `&cursor=${cursor}` : '');
+				const options = {
+					method: "GET"           
+				};
+				const response = await fetch(url, options)
+				if(response.ok){
+					const data = await response.json()
+					const previous = cursor ? getStore().patientsByPro : []
+					setStore({patientsByPro: [...previous, ...data.results]})
+					return data.next_cursor
+				}
+				else{
+					/* alert("Sorry, somenthing went wrong.") */
+					console.log("Error :", response.status, response.statusText)
+					return null
+				}
+			},
+			searchPatientsByPro: async(pro_id, query) => {
+				// Best matches first (prefix, substring or a close spelling of name, lastname, email or phone)
+				const url = process.env.BACKEND_URL + `/pros/${pro_id}/patients/search?q=${encodeURIComponent(query)}`;
+				const options = {
+					method: "GET"           
+				};
+				const response = await fetch(url, options)
+				if(response.ok){
+					const data = await response.json()
+					return data.results
+				}
+				else{
+					/* alert("Sorry, somenthing went wrong.") */
+					console.log("Error :", response.status, response.statusText)
+					return []
+				}
+			},
 			getPatient: async(patient_id) => {
 				const url = process.env.BACKEND_URL + `/patients/${patient_id}`;
 				const options = {
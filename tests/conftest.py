@@ -0,0 +1,74 @@
+"""
+The app runs on a SQLite file in a temporary folder, with the tables created fresh for every
+test. Rate limits and the slow-query log are off, tests that need them turn them on.
+"""
+import os
+import sys
+import tempfile
+
+DATA_DIR = tempfile.mkdtemp(prefix="docdate-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(DATA_DIR, 'test.db')}"
+os.environ.setdefault("JWT_KEY", "test")
+os.environ["RATE_LIMIT_ENABLED"] = "0"
+os.environ["SLOW_QUERY_SAMPLE_RATE"] = "0"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import pytest
+from sqlalchemy import event
+from app import app as flask_app
+from api.models import db, Pros, Locations, Services, ProServices, Patients
+
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+# A pro with a location and a 30 minutes service, and a patient. Returns the ProServices row.
+@pytest.fixture
+def pro_service(app):
+    return add_pro(1)[0]
+
+
+# [ProServices] of a new pro with `services` services
+def add_pro(number, services=1):
+    pro = Pros(password="secret", name=f"Pro{number}", lastname="Test", email=f"pro{number}@docdate.test",
+               phone="600000000", bookingpage_url=f"pro{number}", config_status=4)
+    db.session.add(pro)
+    db.session.flush()
+    db.session.add(Locations(name="Studio", address="Main St 1", city="Madrid", country="Spain",
+                             time_zone="Europe/Madrid", pro_id=pro.id))
+    pro_services = []
+    for index in range(services):
+        service = Services(specialization="Physio", service_name=f"Session {number}-{index}")
+        db.session.add(service)
+        db.session.flush()
+        pro_services.append(ProServices(pro_id=pro.id, service_id=service.id, duration=30, price=40, activated=True))
+    db.session.add_all(pro_services)
+    if not db.session.query(Patients.id).first():
+        db.session.add(Patients(name="Ana", lastname="Garcia", email="ana@docdate.test", phone="611111111"))
+    db.session.commit()
+    return pro_services
+
+
+# Counts the statements sent to the database: with count_statements() as statements: ...
+class count_statements:
+    def __enter__(self):
+        self.count = 0
+        event.listen(db.engine, "before_cursor_execute", self.increment)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(db.engine, "before_cursor_execute", self.increment)
+
+    def increment(self, *args):
+        self.count += 1
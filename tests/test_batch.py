@@ -0,0 +1,99 @@
+"""
+Batches of API requests (POST /api/batch), with and without "transaction".
+"""
+import pytest
+from api.models import db, Bookings, Patients, ChangeLog
+
+
+def booking(pro_service, date="2024-02-01", starting_time="10:00"):
+    return {"method": "POST", "path": "/bookings",
+            "body": {"date": date, "starting_time": starting_time, "status": "pending",
+                     "pro_service_id": pro_service.id, "patient_id": 1}}
+
+
+NEW_PATIENT = {"method": "POST", "path": "/patients",
+               "body": {"name": "Luis", "lastname": "Perez", "email": "luis@docdate.test"}}
+
+
+def counts():
+    db.session.expire_all()
+    return (db.session.query(Bookings).count(), db.session.query(Patients).count(),
+            db.session.query(ChangeLog).count())
+
+
+def statuses(response):
+    return [sub_response["status"] for sub_response in response.json["responses"]]
+
+
+# The third request takes the slot of the first one
+def conflicting_batch(pro_service, transaction):
+    return {"transaction": transaction,
+            "requests": [booking(pro_service), NEW_PATIENT, booking(pro_service, starting_time="10:15")]}
+
+
+def test_failed_request_undoes_the_transaction(client, pro_service):
+    before = counts()
+    response = client.post("/api/batch", json=conflicting_batch(pro_service, True))
+    assert response.status_code == 409
+    assert response.json["failed"] == 2
+    assert statuses(response) == [201, 201, 409]
+    assert response.json["responses"][2]["body"]["message"] == "This slot is no longer available"
+    assert counts() == before
+    # The session is usable again, the slot is still free
+    assert client.post("/api/bookings", json=booking(pro_service)["body"]).status_code == 201
+
+
+def test_transaction_is_committed_at_the_end(client, pro_service):
+    response = client.post("/api/batch", json={"transaction": True, "requests": [
+        booking(pro_service), NEW_PATIENT, booking(pro_service, starting_time="11:00")]})
+    assert response.status_code == 200
+    assert statuses(response) == [201, 201, 201]
+    bookings, patients, _ = counts()
+    assert (bookings, patients) == (2, 2)
+    assert db.session.query(ChangeLog.operation).filter_by(entity="bookings").count() == 2
+
+
+def test_without_transaction_every_request_stands_alone(client, pro_service):
+    response = client.post("/api/batch", json=conflicting_batch(pro_service, False))
+    assert response.status_code == 200
+    assert statuses(response) == [201, 201, 409]
+    bookings, patients, _ = counts()
+    assert (bookings, patients) == (1, 2)
+
+
+def test_reads_see_the_writes_before_them(client, pro_service):
+    response = client.post("/api/batch", json={"transaction": True, "requests": [
+        NEW_PATIENT, {"method": "GET", "path": "/patients?email=luis@docdate.test"}]})
+    assert response.status_code == 200
+    assert [patient["name"] for patient in response.json["responses"][1]["body"]["results"]] == ["Luis"]
+
+
+def test_nested_batch_and_other_paths(client, pro_service):
+    response = client.post("/api/batch", json={"requests": [
+        {"method": "POST", "path": "/batch", "body": {"requests": []}},
+        {"method": "GET", "path": "/index.html"},
+        {"method": "GET", "path": "/nothing/here"},
+        {"method": "GET", "path": "/pros/1/proservices"}]})
+    assert response.status_code == 200
+    assert statuses(response) == [400, 404, 404, 200]
+    assert response.json["responses"][0]["body"]["message"] == "Batches can't be nested"
+    # In a transaction the first of them stops the batch
+    response = client.post("/api/batch", json={"transaction": True, "requests": [
+        booking(pro_service), {"method": "GET", "path": "/nothing/here"}, NEW_PATIENT]})
+    assert response.status_code == 404
+    assert (response.json["failed"], statuses(response)) == (1, [201, 404])
+    assert counts()[:2] == (0, 1)
+
+
+@pytest.mark.parametrize("body, message", [
+    ({"requests": {}}, "requests must be a list"),
+    ({"requests": ["/pros"]}, "requests[0] must be an object"),
+    ({"requests": [{"method": "HEAD", "path": "/pros"}]}, "requests[0]: method must be one of GET, POST, PUT, PATCH, DELETE"),
+    ({"requests": [{"path": "pros"}]}, "requests[0]: path must start with /, eg: /pros/12"),
+    ({"requests": [{"path": "/pros"}] * 51}, "A batch can't have more than 50 requests"),
+    ({"requests": [], "transaction": "yes"}, "transaction must be true or false"),
+])
+def test_invalid_batch(client, body, message):
+    response = client.post("/api/batch", json=body)
+    assert response.status_code == 400
+    assert response.json["message"] == message
@@ -0,0 +1,49 @@
+"""
+Many clients booking the same slots at once: every slot is booked exactly once, the others
+get a 409.
+"""
+import random
+import datetime
+import threading
+from api.models import db, Bookings, Patients
+
+THREADS = 16
+SLOTS = 10
+
+
+# Half of the clients book at 10:00 and half at 10:15, so they also race for slots that
+# overlap (30 minutes service) without starting at the same time
+def test_each_slot_is_booked_once(app, pro_service):
+    pro_service_id = pro_service.id
+    patient_id = db.session.query(Patients.id).scalar()
+    db.session.remove()
+    first_day = datetime.date(2200, 1, 1)
+    days = [(first_day + datetime.timedelta(days=slot)).isoformat() for slot in range(SLOTS)]
+    responses = []
+    lock = threading.Lock()
+    start_line = threading.Barrier(THREADS)
+
+    def book(number):
+        client = app.test_client()
+        order = days[:]
+        random.Random(number).shuffle(order)
+        start_line.wait()
+        for day in order:
+            response = client.post("/api/bookings", json={
+                "date": day, "starting_time": "10:00" if number % 2 == 0 else "10:15", "status": "pending",
+                "pro_service_id": pro_service_id, "patient_id": patient_id})
+            with lock:
+                responses.append((day, response.status_code))
+
+    workers = [threading.Thread(target=book, args=(number,)) for number in range(THREADS)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert len(responses) == THREADS * SLOTS
+    for day in days:
+        statuses = sorted(status for response_day, status in responses if response_day == day)
+        assert statuses == [201] + [409] * (THREADS - 1), day
+    booked = db.session.query(Bookings.date, db.func.count(Bookings.id)).group_by(Bookings.date).all()
+    assert sorted((date.isoformat(), count) for date, count in booked) == [(day, 1) for day in days]
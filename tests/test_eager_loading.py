@@ -0,0 +1,55 @@
+"""
+List endpoints load their relations eagerly: the number of statements they send doesn't grow
+with the number of rows they return.
+"""
+import datetime
+import pytest
+from api.models import db, Bookings, Patients
+from conftest import add_pro, count_statements
+
+
+# `count` bookings of different patients, spread over two pros with two services each
+def add_bookings(count):
+    first, second = add_pro(1, services=2), add_pro(2, services=2)
+    # Every other booking is of the first pro
+    pro_services = [first[0], second[0], first[1], second[1]]
+    for index in range(count):
+        patient = Patients(name=f"Patient{index}", lastname="Test", email=f"patient{index}@docdate.test")
+        db.session.add(patient)
+        db.session.flush()
+        db.session.add(Bookings(date=datetime.date(2030, 1, 1) + datetime.timedelta(days=index),
+                                starting_time="10:00", status="confirmed",
+                                pro_service_id=pro_services[index % len(pro_services)].id, patient_id=patient.id))
+    db.session.commit()
+
+
+def add_services(count):
+    add_pro(1, services=count)
+    add_pro(2, services=count)
+
+
+# (statements, rows) of GET `path` on a database filled by fill(count)
+def list_statements(app, client, path, fill, count):
+    db.drop_all()
+    db.create_all()
+    fill(count)
+    # Nothing loaded by the fill is reused by the request
+    db.session.expunge_all()
+    with count_statements() as statements:
+        response = client.get(path)
+    assert response.status_code == 200
+    body = response.get_json()
+    return statements.count, len(body if isinstance(body, list) else body["results"])
+
+
+@pytest.mark.parametrize("path, fill, rows", [
+    ("/api/pros/1/bookings", add_bookings, lambda count: count // 2),
+    ("/api/bookings?limit=200", add_bookings, lambda count: count),
+    ("/api/pros/1/proservices", add_services, lambda count: count),
+    ("/api/proservices?limit=200", add_services, lambda count: 2 * count),
+])
+def test_list_statements_dont_grow_with_rows(app, client, path, fill, rows):
+    small, small_rows = list_statements(app, client, path, fill, 10)
+    large, large_rows = list_statements(app, client, path, fill, 20)
+    assert (small_rows, large_rows) == (rows(10), rows(20))
+    assert small == large
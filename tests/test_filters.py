@@ -0,0 +1,22 @@
+"""
+Integer filters of the list endpoints: a value that isn't an integer is a 400, not a filter
+on NULL that silently returns nothing.
+"""
+import pytest
+
+
+@pytest.mark.parametrize("path", ["/api/hours?pro_id=abc", "/api/hours?working_day=monday",
+                                  "/api/bookings?pro_id=abc", "/api/bookings?patient_id=1.5",
+                                  "/api/pros?config_status=done", "/api/proservices?service_id=abc",
+                                  "/api/inactivity?pro_id=", "/api/pros/1/availability?pro_service_id=abc",
+                                  "/api/pros/1/changes?since=0&limit=all"])
+def test_non_integer_filter_is_rejected(client, path):
+    response = client.get(path)
+    assert response.status_code == 400
+    assert response.json["message"].endswith("must be an integer")
+
+
+def test_integer_filter(client, pro_service):
+    response = client.get(f"/api/proservices?pro_id={pro_service.pro_id}")
+    assert [row["id"] for row in response.json["results"]] == [pro_service.id]
+    assert client.get("/api/proservices?pro_id=999").json["results"] == []
@@ -0,0 +1,102 @@
+"""
+Confirmation emails through the outbox: the request only queues them, the worker sends them
+with FakeTransport and retries the failed sends with exponential backoff.
+"""
+import datetime
+import pytest
+from api.mailer import FakeTransport, claim_emails, drain_outbox, MAX_ATTEMPTS, RETRY_BASE_SECONDS
+from api.models import db, Bookings, EmailOutbox, Patients
+
+
+@pytest.fixture
+def booking(pro_service):
+    booking = Bookings(date=datetime.date(2024, 2, 1), starting_time=datetime.time(10, 0), status="confirmed",
+                       pro_service_id=pro_service.id, patient_id=db.session.query(Patients.id).scalar())
+    db.session.add(booking)
+    db.session.commit()
+    return booking
+
+
+def queue_email(client, booking):
+    return client.post(f"/api/mail/{booking.pro_service.pro_id}/{booking.id}",
+                       json={"receiver": "ana@docdate.test", "subject": "Your booking"})
+
+
+def outbox_email(outbox_id):
+    db.session.expire_all()
+    return db.session.get(EmailOutbox, outbox_id)
+
+
+# Makes the email due now, as if its retry delay had passed
+def make_due(email):
+    email.next_attempt_at = datetime.datetime.utcnow()
+    db.session.commit()
+
+
+def test_the_request_only_queues_the_email(client, booking):
+    response = queue_email(client, booking)
+    assert response.status_code == 202
+    email = outbox_email(response.json["outbox_id"])
+    assert (email.status, email.attempts, email.receiver) == ("pending", 0, "ana@docdate.test")
+
+
+def test_unknown_booking_isnt_queued(client, booking):
+    response = client.post(f"/api/mail/{booking.pro_service.pro_id}/999",
+                           json={"receiver": "ana@docdate.test", "subject": "Your booking"})
+    assert response.status_code == 404
+    assert db.session.query(EmailOutbox).count() == 0
+
+
+def test_worker_sends_the_email(app, client, booking):
+    outbox_id = queue_email(client, booking).json["outbox_id"]
+    transport = FakeTransport()
+    assert drain_outbox(app, transport) == {"sent": 1}
+    email = outbox_email(outbox_id)
+    assert (email.status, email.attempts, email.last_error) == ("sent", 1, None)
+    assert email.sent_at is not None
+    assert [pro_id for pro_id, _ in transport.sent] == [booking.pro_service.pro_id]
+    # Nothing left to send
+    assert drain_outbox(app, transport) == {}
+
+
+def test_failed_send_is_retried_with_backoff(app, client, booking):
+    outbox_id = queue_email(client, booking).json["outbox_id"]
+    transport = FakeTransport(fail_times=2)
+    for attempt in (1, 2):
+        before = datetime.datetime.utcnow()
+        assert drain_outbox(app, transport) == {"pending": 1}
+        email = outbox_email(outbox_id)
+        assert (email.status, email.attempts, email.last_error) == ("pending", attempt, "fake transport failure")
+        delay = datetime.timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+        assert before + delay <= email.next_attempt_at <= datetime.datetime.utcnow() + delay
+        # Not due again until the delay has passed
+        assert drain_outbox(app, transport) == {}
+        make_due(email)
+    assert drain_outbox(app, transport) == {"sent": 1}
+    email = outbox_email(outbox_id)
+    assert (email.status, email.attempts, email.last_error) == ("sent", 3, None)
+    assert len(transport.sent) == 1
+
+
+def test_email_fails_after_the_last_attempt(app, client, booking):
+    outbox_id = queue_email(client, booking).json["outbox_id"]
+    transport = FakeTransport(fail_times=MAX_ATTEMPTS)
+    for _ in range(MAX_ATTEMPTS - 1):
+        assert drain_outbox(app, transport) == {"pending": 1}
+        make_due(outbox_email(outbox_id))
+    assert drain_outbox(app, transport) == {"failed": 1}
+    email = outbox_email(outbox_id)
+    assert (email.status, email.attempts) == ("failed", MAX_ATTEMPTS)
+    make_due(email)
+    assert drain_outbox(app, transport) == {}
+    assert transport.sent == []
+
+
+def test_email_stuck_sending_is_claimed_again(app, client, booking):
+    outbox_id = queue_email(client, booking).json["outbox_id"]
+    # The worker was killed after claiming it
+    assert claim_emails(10) == [outbox_id]
+    assert drain_outbox(app, FakeTransport()) == {}
+    make_due(outbox_email(outbox_id))
+    assert drain_outbox(app, FakeTransport()) == {"sent": 1}
+    assert outbox_email(outbox_id).attempts == 2
@@ -0,0 +1,76 @@
+"""
+Search of a pro's patients. It runs on the test SQLite database and, when TEST_POSTGRES_URL
+points to an empty Postgres database with pg_trgm available, on Postgres too, where the
+scores are computed in SQL. Its tables are dropped at the end.
+"""
+import os
+import datetime
+import pytest
+from flask import Flask
+from conftest import add_pro
+from api.models import db, Bookings, Patients
+from api.patient_search import search_patients
+
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+
+@pytest.fixture
+def postgres_app():
+    if not TEST_POSTGRES_URL:
+        pytest.skip("TEST_POSTGRES_URL isn't set")
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = TEST_POSTGRES_URL
+    db.init_app(app)
+    with app.app_context():
+        db.session.execute(db.text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        db.drop_all()
+        db.create_all()
+        try:
+            yield app
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def database(request):
+    return request.getfixturevalue("app" if request.param == "sqlite" else "postgres_app")
+
+
+# Ana Garcia, Anabel Lopez and Juan Perez are patients of pro 1, Maria Garcia of pro 2
+def add_patients():
+    first, second = add_pro(1)[0], add_pro(2)[0]
+    patients = {name: Patients(name=name.split()[0], lastname=name.split()[1],
+                               email=name.lower().replace(" ", ".") + "@docdate.test")
+                for name in ("Anabel Lopez", "Juan Perez", "Maria Garcia")}
+    patients["Ana Garcia"] = db.session.query(Patients).filter_by(name="Ana").one()
+    db.session.add_all(patients.values())
+    db.session.flush()
+    for day, (name, pro_service) in enumerate([("Ana Garcia", first), ("Anabel Lopez", first), ("Juan Perez", first),
+                                               ("Ana Garcia", first), ("Maria Garcia", second)]):
+        db.session.add(Bookings(date=datetime.date(2024, 2, 1 + day), starting_time=datetime.time(10, 0),
+                                status="confirmed", pro_service_id=pro_service.id, patient_id=patients[name].id))
+    db.session.commit()
+
+
+def names(result):
+    return [f"{patient['name']} {patient['lastname']}" for patient in result["results"]]
+
+
+def test_search_finds_only_the_pros_patients(database):
+    add_patients()
+    assert names(search_patients(1, "garcia", 0, 10)) == ["Ana Garcia"]
+    assert names(search_patients(2, "garcia", 0, 10)) == ["Maria Garcia"]
+    assert names(search_patients(1, "ana lop", 0, 10)) == ["Anabel Lopez"]
+    assert names(search_patients(1, "nobody", 0, 10)) == []
+
+
+# Start of a word scores more than anywhere else, ties by lastname
+def test_search_ranks_and_pages(database):
+    add_patients()
+    first_page = search_patients(1, "an", 0, 2)
+    assert names(first_page) == ["Ana Garcia", "Anabel Lopez"]
+    assert first_page["next_cursor"] == 2
+    last_page = search_patients(1, "an", 2, 2)
+    assert names(last_page) == ["Juan Perez"]
+    assert last_page["next_cursor"] is None
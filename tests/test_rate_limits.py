@@ -0,0 +1,50 @@
+"""
+Rate limits of the public endpoints: no IP limits until the proxies are known, one bucket per
+client IP behind them, and no bucket per account on logins.
+"""
+import pytest
+from conftest import add_pro
+from api import rate_limits
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    monkeypatch.setattr(rate_limits, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(rate_limits, "backend", rate_limits.MemoryBuckets())
+    monkeypatch.setattr(rate_limits, "LIMITS", {"page": {"ip": (3, 0.001), "pro": None},
+                                                "booking": {"ip": (3, 0.001), "pro": None},
+                                                "login": {"ip": (3, 0.001)}})
+    return monkeypatch
+
+
+def login(client, client_ip, email="pro1@docdate.test"):
+    return client.post("/api/login", json={"email": email, "password": "wrong"},
+                       headers={"X-Forwarded-For": client_ip}).status_code
+
+
+def test_no_ip_limits_until_the_proxies_are_set(client, limits):
+    limits.setattr(rate_limits, "TRUSTED_PROXIES", None)
+    assert [login(client, "203.0.113.1") for _ in range(5)] == [404] * 5
+
+
+def test_each_client_behind_the_router_has_its_bucket(client, limits):
+    limits.setattr(rate_limits, "TRUSTED_PROXIES", 1)
+    assert [login(client, "203.0.113.1") for _ in range(4)] == [404, 404, 404, 429]
+    # Same router address, another client
+    assert login(client, "203.0.113.2") == 404
+    response = client.post("/api/login", json={}, headers={"X-Forwarded-For": "203.0.113.1"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
+
+
+def test_failed_logins_dont_lock_the_account(client, limits):
+    limits.setattr(rate_limits, "TRUSTED_PROXIES", 1)
+    assert {login(client, f"203.0.113.{number}") for number in range(1, 20)} == {404}
+
+
+# A service id that doesn't exist yet counts against its pro as soon as it's created
+def test_unknown_service_isnt_cached(app):
+    rate_limits.cached_service_pro_id.cache_clear()
+    assert rate_limits.service_pro_id(1) is None
+    pro_service = add_pro(1)[0]
+    assert rate_limits.service_pro_id(pro_service.id) == pro_service.pro_id
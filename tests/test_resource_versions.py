@@ -0,0 +1,66 @@
+"""
+Resource versions and change log entries written by the after_flush hooks when bookings change.
+"""
+import datetime
+from sqlalchemy import event
+from conftest import add_pro
+from api.models import db, Bookings, Patients, ResourceVersions, ChangeLog
+
+
+def versions():
+    db.session.expire_all()
+    return dict(db.session.query(ResourceVersions.name, ResourceVersions.version))
+
+
+# SELECTs of pro_services sent while `function` runs
+def pro_service_lookups(function):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("SELECT") and "FROM pro_services" in statement:
+            statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        function()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+    return statements
+
+
+# 18 bookings of 6 services of 2 pros, none of the services loaded in the session: both hooks
+# share one query for the pros of the bookings
+def test_bookings_of_several_services_take_one_lookup(app):
+    pro_services = add_pro(1, services=3) + add_pro(2, services=3)
+    pro_service_ids = [pro_service.id for pro_service in pro_services]
+    patient_id = db.session.query(Patients.id).scalar()
+    db.session.expunge_all()
+    before = versions()
+
+    def book():
+        db.session.add_all([Bookings(date=datetime.date(2024, 2, 1 + index), starting_time=datetime.time(10, 0),
+                                     status="pending", pro_service_id=pro_service_id, patient_id=patient_id)
+                            for index, pro_service_id in enumerate(pro_service_ids * 3)])
+        db.session.commit()
+    assert len(pro_service_lookups(book)) == 1
+    after = versions()
+    for pro_id in (1, 2):
+        assert after[f"bookings:{pro_id}"] == before.get(f"bookings:{pro_id}", 0) + 1
+        assert after[f"changes:{pro_id}"] == before.get(f"changes:{pro_id}", 0) + 1
+        assert db.session.query(ChangeLog).filter_by(pro_id=pro_id, entity="bookings").count() == 9
+
+
+def test_booking_moved_to_another_pro_bumps_both(app):
+    first, second = add_pro(1)[0], add_pro(2)[0]
+    booking = Bookings(date=datetime.date(2024, 2, 1), starting_time=datetime.time(10, 0), status="pending",
+                       pro_service_id=first.id, patient_id=db.session.query(Patients.id).scalar())
+    db.session.add(booking)
+    db.session.commit()
+    before = versions()
+    booking = db.session.get(Bookings, booking.id)
+    booking.pro_service_id = second.id
+    db.session.commit()
+    after = versions()
+    assert after["bookings:1"] == before["bookings:1"] + 1
+    assert after["bookings:2"] == before.get("bookings:2", 0) + 1
+    last_changes = db.session.query(ChangeLog.pro_id, ChangeLog.operation).order_by(ChangeLog.id.desc()).limit(2)
+    assert sorted(last_changes) == [(1, "delete"), (2, "upsert")]
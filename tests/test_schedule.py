@@ -0,0 +1,96 @@
+"""
+Replacing the weekly schedule of a pro (PUT /api/pros/<proid>/schedule).
+"""
+import pytest
+from conftest import add_pro
+from api.models import db, Hours, ChangeLog, ResourceVersions
+
+
+# Pro 1 at location 1 and pro 2 at location 2
+@pytest.fixture
+def pros(app):
+    add_pro(1)
+    add_pro(2)
+
+
+def day(working_day, location_id, morning=("09:00", "13:00"), afternoon=(None, None)):
+    return {"working_day": working_day, "location_id": location_id,
+            "starting_hour_morning": morning[0], "ending_hour_morning": morning[1],
+            "starting_hour_after": afternoon[0], "ending_hour_after": afternoon[1]}
+
+
+def put_schedule(client, hours):
+    return client.put("/api/pros/1/schedule", json={"hours": hours})
+
+
+def stored_days():
+    db.session.expire_all()
+    return [(hour.working_day, hour.location_id) for hour in Hours.query.order_by(Hours.working_day)]
+
+
+def versions():
+    db.session.expire_all()
+    return dict(db.session.query(ResourceVersions.name, ResourceVersions.version))
+
+
+def test_the_whole_week_is_replaced(client, pros):
+    response = put_schedule(client, [day(working_day, 1, afternoon=("15:00", "18:00")) for working_day in range(1, 6)])
+    assert response.status_code == 200
+    assert [hour["working_day"] for hour in response.json] == [1, 2, 3, 4, 5]
+    response = put_schedule(client, [day(6, 1), day(2, 1)])
+    assert response.status_code == 200
+    assert [(hour["working_day"], hour["ending_hour_after"]) for hour in response.json] == [(2, None), (6, None)]
+    assert stored_days() == [(2, 1), (6, 1)]
+    assert put_schedule(client, []).json == []
+    assert stored_days() == []
+
+
+@pytest.mark.parametrize("hours, message", [
+    ([day(1, 1, afternoon=("12:00", "15:00"))], "hours[0].afternoon overlaps hours[0].morning on working_day 1"),
+    ([day(1, 1), day(1, 1, morning=("12:30", "14:00"))], "hours[1].morning overlaps hours[0].morning on working_day 1"),
+    ([day(3, 1, afternoon=("15:00", "19:00")), day(3, 1, morning=("18:00", "20:00"))],
+     "hours[1].morning overlaps hours[0].afternoon on working_day 3"),
+    ([day(True, 1)], "hours[0]: working_day must be 0 (sunday) to 6"),
+    ([day(7, 1)], "hours[0]: working_day must be 0 (sunday) to 6"),
+    ([day(1, 2)], "hours[0]: location_id must be a location of the pro"),
+])
+def test_invalid_week_changes_nothing(client, pros, hours, message):
+    put_schedule(client, [day(1, 1), day(2, 1)])
+    response = put_schedule(client, hours)
+    assert response.status_code == 400
+    assert response.json["message"] == message
+    assert stored_days() == [(1, 1), (2, 1)]
+
+
+def test_blocks_of_a_day_can_follow_each_other(client, pros):
+    response = put_schedule(client, [day(1, 1, afternoon=("13:00", "17:00")), day(1, 1, morning=("17:00", "20:00"))])
+    assert response.status_code == 200
+
+
+def test_versions_of_the_pro_and_its_location_are_bumped(client, pros):
+    before = versions()
+    put_schedule(client, [day(1, 1)])
+    after = versions()
+    assert after["hours:1"] == before.get("hours:1", 0) + 1
+    assert after["location_hours:1"] == before.get("location_hours:1", 0) + 1
+    # The other pro's aren't
+    assert "hours:2" not in after and "location_hours:2" not in after
+    # Emptying the week bumps them too, a rejected week doesn't
+    put_schedule(client, [])
+    emptied = versions()
+    assert (emptied["hours:1"], emptied["location_hours:1"]) == (after["hours:1"] + 1, after["location_hours:1"] + 1)
+    put_schedule(client, [day(1, 1, afternoon=("10:00", "11:00"))])
+    assert versions() == emptied
+
+
+def test_change_log_has_the_deleted_and_new_rows(client, pros):
+    old_ids = [hour["id"] for hour in put_schedule(client, [day(1, 1), day(2, 1)]).json]
+    last_change = db.session.query(db.func.max(ChangeLog.id)).scalar()
+    new_ids = [hour["id"] for hour in put_schedule(client, [day(3, 1), day(4, 1), day(5, 1)]).json]
+    changes = db.session.query(ChangeLog.pro_id, ChangeLog.entity, ChangeLog.entity_id, ChangeLog.operation) \
+                        .filter(ChangeLog.id > last_change).order_by(ChangeLog.id).all()
+    assert changes == ([(1, "hours", hour_id, "delete") for hour_id in old_ids] +
+                       [(1, "hours", hour_id, "upsert") for hour_id in new_ids])
+    feed = client.get(f"/api/pros/1/changes?since={last_change}").json
+    assert sorted(hour["id"] for hour in feed["changes"]["hours"]) == sorted(new_ids)
+    assert feed["deleted"]["hours"] == sorted(set(old_ids) - set(new_ids))
@@ -0,0 +1,36 @@
+"""
+Synthetic dataset: the same options give the same rows, whatever the day it's generated.
+"""
+import datetime
+from api.models import db, Bookings, InactivityDays
+from api.seed import seed_database, DEFAULT_START_DATE
+
+
+def seeded_rows(**options):
+    db.drop_all()
+    db.create_all()
+    seed_database(pros=2, bookings_per_pro=20, log=lambda *args: None, **options)
+    bookings = db.session.query(Bookings.date, Bookings.starting_time, Bookings.status, Bookings.pro_service_id,
+                                Bookings.patient_id).order_by(Bookings.id).all()
+    inactivity = db.session.query(InactivityDays.starting_date, InactivityDays.ending_date) \
+                           .order_by(InactivityDays.id).all()
+    return bookings, inactivity
+
+
+def test_same_options_same_dataset(app):
+    bookings, inactivity = seeded_rows()
+    assert len(bookings) == 40
+    assert min(date for date, *_ in bookings) >= DEFAULT_START_DATE
+    assert seeded_rows() == (bookings, inactivity)
+
+
+def test_start_date_moves_the_dates(app):
+    bookings, _ = seeded_rows(start_date=datetime.date(2030, 1, 1))
+    assert min(date for date, *_ in bookings) >= datetime.date(2030, 1, 1)
+
+
+def test_seed_command(app):
+    result = app.test_cli_runner().invoke(args=["seed", "--pros", "1", "--bookings-per-pro", "5",
+                                                "--start-date", "2030-01-01"])
+    assert result.exit_code == 0, result.output
+    assert db.session.query(db.func.min(Bookings.date)).scalar() >= datetime.date(2030, 1, 1)
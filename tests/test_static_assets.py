@@ -0,0 +1,70 @@
+"""
+In-memory manifest of the frontend files, refreshed in development with the files that changed.
+"""
+import os
+import pytest
+from api import static_assets
+from api.static_assets import build_manifest, StaticAssets
+
+BUNDLE = b"console.log('docdate');\n" * 100
+
+
+@pytest.fixture
+def public(tmp_path):
+    (tmp_path / "index.html").write_text('<script src="/bundle.js"></script>')
+    (tmp_path / "bundle.js").write_bytes(BUNDLE)
+    (tmp_path / "logo.svg").write_bytes(b"<svg></svg>" * 200)
+    return tmp_path
+
+
+@pytest.fixture
+def compressed(monkeypatch):
+    paths = []
+    compress = static_assets.compress
+
+    def record(asset, full_path):
+        paths.append(asset.path)
+        compress(asset, full_path)
+    monkeypatch.setattr(static_assets, "compress", record)
+    return paths
+
+
+# Rewrites a file as a new build would, with a later modification time
+def rebuild(path, content):
+    modified = os.stat(path).st_mtime_ns + 1000000000
+    path.write_bytes(content)
+    os.utime(path, ns=(modified, modified))
+
+
+def test_unchanged_files_are_not_read_again(public, compressed):
+    assets = build_manifest(public)
+    assert sorted(compressed) == ["bundle.js", "index.html", "index.html", "logo.svg"]
+    compressed.clear()
+    assert build_manifest(public, assets) is assets
+    assert compressed == []
+
+
+def test_changed_file_is_rebuilt_and_index_points_to_it(public, compressed):
+    assets = build_manifest(public)
+    compressed.clear()
+    rebuild(public / "bundle.js", BUNDLE + b"console.log('v2');\n")
+    refreshed = build_manifest(public, assets)
+    assert sorted(compressed) == ["bundle.js", "index.html"]
+    assert refreshed["logo.svg"] is assets["logo.svg"]
+    assert refreshed["bundle.js"].hash != assets["bundle.js"].hash
+    assert f'src="/{refreshed["bundle.js"].hashed_path}"' in refreshed["index.html"].content.decode()
+
+
+def test_added_and_deleted_files(public):
+    assets = build_manifest(public)
+    (public / "logo.svg").unlink()
+    (public / "robots.txt").write_text("User-agent: *\n")
+    refreshed = build_manifest(public, assets)
+    assert sorted(refreshed) == ["bundle.js", "index.html", "robots.txt"]
+
+
+def test_reload_serves_the_new_build(app, public):
+    assets = StaticAssets(str(public), reload=True)
+    rebuild(public / "bundle.js", b"console.log('v2');\n")
+    with app.test_request_context("/bundle.js"):
+        assert assets.serve("bundle.js").get_data() == b"console.log('v2');\n"